@@ -0,0 +1,106 @@
+"""Сравнение разбора регистров: списки битов и BitArray против целочисленных масок.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_register_codec.py [число_циклов]
+
+Один цикл - разбор заголовка модуля (регистры 0-4) и статусов 50 беспроводных датчиков,
+то есть то, что делает каждый опрос класса аварий.
+"""
+from __future__ import annotations
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "custom_components"))
+
+from neptun_smart_local.registers import (  # noqa: E402
+    INPUT_LINE_1_2_CONFIG,
+    INPUT_LINE_3_4_CONFIG,
+    MODULE_CONFIG,
+    RELAY_CONFIG,
+    SIGNAL_LEVEL_BY_RAW,
+    STATUS_WIRED_LINE,
+    WIRELESS_SENSOR_STATUS_FIELDS,
+)
+
+try:
+    from bitstring import BitArray
+except ImportError:
+    BitArray = None
+
+SENSORS = 50
+ALERT_FIELD, DISCHARGE_FIELD, LOST_FIELD, SIGNAL_LEVEL_FIELD, BATTERY_LEVEL_FIELD = WIRELESS_SENSOR_STATUS_FIELDS
+
+
+def _uint16_to_bits(uint):
+    # Прежний modbus_hub.read_holding_register_bits
+    bitlist = [int(x) for x in bin(uint)[2:]]
+    while len(bitlist) < 16:
+        bitlist.insert(0, 0)
+    return bitlist
+
+
+def _getuint(bits):
+    if BitArray is not None:
+        return BitArray(bits)._getuint()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bit
+    return value
+
+
+def decode_bit_lists(header, statuses):
+    config = _uint16_to_bits(header[0])
+    result = [bool(config[i]) for i in (7, 6, 15, 14, 13, 12, 11, 8, 5, 4, 3)]
+    for register in (header[1], header[2]):
+        bits = _uint16_to_bits(register)
+        result += [bool(bits[5]), bool(bits[13]), _getuint([bits[6], bits[7]]), _getuint([bits[14], bits[15]])]
+    status = _uint16_to_bits(header[3])
+    result += [bool(status[i]) for i in (15, 14, 13, 12)]
+    relay = _uint16_to_bits(header[4])
+    result += [_getuint([relay[12], relay[13]]), _getuint([relay[14], relay[15]])]
+    for value in statuses:
+        bits = _uint16_to_bits(value)
+        result += [_getuint(bits[0:8]), bool(bits[15]), bool(bits[14]), bool(bits[13]),
+                   _getuint([bits[12], bits[11], bits[10]])]
+    return result
+
+
+def decode_masks(header, statuses):
+    config = header[0]
+    result = [MODULE_CONFIG.flag(config, name) for name in (
+        "first_group_valve", "second_group_valve", "floor_washing_mode", "first_group_alarm", "second_group_alarm",
+        "discharge_wireless_sensors", "lost_wireless_sensors", "connecting_wireless_sensors_mode",
+        "dual_group_mode", "close_valve_when_loss_sensor", "lock_buttons")]
+    for register, value, first in ((INPUT_LINE_1_2_CONFIG, header[1], 1), (INPUT_LINE_3_4_CONFIG, header[2], 3)):
+        result += [register.flag(value, f"line_{first}_type"), register.flag(value, f"line_{first + 1}_type"),
+                   register.get(value, f"line_{first}_group"), register.get(value, f"line_{first + 1}_group")]
+    result += [STATUS_WIRED_LINE.flag(header[3], f"line_{n}_alarm") for n in (1, 2, 3, 4)]
+    result += [RELAY_CONFIG.get(header[4], "switch_when_close_valve"), RELAY_CONFIG.get(header[4], "switch_when_alert")]
+    for value in statuses:
+        result += [BATTERY_LEVEL_FIELD.decode(value), bool(value & ALERT_FIELD.mask),
+                   bool(value & DISCHARGE_FIELD.mask), bool(value & LOST_FIELD.mask),
+                   SIGNAL_LEVEL_BY_RAW[SIGNAL_LEVEL_FIELD.decode(value)]]
+    return result
+
+
+def main(cycles):
+    rng = random.Random(1)
+    header = [rng.randrange(0x10000) for _ in range(5)]
+    statuses = [rng.randrange(0x10000) for _ in range(SENSORS)]
+    # Оба пути должны давать одинаковый результат
+    assert decode_bit_lists(header, statuses) == decode_masks(header, statuses)
+
+    print(f"разбор заголовка и {SENSORS} датчиков, {cycles} циклов"
+          + ("" if BitArray is not None else " (bitstring не установлен, BitArray заменен сверткой битов)"))
+    bit_lists = timeit.timeit(lambda: decode_bit_lists(header, statuses), number=cycles)
+    masks = timeit.timeit(lambda: decode_masks(header, statuses), number=cycles)
+    print(f"{'списки битов':>14}: {bit_lists / cycles * 1e6:9.1f} мкс/цикл")
+    print(f"{'маски':>14}: {masks / cycles * 1e6:9.1f} мкс/цикл")
+    print(f"{'ускорение':>14}: {bit_lists / masks:9.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,126 @@
+"""Сравнение транспортов Modbus TCP: клиент pymodbus и облегченный ModbusTcpClient.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_transport.py [число_запросов]
+
+Ответчик Modbus запускается отдельным процессом, поэтому процессорное время бенчмарка
+относится только к клиенту. Каждый клиент выполняет одинаковую серию чтений FC03 блока
+заголовка по одному запросу за раз, как это делает очередь шины ModbusGateway.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "custom_components"))
+
+from pymodbus.client import AsyncModbusTcpClient  # noqa: E402
+from pymodbus.framer import FramerType  # noqa: E402
+
+from neptun_smart_local.hub import DEFAULT_UNIT_ID, ModbusTcpClient  # noqa: E402
+from neptun_smart_local.registers import NeptunSmartRegisters  # noqa: E402
+
+HOST = "127.0.0.1"
+PORT = 15020
+WARMUP_REQUESTS = 50
+MBAP_HEADER = struct.Struct(">HHHB")
+
+
+class Responder(asyncio.Protocol):
+    """Ответчик FC03: возвращает нули запрошенной длины, остальные функции - эхо запроса"""
+
+    def connection_made(self, transport) -> None:
+        self._transport = transport
+        self._buffer = bytearray()
+
+    def data_received(self, data) -> None:
+        self._buffer += data
+        while len(self._buffer) >= MBAP_HEADER.size:
+            transaction_id, _, length, unit_id = MBAP_HEADER.unpack_from(self._buffer)
+            end = 6 + length
+            if len(self._buffer) < end:
+                return
+            pdu = bytes(self._buffer[MBAP_HEADER.size:end])
+            del self._buffer[:end]
+            if pdu[0] == 0x03:
+                count = struct.unpack_from(">H", pdu, 3)[0]
+                pdu = bytes((0x03, count * 2)) + bytes(count * 2)
+            self._transport.write(MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, unit_id) + pdu)
+
+
+async def _serve() -> None:
+    server = await asyncio.get_running_loop().create_server(Responder, HOST, PORT)
+    async with server:
+        await server.serve_forever()
+
+
+async def _measure(client, requests) -> dict:
+    count = NeptunSmartRegisters.header_size
+    for _ in range(WARMUP_REQUESTS):
+        await client.read_holding_registers(0, count=count, device_id=DEFAULT_UNIT_ID)
+    latencies = []
+    cpu_started = time.process_time()
+    for _ in range(requests):
+        started = time.perf_counter()
+        result = await client.read_holding_registers(0, count=count, device_id=DEFAULT_UNIT_ID)
+        latencies.append(time.perf_counter() - started)
+        assert not result.isError() and len(result.registers) == count
+    cpu = time.process_time() - cpu_started
+    latencies.sort()
+    return {
+        "cpu_us": cpu / requests * 1e6,
+        "median_us": statistics.median(latencies) * 1e6,
+        "p95_us": latencies[int(len(latencies) * 0.95)] * 1e6,
+    }
+
+
+async def _run(requests) -> None:
+    clients = {
+        "pymodbus": AsyncModbusTcpClient(host=HOST, port=PORT, framer=FramerType.SOCKET, retries=1,
+                                         timeout=5, reconnect_delay=0),
+        "native": ModbusTcpClient(HOST, PORT, timeout=5),
+    }
+    print(f"запросов FC03 по {NeptunSmartRegisters.header_size} регистров: {requests}")
+    print(f"{'транспорт':>10} {'CPU, мкс/запрос':>16} {'медиана, мкс':>13} {'p95, мкс':>9}")
+    for name, client in clients.items():
+        await client.connect()
+        stats = await _measure(client, requests)
+        client.close()
+        print(f"{name:>10} {stats['cpu_us']:>16.1f} {stats['median_us']:>13.1f} {stats['p95_us']:>9.1f}")
+
+
+def _wait_server(timeout=30) -> None:
+    """Ждет, пока процесс ответчика (он импортирует интеграцию) откроет порт"""
+    expires = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((HOST, PORT), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > expires:
+                raise
+            time.sleep(0.1)
+
+
+def main() -> None:
+    if sys.argv[1:2] == ["--serve"]:
+        asyncio.run(_serve())
+        return
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    server = subprocess.Popen([sys.executable, __file__, "--serve"])
+    try:
+        _wait_server()
+        asyncio.run(_run(requests))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
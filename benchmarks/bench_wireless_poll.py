@@ -0,0 +1,96 @@
+"""Сравнение времени цикла опроса: по одному датчику и по скомпилированному плану чтения.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_wireless_poll.py [задержка_запроса_мс]
+
+Модуль эмулируется в памяти, каждый запрос Modbus стоит фиксированную задержку,
+поэтому результат показывает зависимость длительности цикла от числа датчиков.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "custom_components"))
+
+from neptun_smart_local.device import NeptunSmart  # noqa: E402
+from neptun_smart_local.registers import NeptunSmartRegisters  # noqa: E402
+
+SENSOR_COUNTS = (1, 5, 10, 20, 50)
+
+
+class SimulatedClient:
+    connected = True
+
+
+class SimulatedHub:
+    """Эмуляция modbus_hub: регистры в памяти, фиксированная задержка на запрос"""
+
+    def __init__(self, latency):
+        self._latency = latency
+        self._lock = asyncio.Lock()
+        self._client = SimulatedClient()
+        self._registers = [0] * 131
+        self.requests = 0
+
+    def set_register_ttls(self, ttls):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def probe_mask_write(self, address, deadline=None):
+        pass
+
+    async def _request(self):
+        async with self._lock:
+            self.requests += 1
+            await asyncio.sleep(self._latency)
+
+    async def read_holding_registers(self, address, count, priority=None, deadline=None):
+        await self._request()
+        return self._registers[address:address + count]
+
+
+async def _poll_per_item(device, hub):
+    """Прежний цикл опроса: заголовок, каждый регистр датчика и каждый счетчик отдельным запросом"""
+    await hub.read_holding_registers(NeptunSmartRegisters.module_config, NeptunSmartRegisters.header_size)
+    for sensor in device.wireless_sensors:
+        for address in (sensor.get_address(), sensor.get_status_address()):
+            device.apply_registers(dict(enumerate(await hub.read_holding_registers(address, 1), address)))
+    for counter in device.counters:
+        address = counter.get_address()
+        device.apply_registers(dict(enumerate(await hub.read_holding_registers(address, 2), address)))
+
+
+async def _run(latency):
+    print(f"задержка запроса {latency * 1000:.0f} мс")
+    print(f"{'датчиков':>9} {'по одному, с':>14} {'запросов':>9} {'по плану, с':>12} {'запросов':>9}")
+    for count in SENSOR_COUNTS:
+        hub = SimulatedHub(latency)
+        hub._registers[NeptunSmartRegisters.count_of_connected_wireless_sensors] = count
+        # Вместо hass - только реестр общих соединений, к модулю бенчмарк не подключается
+        device = NeptunSmart(SimpleNamespace(data={}), "bench", "127.0.0.1", 503)
+        device._hub = hub
+        await device.init_sensors()
+
+        # Прежний цикл: заголовок и каждый датчик отдельными запросами
+        hub.requests = 0
+        started = time.perf_counter()
+        await _poll_per_item(device, hub)
+        per_sensor = time.perf_counter() - started
+        per_sensor_requests = hub.requests
+
+        hub.requests = 0
+        started = time.perf_counter()
+        await device.update()
+        planned = time.perf_counter() - started
+
+        print(f"{count:>9} {per_sensor:>14.3f} {per_sensor_requests:>9} {planned:>12.3f} {hub.requests:>9}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_run(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.03))
@@ -1,14 +1,35 @@
 from __future__ import annotations
 
-# import logging
 import asyncio
+import logging
+
+import pymodbus
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity import Entity
+from homeassistant.loader import async_get_integration
 
-from .const import DOMAIN
+from .const import (
+    CONF_MAX_POLL_INTERVAL,
+    CONF_MAX_REQUEST_TIMEOUT,
+    CONF_MIN_REQUEST_TIMEOUT,
+    CONF_PROXY_HOST,
+    CONF_PROXY_PORT,
+    CONF_TRANSPORT,
+    CONF_UNIT_ID,
+    DATA_FLEET,
+    DEFAULT_PROXY_HOST,
+    DOMAIN,
+    MANUFACTURER,
+    MODEL,
+    PROXY_PYMODBUS_SERIES,
+)
+from .coordinator import NeptunSmartCoordinator
 from .device import NeptunSmart
+from .hub import DEFAULT_MAX_REQUEST_TIMEOUT, DEFAULT_MIN_REQUEST_TIMEOUT, DEFAULT_UNIT_ID, TRANSPORT_PYMODBUS
+from .scheduler import DEFAULT_MAX_POLL_INTERVAL, FleetScheduler, poll_intervals_from_options
 PLATFORMS = [
     "binary_sensor",
     "select",
@@ -16,7 +37,24 @@ PLATFORMS = [
     "switch",
 ]
 
-# _LOGGER = logging.getLogger(__name__)
+_LOGGER = logging.getLogger(__name__)
+
+
+def _pymodbus_series() -> tuple:
+    """Основная и младшая версии установленного pymodbus"""
+    return tuple(int(part) for part in pymodbus.__version__.split(".")[:2])
+
+
+def _get_fleet(hass: HomeAssistant) -> FleetScheduler:
+    """Общее расписание опросов домена. Создается при настройке первой записи сразу со всеми
+    включенными записями, чтобы фазы модулей не зависели от порядка их загрузки."""
+    fleet = hass.data.get(DATA_FLEET)
+    if fleet is None:
+        fleet = hass.data[DATA_FLEET] = FleetScheduler()
+        fleet.register(*(entry.entry_id for entry in hass.config_entries.async_entries(DOMAIN)
+                         if entry.disabled_by is None))
+    return fleet
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
@@ -26,23 +64,72 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     name = entry.data["name"]
     host_port = entry.data["host_port"]
     host_ip = entry.data["host_ip"]
-    device = NeptunSmart(hass, name, host_ip, host_port)
+    device = NeptunSmart(hass, name, host_ip, host_port,
+                         poll_intervals=poll_intervals_from_options(entry.options),
+                         max_poll_interval=entry.options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL),
+                         min_request_timeout=entry.options.get(CONF_MIN_REQUEST_TIMEOUT, DEFAULT_MIN_REQUEST_TIMEOUT),
+                         max_request_timeout=entry.options.get(CONF_MAX_REQUEST_TIMEOUT, DEFAULT_MAX_REQUEST_TIMEOUT),
+                         unit_id=entry.data.get(CONF_UNIT_ID, DEFAULT_UNIT_ID),
+                         transport=entry.options.get(CONF_TRANSPORT, TRANSPORT_PYMODBUS))
+    fleet = _get_fleet(hass)
+    fleet.register(entry.entry_id)
     try:
-        await device.init_sensors()
-        await device.update()
-    except ValueError as ex:
-        raise ConfigEntryNotReady(f"Timeout while connecting {host_ip}") from ex
-    hass.data[DOMAIN][entry.entry_id] = device
+        try:
+            # Первые подключение, чтение и опрос выполняются в точке фазы модуля, дальше
+            # координатор планирует каждый опрос на ее сетке; число модулей ограничено
+            await fleet.wait_slot(entry.entry_id, device.get_poll_tick())
+            async with fleet.poll():
+                await device.init_sensors()
+        except ValueError as ex:
+            raise ConfigEntryNotReady(f"Timeout while connecting {host_ip}") from ex
+        # Манифест читается загрузчиком HA в executor и кэшируется, сущности получают готовый DeviceInfo
+        integration = await async_get_integration(hass, DOMAIN)
+        device.set_device_info(DeviceInfo(
+            identifiers={(DOMAIN, name)},
+            name=name,
+            sw_version=str(integration.version) if integration.version else "unknown",
+            model=MODEL,
+            manufacturer=MANUFACTURER,
+        ))
+        coordinator = NeptunSmartCoordinator(hass, device, fleet, entry.entry_id)
+        # Первый опрос без исключения: модуль может быть временно недоступен
+        await coordinator.async_refresh()
+        hass.data[DOMAIN][entry.entry_id] = coordinator
+        proxy_port = entry.options.get(CONF_PROXY_PORT, 0)
+        if proxy_port and _pymodbus_series() != PROXY_PYMODBUS_SERIES:
+            _LOGGER.error("Modbus прокси %s не запущен: он работает с pymodbus %s.%s, установлен %s",
+                          device.get_name(), *PROXY_PYMODBUS_SERIES, pymodbus.__version__)
+        elif proxy_port:
+            # Сервер pymodbus загружается только при включенном прокси
+            from .proxy import RegisterImageProxy
+
+            proxy = RegisterImageProxy(device, proxy_port, entry.options.get(CONF_PROXY_HOST, DEFAULT_PROXY_HOST))
+            if await proxy.start():
+                coordinator.set_proxy(proxy)
+                entry.async_on_unload(proxy.stop)
+    except BaseException:
+        # Устройство уже получило общее соединение: без освобождения его счетчик
+        # пользователей не вернется к нулю и соединение не закроется
+        await device.close()
+        raise
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     hass.async_create_task(
         hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     )
     return True
 
 
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Перезагружает запись после изменения настроек."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.device.close()
+        hass.data[DATA_FLEET].unregister(entry.entry_id)
 
     return unload_ok
@@ -1,4 +1,3 @@
-
 from __future__ import annotations
 
 import asyncio
@@ -10,15 +9,39 @@ import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.components.modbus import modbus
-
-from .const import DOMAIN
-from .registers import NeptunSmartRegisters
+from homeassistant.core import callback
+
+from .const import (
+    CONF_ALARM_INTERVAL,
+    CONF_CONFIG_INTERVAL,
+    CONF_COUNTER_INTERVAL,
+    CONF_DIAGNOSTIC_INTERVAL,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_MAX_REQUEST_TIMEOUT,
+    CONF_MIN_REQUEST_TIMEOUT,
+    CONF_PROXY_HOST,
+    CONF_PROXY_PORT,
+    CONF_TRANSPORT,
+    CONF_UNIT_ID,
+    DEFAULT_PROXY_HOST,
+    DOMAIN,
+)
+from .hub import (
+    DEFAULT_MAX_REQUEST_TIMEOUT,
+    DEFAULT_MIN_REQUEST_TIMEOUT,
+    DEFAULT_UNIT_ID,
+    TRANSPORT_PYMODBUS,
+    TRANSPORTS,
+)
+from .registers import POLL_ALARM, POLL_COUNTER, POLL_DIAGNOSTIC, NeptunSmartRegisters
+from .scheduler import DEFAULT_MAX_POLL_INTERVAL, DEFAULT_POLL_INTERVALS
 
 STEP_TCP_DATA_SCHEMA = vol.Schema(
     {
         vol.Required("name", default="Neptun_Smart"): str,
         vol.Required("host_ip"): str,
         vol.Required("host_port", default="503"): str,
+        vol.Required(CONF_UNIT_ID, default=DEFAULT_UNIT_ID): vol.All(vol.Coerce(int), vol.Range(min=1, max=247)),
     }
 )
 
@@ -61,3 +84,51 @@ class NeptunSmartConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             step_id="tcp", data_schema=STEP_TCP_DATA_SCHEMA, errors=errors
         )
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        return NeptunSmartOptionsFlow(config_entry)
+
+
+class NeptunSmartOptionsFlow(config_entries.OptionsFlow):
+    """Настройки опроса: интервалы классов регистров в секундах (0 - только по запросу),
+    потолок адаптивного такта, границы таймаута ответа модуля, порт локального прокси и транспорт"""
+
+    def __init__(self, config_entry) -> None:
+        self._config_entry = config_entry
+
+    async def async_step_init(self, user_input: Optional[dict(str, Any)] = None):
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self._config_entry.options
+        schema = vol.Schema(
+            {
+                vol.Required(CONF_ALARM_INTERVAL,
+                             default=options.get(CONF_ALARM_INTERVAL, DEFAULT_POLL_INTERVALS[POLL_ALARM])):
+                    vol.All(vol.Coerce(float), vol.Range(min=0.5)),
+                vol.Required(CONF_COUNTER_INTERVAL,
+                             default=options.get(CONF_COUNTER_INTERVAL, DEFAULT_POLL_INTERVALS[POLL_COUNTER])):
+                    vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Required(CONF_DIAGNOSTIC_INTERVAL,
+                             default=options.get(CONF_DIAGNOSTIC_INTERVAL, DEFAULT_POLL_INTERVALS[POLL_DIAGNOSTIC])):
+                    vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Required(CONF_CONFIG_INTERVAL, default=options.get(CONF_CONFIG_INTERVAL, 0)):
+                    vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Required(CONF_MAX_POLL_INTERVAL,
+                             default=options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL)):
+                    vol.All(vol.Coerce(float), vol.Range(min=1)),
+                vol.Required(CONF_MIN_REQUEST_TIMEOUT,
+                             default=options.get(CONF_MIN_REQUEST_TIMEOUT, DEFAULT_MIN_REQUEST_TIMEOUT)):
+                    vol.All(vol.Coerce(float), vol.Range(min=0.05, max=10)),
+                vol.Required(CONF_MAX_REQUEST_TIMEOUT,
+                             default=options.get(CONF_MAX_REQUEST_TIMEOUT, DEFAULT_MAX_REQUEST_TIMEOUT)):
+                    vol.All(vol.Coerce(float), vol.Range(min=0.1, max=30)),
+                vol.Required(CONF_PROXY_PORT, default=options.get(CONF_PROXY_PORT, 0)):
+                    vol.All(vol.Coerce(int), vol.Range(min=0, max=65535)),
+                vol.Required(CONF_PROXY_HOST, default=options.get(CONF_PROXY_HOST, DEFAULT_PROXY_HOST)): str,
+                vol.Required(CONF_TRANSPORT, default=options.get(CONF_TRANSPORT, TRANSPORT_PYMODBUS)):
+                    vol.In(TRANSPORTS),
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=schema)
@@ -1 +1,30 @@
-DOMAIN = "neptun_smart_local"
\ No newline at end of file
+DOMAIN = "neptun_smart_local"
+# Ключ hass.data для общего расписания опросов всех записей домена
+DATA_FLEET = f"{DOMAIN}_fleet"
+# Ключ hass.data для общих соединений со шлюзами по host:port
+DATA_GATEWAYS = f"{DOMAIN}_gateways"
+# Адрес модуля на шине Modbus в данных записи
+CONF_UNIT_ID = "unit_id"
+MANUFACTURER = "Teploluxe"
+MODEL = "Neptun Smart"
+
+# Интервалы опроса классов регистров в настройках записи, секунды (0 - только по запросу)
+CONF_ALARM_INTERVAL = "alarm_interval"
+CONF_COUNTER_INTERVAL = "counter_interval"
+CONF_DIAGNOSTIC_INTERVAL = "diagnostic_interval"
+CONF_CONFIG_INTERVAL = "config_interval"
+CONF_MAX_POLL_INTERVAL = "max_poll_interval"
+# Границы адаптивного таймаута ответа модуля, секунды
+CONF_MIN_REQUEST_TIMEOUT = "min_request_timeout"
+CONF_MAX_REQUEST_TIMEOUT = "max_request_timeout"
+# Порт локального Modbus TCP прокси с образом регистров модуля (0 - прокси выключен)
+CONF_PROXY_PORT = "proxy_port"
+# Адрес, на котором слушает прокси; по умолчанию только локальные клиенты - записи через
+# прокси не требуют авторизации и управляют кранами
+CONF_PROXY_HOST = "proxy_host"
+DEFAULT_PROXY_HOST = "127.0.0.1"
+# Серия pymodbus, с внутренним устройством сервера которой работает прокси; с другими
+# версиями прокси не запускается
+PROXY_PYMODBUS_SERIES = (3, 16)
+# Транспорт Modbus TCP: клиент pymodbus или облегченный встроенный клиент
+CONF_TRANSPORT = "transport"
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .device import NeptunSmart
+from .scheduler import FleetScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class NeptunSmartCoordinator(DataUpdateCoordinator[None]):
+    """Единственный владелец расписания опроса модуля: один NeptunSmart.update() на цикл.
+
+    Собственное планирование DataUpdateCoordinator отключено (update_interval = None): оно
+    округляет срок до целой секунды, и фазы модулей не сохранялись бы. Каждый опрос
+    планируется на ближайшую точку сетки модуля из общего расписания домена FleetScheduler
+    с шагом текущего адаптивного такта; число одновременно опрашиваемых модулей ограничено.
+    """
+
+    def __init__(self, hass: HomeAssistant, device: NeptunSmart, fleet: FleetScheduler, key) -> None:
+        super().__init__(hass, _LOGGER, name=device.get_name(), update_interval=None)
+        self.device = device
+        self._fleet = fleet
+        self._key = key
+        # Такт, с которым запланирован ближайший опрос; вначале - интервал самого частого класса
+        self._scheduled_interval = device.get_poll_tick()
+        self._unsub_poll = None
+        self._polling = False
+        self._proxy = None
+        # Состояние, подтвержденное перечитыванием после команды, рассылается сущностям сразу,
+        # не дожидаясь опроса
+        device.add_state_listener(self.async_update_listeners)
+        device.add_command_listener(self._command_sent)
+
+    async def _async_update_data(self) -> None:
+        started = self.hass.loop.time()
+        self._polling = True
+        try:
+            async with self._fleet.poll():
+                await self.device.update()
+        finally:
+            self._polling = False
+            # Опрос дольше запланированного такта занял его точки сетки, они считаются пропущенными
+            skipped = int((self.hass.loop.time() - started) // self._scheduled_interval)
+            if skipped > 0:
+                self.device.record_skipped_cycles(skipped)
+            # Следующий опрос - на сетке с шагом, выбранным адаптивным тактом модуля
+            self._schedule_poll()
+        if not self.device.is_connected():
+            raise UpdateFailed(f"Нет связи с устройством {self.device.get_name()}")
+
+    @callback
+    def _command_sent(self) -> None:
+        """После команды ускоренный такт начинается сразу, а не после ближайшего планового опроса"""
+        # Идущий опрос сам запланирует следующий уже с ускоренным тактом
+        if not self._polling:
+            self._schedule_poll()
+
+    @callback
+    def _schedule_poll(self) -> None:
+        """Планирует опрос на ближайшую точку сетки модуля с шагом текущего такта"""
+        self._cancel_poll()
+        if self.config_entry and self.config_entry.pref_disable_polling:
+            return
+        loop = self.hass.loop
+        self._scheduled_interval = self.device.get_poll_interval()
+        slot = self._fleet.next_slot(self._key, self._scheduled_interval, loop.time())
+        self._unsub_poll = loop.call_at(slot, self._poll_due).cancel
+
+    @callback
+    def _poll_due(self) -> None:
+        self._unsub_poll = None
+        self.hass.async_create_task(self.async_refresh())
+
+    @callback
+    def _cancel_poll(self) -> None:
+        if self._unsub_poll is not None:
+            self._unsub_poll()
+            self._unsub_poll = None
+
+    async def async_shutdown(self) -> None:
+        self._cancel_poll()
+        await super().async_shutdown()
+
+    def get_fleet_stats(self) -> dict:
+        return self._fleet.get_stats()
+
+    def set_proxy(self, proxy) -> None:
+        self._proxy = proxy
+
+    def get_proxy_stats(self) -> dict | None:
+        """Статистика Modbus прокси модуля, None - прокси не запущен"""
+        return None if self._proxy is None else self._proxy.get_stats()
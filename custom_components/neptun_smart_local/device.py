@@ -3,51 +3,117 @@ from __future__ import annotations
 import asyncio
 import datetime
 import logging
+import time
 import async_timeout
 from asyncio.exceptions import InvalidStateError
-from bitstring import BitArray
 from homeassistant.core import HomeAssistant
 from pymodbus import ModbusException
 from pymodbus.exceptions import ModbusIOException
 
-from .hub import modbus_hub
-from .registers import NeptunSmartRegisters
+from .hub import (
+    DEFAULT_MAX_REQUEST_TIMEOUT,
+    DEFAULT_MIN_REQUEST_TIMEOUT,
+    DEFAULT_UNIT_ID,
+    Deadline,
+    PRIORITY_ALARM_READ,
+    PRIORITY_BACKGROUND_READ,
+    PRIORITY_EMERGENCY_WRITE,
+    PRIORITY_USER_WRITE,
+    TRANSPORT_PYMODBUS,
+    WriteBatcher,
+    modbus_hub,
+)
+from .log import RateLimitedLogger
+from .registers import (
+    POLL_ALARM,
+    POLL_CONFIG,
+    DEFAULT_MAX_READ_GAP,
+    FULL_MASK,
+    HEADER_REGISTERS,
+    INPUT_LINE_1_2_CONFIG,
+    INPUT_LINE_3_4_CONFIG,
+    MODULE_CONFIG,
+    RELAY_CONFIG,
+    NeptunSmartRegisters,
+    ReadPlan,
+    compile_address_plan,
+    compile_read_plan,
+    line_config_register,
+    module_registers,
+)
+from .scheduler import DEFAULT_MAX_POLL_INTERVAL, AdaptivePollInterval, PollScheduler
+from .shadow import DEFAULT_REGISTER_TTLS
+from .state import CounterState, ModuleState, WirelessSensorState
 
 _LOGGER = logging.getLogger(__name__)
+
+# Бюджет одного цикла опроса модуля, секунды
+POLL_CYCLE_TIMEOUT = 15
+# Бюджет отдельного опроса датчика или счетчика вне цикла, секунды
+ITEM_UPDATE_TIMEOUT = 10
+# Окно, за которое перечитывания после нескольких команд собираются в один план, секунды
+READ_BACK_DELAY = 0.02
+
+# Поля снимка ModuleState с сырыми значениями записываемых регистров заголовка
+HEADER_STATE_FIELDS = {
+    NeptunSmartRegisters.module_config: "config",
+    NeptunSmartRegisters.input_line_1_2_config: "config_line_1_2",
+    NeptunSmartRegisters.input_line_3_4_config: "config_line_3_4",
+    NeptunSmartRegisters.relay_config: "relay_config",
+}
+
+
 class NeptunSmart:
-    def __init__(self, hass: HomeAssistant, name, host_ip: str | None, host_port) ->None:
+    def __init__(self, hass: HomeAssistant, name, host_ip: str | None, host_port,
+                 max_read_gap=DEFAULT_MAX_READ_GAP, poll_intervals=None,
+                 max_poll_interval=DEFAULT_MAX_POLL_INTERVAL, min_request_timeout=DEFAULT_MIN_REQUEST_TIMEOUT,
+                 max_request_timeout=DEFAULT_MAX_REQUEST_TIMEOUT, unit_id=DEFAULT_UNIT_ID,
+                 transport=TRANSPORT_PYMODBUS) ->None:
         self._name = name
         self._hass = hass
-        self._hub = modbus_hub(hass=hass, host=host_ip, port=host_port)
-        self._line_type = [True, True, True, True, True]
-        self._line_group = [0, 0, 0, 0, 0]
-        self._line_status = [True, True, True, True, True]
+        # Модули за одним шлюзом RS-485 -> TCP используют одно соединение, различаясь unit id
+        self._hub = modbus_hub(hass=hass, host=host_ip, port=host_port, unit_id=unit_id,
+                               min_request_timeout=min_request_timeout, max_request_timeout=max_request_timeout,
+                               transport=transport)
+        self._writer = WriteBatcher(self._hub)
+        self._max_read_gap = max_read_gap
+        self._scheduler = PollScheduler(poll_intervals)
+        # В простое такт, а с ним и опрос аварий, растягивается до max_poll_interval
+        self._adaptive_interval = AdaptivePollInterval(self._scheduler.get_tick(), max_poll_interval)
+        self._registers = module_registers(0)
+        self._read_plans = {}
+        self._set_register_ttls()
+        self._read_plan = self.get_read_plan()
         self.wireless_sensors = []
         self.counters = []
-        self._wireless_sensors_connected = 0
-        
-        # Инициализируем атрибуты, которые используются в update()
-        self._first_group_valve_is_open = False
-        self._second_group_valve_is_open = False
-        self._floor_washing_mode = False
-        self._first_group_alarm = False
-        self._second_group_alarm = False
-        self._discharge_wireless_sensors = False
-        self._lost_wireless_sensors = False
-        self._connecting_wireless_sensors_mode = False
-        self._dual_group_mode = False
-        self._close_valve_when_loss_sensor = False
-        self._lock_buttons = False
-        self._switch_when_close_valve = 0
-        self._switch_when_alert = 0
-        
-        # Инициализируем битовые массивы
-        self._config_bits = None
-        self._config_line_1_2_bits = None
-        self._config_line_3_4_bits = None
-        self._status_wired_line_bits = None
-        self._relay_config_bits = None
+        self._counters_enabled_mask = 0
+        self._counter_listeners = []
+        self._state_listeners = []
+        self._command_listeners = []
+        # Число беспроводных датчиков, под которое построена карта регистров
+        self._wireless_sensors_count = 0
+        self._poll_duration = None
+        # Идущий цикл опроса и число вызовов update(), присоединившихся к нему
+        self._update_task = None
+        self._updates_deduplicated = 0
+        self._skipped_cycles = 0
+        self._register_image = {}
+        self._changed_registers = {}
+        # Описание устройства для реестра HA, заполняется при настройке записи
+        self._device_info = None
+        # Записанные, но еще не перечитанные значения регистров
+        self._written_registers = {}
+        # Регистры, ждущие перечитывания после команды: адрес -> время отправки команды
+        self._read_back_pending = {}
+        self._read_back_task = None
+        # Задержка от отправки команды до подтвержденного перечитыванием состояния
+        self._command_latency = {"count": 0, "total": 0.0, "max": 0.0, "last": None}
+        # Текущий снимок состояния модуля, заменяется целиком после каждого опроса
+        self._state = ModuleState()
         
+        # Повторяющиеся ошибки связи пишутся в журнал не чаще раза за интервал
+        self._error_log = RateLimitedLogger(_LOGGER)
+
         # Флаг для отслеживания состояния подключения
         self._connection_attempts = 0
         self._last_connection_attempt = 0
@@ -57,538 +123,770 @@ class NeptunSmart:
         try:
             await self._hub.connect()
         except (ValueError, asyncio.CancelledError) as e:
-            _LOGGER.error(f"Не удалось подключиться к устройству {self._name}: {e}")
+            _LOGGER.error("Не удалось подключиться к устройству %s: %s", self._name, e)
             # Не выбрасываем исключение, чтобы интеграция могла работать в автономном режиме
             return
         
         try:
-            self._wireless_sensors_connected = await self._hub.read_holding_register_uint16(
-                NeptunSmartRegisters.count_of_connected_wireless_sensors, 1)
+            deadline = Deadline(POLL_CYCLE_TIMEOUT)
+            header = await self._read_registers(compile_read_plan(HEADER_REGISTERS, self._max_read_gap), deadline)
+            wireless_sensors = header.get(NeptunSmartRegisters.count_of_connected_wireless_sensors)
             
             # Проверяем, что мы получили корректное значение
-            if self._wireless_sensors_connected is None:
+            if wireless_sensors is None:
                 _LOGGER.debug("Не удалось получить количество подключенных беспроводных датчиков, используем значение по умолчанию 0")
-                self._wireless_sensors_connected = 0
-            
-            for i in range(0, self._wireless_sensors_connected):
-                try:
-                    wireless_sensor_config = await self._hub.read_holding_register_uint16(
-                        NeptunSmartRegisters.first_wireless_sensor_config + i, 1)
-                    wireless_sensor_status_bits = await self._hub.read_holding_register_bits(
-                        NeptunSmartRegisters.first_wireless_sensor_status + i, 1)
-                    
-                    # Проверяем, что данные получены корректно
-                    if wireless_sensor_config is not None and wireless_sensor_status_bits is not None:
-                        self.wireless_sensors.append(
-                            WirelessSensor(self._hub, NeptunSmartRegisters.first_wireless_sensor_config + i,
-                                           NeptunSmartRegisters.first_wireless_sensor_status + i, wireless_sensor_config,
-                                           wireless_sensor_status_bits))
-                    else:
-                        _LOGGER.warning(f"Не удалось получить данные для беспроводного датчика {i}")
-                except Exception as e:
-                    _LOGGER.warning(f"Ошибка при инициализации беспроводного датчика {i}: {e}")
-
-            for i in range(0, 8):
-                try:
-                    counter_status = await self._hub.read_holding_register_bits(NeptunSmartRegisters.first_counter_config + i, 1)
-                    if counter_status is not None and counter_status[15] == 1:
-                        counter_value = await self._hub.read_holding_register_uint32(NeptunSmartRegisters.first_counter + (i * 2), 2)
-                        if counter_value is not None:
-                            self.counters.append(
-                                Counter(counter_value,
-                                        NeptunSmartRegisters.first_counter + (i * 2), self._hub))
-                        else:
-                            _LOGGER.debug(f"Не удалось получить значение счетчика {i}")
-                    elif counter_status is None:
-                        _LOGGER.debug(f"Не удалось получить статус счетчика {i}")
-                except Exception as e:
-                    _LOGGER.warning(f"Ошибка при инициализации счетчика {i}: {e}")
+                wireless_sensors = 0
+
+            self._set_wireless_sensors_count(wireless_sensors)
+            # Поддержка FC22 выясняется сразу, а не на первой команде пользователя
+            await self._hub.probe_mask_write(NeptunSmartRegisters.module_config, deadline)
+            image = await self._read_registers(self.get_read_plan(), deadline)
+            self._diff_register_image(image)
+            self._update_state()
+            self._init_wireless_sensors()
+            self._decode_counters()
         except Exception as e:
-            _LOGGER.error(f"Ошибка при инициализации датчиков для {self._name}: {e}")
+            _LOGGER.error("Ошибка при инициализации датчиков для %s: %s", self._name, e)
             # Продолжаем работу даже при ошибках инициализации
 
+    def _set_wireless_sensors_count(self, wireless_sensors):
+        """Перестраивает карту опрашиваемых регистров под число беспроводных датчиков"""
+        self._wireless_sensors_count = wireless_sensors
+        self._registers = module_registers(wireless_sensors)
+        self._read_plans = {}
+        self._set_register_ttls()
+        _LOGGER.debug("План полного опроса %s: %s", self._name, self.get_read_plan())
+
+    def _set_register_ttls(self):
+        """TTL регистров в теневом образе хаба по их классам опроса"""
+        self._hub.set_register_ttls({address: DEFAULT_REGISTER_TTLS[register.poll_class]
+                                     for register in self._registers
+                                     for address in range(register.address, register.end)})
+
+    def get_read_plan(self, poll_classes=None) -> ReadPlan:
+        """План чтения для набора классов опроса (по умолчанию все регистры), планы кэшируются"""
+        key = None if poll_classes is None else frozenset(poll_classes)
+        plan = self._read_plans.get(key)
+        if plan is None:
+            registers = [register for register in self._registers if key is None or register.poll_class in key]
+            plan = compile_read_plan(registers, self._max_read_gap)
+            self._read_plans[key] = plan
+        return plan
+
+    def get_last_read_plan(self) -> ReadPlan:
+        """План, по которому выполнен последний цикл update()"""
+        return self._read_plan
+
+    def get_poll_tick(self) -> float:
+        """Период такта опроса, секунды"""
+        return self._scheduler.get_tick()
+
+    def request_poll(self, *poll_classes):
+        """Опросить классы регистров на ближайшем такте вне расписания"""
+        self._scheduler.request(*poll_classes)
+
+    def command_sent(self, *poll_classes):
+        """Отмечает отправленную команду: ускоряет опрос и перечитывает затронутые классы.
+        Подписчики (координатор) переносят ближайший опрос на ускоренный такт сразу"""
+        self._adaptive_interval.boost(time.monotonic())
+        self.request_poll(*poll_classes)
+        for listener in self._command_listeners:
+            listener()
+
+    def get_poll_interval(self) -> float:
+        """Интервал до следующего опроса, выбранный адаптивным тактом, секунды"""
+        return self._adaptive_interval.get_interval()
+
+    def get_poll_interval_reason(self) -> str:
+        return self._adaptive_interval.get_reason()
+
+    def _is_active(self) -> bool:
+        """На модуле идет что-то, требующее частого опроса"""
+        state = self._state
+        return (state.first_group_alarm or state.second_group_alarm or state.floor_washing_mode
+                or state.connecting_wireless_sensors_mode)
+
+    async def _read_registers(self, plan: ReadPlan, deadline: Deadline | None = None):
+        """Выполняет план чтения и возвращает образ регистров {адрес: значение}.
+
+        Блоки, на которые не хватило срока deadline, не запрашиваются.
+        """
+        image = {}
+        for block in plan:
+            if deadline is not None and deadline.expired():
+                _LOGGER.debug("Срок цикла опроса %s истек, блок %s и следующие пропущены", self._name, block)
+                break
+            # Блоки с регистрами аварий получают шину раньше фоновых чтений
+            priority = PRIORITY_ALARM_READ if POLL_ALARM in plan.block_poll_classes(block) else PRIORITY_BACKGROUND_READ
+            values = await self._hub.read_holding_registers(block.address, block.count, priority, deadline)
+            if values is None:
+                _LOGGER.debug("Не удалось прочитать регистры %s устройства %s", block, self._name)
+                continue
+            for offset, value in enumerate(values):
+                image[block.address + offset] = value
+        return image
+
+    def _init_wireless_sensors(self):
+        for i, sensor in enumerate(self._state.wireless_sensors):
+            if sensor is None:
+                _LOGGER.warning("Не удалось получить данные для беспроводного датчика %s", i)
+                return
+            self.wireless_sensors.append(WirelessSensor(self, i))
+
+    def _update_state(self, values=None):
+        """Собирает новый снимок модуля из образа регистров и подменяет текущий одним присваиванием.
+
+        values - значения только что записанных регистров: они накладываются на прочитанный
+        образ, пока следующий опрос не перечитает эти регистры.
+        """
+        if values:
+            self._written_registers.update(values)
+        image = self._register_image
+        if self._written_registers:
+            image = {**image, **self._written_registers}
+        self._state = ModuleState.from_image(image, self._wireless_sensors_count, self._state)
+
+    def apply_registers(self, values):
+        """Вносит прочитанные вне плана значения регистров в образ и обновляет снимок"""
+        self._register_image = {**self._register_image, **values}
+        for address in values:
+            self._written_registers.pop(address, None)
+        self._update_state()
+
+    def get_state(self) -> ModuleState:
+        """Текущий снимок состояния модуля"""
+        return self._state
+
+    def get_wireless_sensor_state(self, index) -> WirelessSensorState | None:
+        sensors = self._state.wireless_sensors
+        return sensors[index] if index < len(sensors) else None
+
+    def get_counter_state(self, index) -> CounterState | None:
+        counters = self._state.counters
+        return counters[index] if index < len(counters) else None
+
+    def _diff_register_image(self, image, merge=False):
+        """Сравнивает новый образ регистров с показанным сущностям: XOR слов дает измененные биты.
+
+        Сравнение идет с образом, на который наложены записанные значения, поэтому команда,
+        не принятая модулем, тоже видна как изменение. merge - добавить изменения к еще
+        не разосланным сущностям вместо замены.
+        """
+        shown = self.get_register_image()
+        changed = dict(self._changed_registers) if merge else {}
+        for address, value in image.items():
+            old = shown.get(address)
+            if old is None:
+                changed[address] = FULL_MASK
+            elif old ^ value:
+                changed[address] = changed.get(address, 0) | (old ^ value)
+        self._changed_registers = changed
+        self._register_image = {**self._register_image, **image}
+
+    def get_register_image(self) -> dict:
+        """Последний образ регистров {адрес: значение} с наложенными записанными значениями"""
+        if self._written_registers:
+            return {**self._register_image, **self._written_registers}
+        return self._register_image
+
+    async def read_registers(self, address, count) -> list[int] | None:
+        """Читает регистры вне плана опроса из теневого образа хаба, не меняя образ опроса.
+        Устаревшие регистры перечитываются через общую очередь шины"""
+        values = await self._hub.read_registers_cached(range(address, address + count), PRIORITY_BACKGROUND_READ,
+                                                       Deadline(ITEM_UPDATE_TIMEOUT))
+        return None if values is None else list(values.values())
+
+    async def write_registers(self, values) -> None:
+        """Записывает регистры {адрес: значение} по команде извне (например, через прокси).
+
+        В отличие от сеттеров сущностей ошибка записи пробрасывается вызывающему.
+        """
+        started = time.monotonic()
+        try:
+            async with async_timeout.timeout(ITEM_UPDATE_TIMEOUT):
+                await self._writer.write(values, PRIORITY_USER_WRITE)
+        except Exception:
+            self._schedule_read_back(values)
+            raise
+        self._update_state(values)
+        self._schedule_read_back(values, started)
+        self.command_sent(*{register.poll_class for register in self._registers
+                            if any(register.address <= address < register.end for address in values)})
+
+    def registers_changed(self, watched) -> bool:
+        """Изменился ли в последнем опросе хотя бы один бит из набора (адрес, маска)"""
+        return any(self._changed_registers.get(address, 0) & mask for address, mask in watched)
+
+    def _schedule_read_back(self, addresses, started=None):
+        """Ставит записанные регистры в очередь на перечитывание.
+
+        started - время отправки подтвержденной команды, от него считается задержка до
+        подтвержденного состояния. Перечитывания, накопившиеся за READ_BACK_DELAY и пока идет
+        предыдущее, уходят одним планом.
+        """
+        for address in addresses:
+            if address not in self._read_back_pending or started is not None and (
+                    self._read_back_pending[address] is None or started < self._read_back_pending[address]):
+                self._read_back_pending[address] = started
+        if self._read_back_task is None:
+            self._read_back_task = asyncio.get_running_loop().create_task(self._read_back())
+
+    async def _read_back(self):
+        try:
+            while self._read_back_pending:
+                await asyncio.sleep(READ_BACK_DELAY)
+                pending, self._read_back_pending = self._read_back_pending, {}
+                image = {}
+                deadline = Deadline(ITEM_UPDATE_TIMEOUT)
+                for block in compile_address_plan(pending, self._max_read_gap):
+                    # Пользователь ждет результат команды, поэтому перечитывание идет вне TTL теневого образа
+                    # и с приоритетом чтения аварий
+                    values = await self._hub.read_holding_registers(block.address, block.count,
+                                                                    PRIORITY_ALARM_READ, deadline)
+                    if values is None:
+                        _LOGGER.debug("Не удалось перечитать регистры %s устройства %s после команды", block, self._name)
+                        continue
+                    for offset, value in enumerate(values):
+                        image[block.address + offset] = value
+                if image:
+                    self._apply_read_back({address: value for address, value in image.items() if address in pending},
+                                          pending)
+        except Exception as e:
+            _LOGGER.debug("Перечитывание регистров %s после команды прервано: %s", self._name, e)
+        finally:
+            self._read_back_task = None
+
+    def _apply_read_back(self, image, pending):
+        """Вносит перечитанные после команды регистры в снимок и сразу рассылает его сущностям"""
+        now = time.monotonic()
+        for address, value in image.items():
+            written = self._written_registers.get(address)
+            if written is not None and written != value:
+                _LOGGER.debug("Модуль %s не принял команду: регистр %s = %#06x вместо %#06x",
+                              self._name, address, value, written)
+        self._diff_register_image(image, merge=True)
+        for address in image:
+            self._written_registers.pop(address, None)
+        self._update_state()
+        # Команда, затронувшая несколько регистров, учитывается один раз
+        for started in {pending[address] for address in image if pending[address] is not None}:
+            self._record_command_latency(now - started)
+        for listener in self._state_listeners:
+            listener()
+
+    def _record_command_latency(self, latency):
+        stats = self._command_latency
+        stats["count"] += 1
+        stats["total"] += latency
+        stats["max"] = max(stats["max"], latency)
+        stats["last"] = latency
+
+    def get_command_latency_stats(self) -> dict:
+        """Задержка от отправки команды до состояния, подтвержденного перечитыванием, мс"""
+        stats = self._command_latency
+        return {
+            "count": stats["count"],
+            "last_ms": None if stats["last"] is None else round(stats["last"] * 1000, 1),
+            "avg_ms": round(stats["total"] / stats["count"] * 1000, 1) if stats["count"] else None,
+            "max_ms": round(stats["max"] * 1000, 1),
+        }
+
+    def add_state_listener(self, listener):
+        """Подписка на снимки, обновленные вне цикла опроса, возвращает функцию отписки"""
+        self._state_listeners.append(listener)
+
+        def remove_listener():
+            self._state_listeners.remove(listener)
+
+        return remove_listener
+
+    def add_command_listener(self, listener):
+        """Подписка на подтвержденные модулем команды, возвращает функцию отписки"""
+        self._command_listeners.append(listener)
+
+        def remove_listener():
+            self._command_listeners.remove(listener)
+
+        return remove_listener
+
+    def get_queue_wait_stats(self) -> dict:
+        """Время ожидания шины по классам приоритета"""
+        return self._hub.get_queue_wait_stats()
+
+    async def close(self) -> None:
+        """Освобождает соединение с модулем при выгрузке записи"""
+        if self._read_back_task is not None:
+            self._read_back_task.cancel()
+        await self._hub.disconnect()
+
+    def get_dedup_stats(self) -> dict:
+        """Сколько чтений и циклов опроса присоединились к уже идущим вместо повторного запроса"""
+        return {
+            "reads": self._hub.get_read_stats()["deduplicated"],
+            "updates": self._updates_deduplicated,
+        }
+
+    def get_shadow_stats(self) -> dict:
+        """Попадания и промахи теневого образа регистров"""
+        return self._hub.get_shadow_stats()
+
+    def get_rtt_stats(self) -> dict:
+        """Оценка времени ответа модуля и текущий таймаут запроса"""
+        return self._hub.get_rtt_stats()
+
+    def get_poll_duration(self):
+        """Длительность последнего цикла опроса модуля, секунды"""
+        return self._poll_duration
+
+    def get_skipped_cycles(self) -> int:
+        """Сколько тактов пропущено из-за циклов, превысивших интервал"""
+        return self._skipped_cycles
+
+    def record_skipped_cycles(self, count) -> None:
+        """Цикл опроса не уложился в интервал: точки расписания, на которые он пришелся, пропущены"""
+        self._skipped_cycles += count
+        _LOGGER.debug("Цикл опроса %s превысил интервал %.1f с, пропущено тактов: %d",
+                      self._name, self.get_poll_interval(), count)
+
+    def _decode_counters(self):
+        """Отслеживает маску включенных на модуле счетчиков по снимку состояния.
+
+        Новые счетчики создаются сразу, выключенные помечаются недоступными.
+        """
+        counters = self._state.counters
+        if not counters or any(counter is None for counter in counters):
+            _LOGGER.debug("Не удалось получить блок счетчиков %s", self._name)
+            return
+
+        enabled_mask = 0
+        for i, counter in enumerate(counters):
+            if counter.enabled:
+                enabled_mask |= 1 << i
+        known = {counter.get_index() for counter in self.counters}
+        new_counters = []
+        for i, counter in enumerate(counters):
+            if i in known or not counter.enabled:
+                continue
+            counter = Counter(self, i)
+            self.counters.append(counter)
+            new_counters.append(counter)
+
+        if enabled_mask != self._counters_enabled_mask:
+            _LOGGER.info("Маска включенных счетчиков %s изменилась: %#04x -> %#04x", self._name, self._counters_enabled_mask, enabled_mask)
+            self._counters_enabled_mask = enabled_mask
+        if new_counters:
+            for listener in self._counter_listeners:
+                listener(new_counters)
+
+    def add_counter_listener(self, listener):
+        """Подписка на появление новых счетчиков, возвращает функцию отписки"""
+        self._counter_listeners.append(listener)
+
+        def remove_listener():
+            self._counter_listeners.remove(listener)
+
+        return remove_listener
+
     async def _check_and_reconnect(self):
-        """Проверяет подключение и пытается переподключиться при необходимости"""
+        """Проверяет подключение. Паузами между попытками и автоматом управляет modbus_hub"""
         try:
-            # Простая проверка - если клиент подключен, считаем что подключение есть
-            if hasattr(self._hub, '_client') and self._hub._client.connected:
-                self._is_connected = True
-                return True
-            
-            # Если не подключен, пытаемся подключиться
-            _LOGGER.info(f"Попытка подключения к устройству {self._name}")
             await self._hub.connect()
-            
-            # Добавляем небольшую задержку после подключения для стабилизации
-            await asyncio.sleep(0.2)
-            
-            self._is_connected = True
-            _LOGGER.info(f"Успешно подключились к устройству {self._name}")
-            return True
-        except Exception as e:
-            _LOGGER.error(f"Не удалось подключиться к устройству {self._name}: {e}")
+        except ValueError as e:
+            _LOGGER.debug("Модуль %s недоступен: %s", self._name, e)
             self._is_connected = False
             return False
+        self._is_connected = True
+        return True
+
+    def get_connection_state(self) -> str:
+        """Состояние автомата соединения: connected, backing_off, half_open, open; closed - после close()"""
+        return self._hub.get_connection_state()
 
     async def update(self):
+        """Цикл опроса модуля. Вызов во время идущего цикла не запускает второй, а ждет текущий"""
+        if self._update_task is not None:
+            self._updates_deduplicated += 1
+            await asyncio.shield(self._update_task)
+            return
+        self._update_task = asyncio.get_running_loop().create_task(self._update())
+        self._update_task.add_done_callback(self._update_done)
+        await asyncio.shield(self._update_task)
+
+    def _update_done(self, task):
+        self._update_task = None
+
+    async def _update(self):
         try:
             # Проверяем подключение
             if not await self._check_and_reconnect():
-                _LOGGER.debug(f"Не удалось подключиться к устройству {self._name}, пропускаем обновление")
+                _LOGGER.debug("Не удалось подключиться к устройству %s, пропускаем обновление", self._name)
                 self._is_connected = False
                 return
                 
-            async with async_timeout.timeout(15):
-                self._config_bits = await self._hub.read_holding_register_bits(NeptunSmartRegisters.module_config, 1)
-                
-                # Проверяем, что данные получены корректно
-                if self._config_bits is None:
-                    _LOGGER.debug("Не удалось получить конфигурационные биты модуля")
-                    self._is_connected = False
-                    return
-                
-                # Если данные получены успешно, считаем что подключение активно
-                self._is_connected = True
-                
-                # Обновляем состояние только если данные получены корректно
-                if self._config_bits is not None and len(self._config_bits) >= 16:  # Проверяем, что у нас достаточно битов
-                    self._first_group_valve_is_open = bool(self._config_bits[7])
-                    self._second_group_valve_is_open = bool(self._config_bits[6])
-                    self._floor_washing_mode = bool(self._config_bits[15])
-                    self._first_group_alarm = bool(self._config_bits[14])
-                    self._second_group_alarm = bool(self._config_bits[13])
-                    self._discharge_wireless_sensors = bool(self._config_bits[12])
-                    self._lost_wireless_sensors = bool(self._config_bits[11])
-                    self._connecting_wireless_sensors_mode = bool(self._config_bits[8])
-                    self._dual_group_mode = bool(self._config_bits[5])
-                    self._close_valve_when_loss_sensor = bool(self._config_bits[4])
-                    self._lock_buttons = bool(self._config_bits[3])
-                    
-                    # Детальное логирование конфигурации
-                    _LOGGER.error(f"🔧 КОНФИГУРАЦИЯ МОДУЛЯ: dual_group_mode={self._dual_group_mode}, floor_washing={self._floor_washing_mode}, connecting_sensors={self._connecting_wireless_sensors_mode}")
-                    _LOGGER.error(f"🚰 СОСТОЯНИЕ ВЕНТИЛЕЙ: first_valve={self._first_group_valve_is_open}, second_valve={self._second_group_valve_is_open}")
-                    _LOGGER.error(f"⚠️ АВАРИИ: first_group_alarm={self._first_group_alarm}, second_group_alarm={self._second_group_alarm}")
-                    _LOGGER.error(f"📡 БЕСПРОВОДНЫЕ СЕНСОРЫ: discharge={self._discharge_wireless_sensors}, lost={self._lost_wireless_sensors}")
-                else:
-                    _LOGGER.warning(f"Недостаточно битов в конфигурации модуля: получено {len(self._config_bits) if self._config_bits else 0} битов, требуется 16")
-                    # Не обновляем состояние при проблемах с данными
-                    return
-                self._config_line_1_2_bits = await self._hub.read_holding_register_bits(NeptunSmartRegisters.input_line_1_2_config, 1)
-                
-                # Проверяем, что данные получены корректно
-                if self._config_line_1_2_bits is not None:
-                    self._line_type[1] = bool(self._config_line_1_2_bits[5])
-                    self._line_type[2] = bool(self._config_line_1_2_bits[13])
-                    self._line_group[1] = BitArray([self._config_line_1_2_bits[6], self._config_line_1_2_bits[
-                        7]])._getuint()  # 1 = first group, 2 = second group, 3 = both groups
-                    self._line_group[2] = BitArray([self._config_line_1_2_bits[14], self._config_line_1_2_bits[
-                        15]])._getuint()  # 1 = first group, 2 = second group, 3 = both groups
-                else:
-                    _LOGGER.debug("Не удалось получить конфигурационные биты линий 1-2")
-                self._config_line_3_4_bits = await self._hub.read_holding_register_bits(NeptunSmartRegisters.input_line_3_4_config, 1)
-                
-                # Проверяем, что данные получены корректно
-                if self._config_line_3_4_bits is not None:
-                    self._line_type[3] = bool(self._config_line_3_4_bits[5])
-                    self._line_type[4] = bool(self._config_line_3_4_bits[13])
-                    self._line_group[3] = BitArray([self._config_line_3_4_bits[6], self._config_line_3_4_bits[
-                        7]])._getuint()  # 1 = first group, 2 = second group, 3 = both groups
-                    self._line_group[4] = BitArray([self._config_line_3_4_bits[14], self._config_line_3_4_bits[
-                        15]])._getuint()  # 1 = first group, 2 = second group, 3 = both groups
-                else:
-                    _LOGGER.debug("Не удалось получить конфигурационные биты линий 3-4")
-                self._status_wired_line_bits = await self._hub.read_holding_register_bits(NeptunSmartRegisters.status_wired_line, 1)
-                
-                # Проверяем, что данные получены корректно
-                if self._status_wired_line_bits is not None:
-                    self._line_status[1] = bool(self._status_wired_line_bits[15])
-                    self._line_status[2] = bool(self._status_wired_line_bits[14])
-                    self._line_status[3] = bool(self._status_wired_line_bits[13])
-                    self._line_status[4] = bool(self._status_wired_line_bits[12])
-                else:
-                    _LOGGER.debug("Не удалось получить статус проводных линий")
-                
-                self._relay_config_bits = await self._hub.read_holding_register_bits(NeptunSmartRegisters.relay_config, 1)
-                
-                # Проверяем, что данные получены корректно
-                if self._relay_config_bits is not None:
-                    self._switch_when_close_valve = BitArray([self._relay_config_bits[12], self._relay_config_bits[13]])._getuint()
-                    self._switch_when_alert = BitArray([self._relay_config_bits[14], self._relay_config_bits[15]])._getuint()
-                else:
-                    _LOGGER.debug("Не удалось получить конфигурацию реле")
-                
-                self._wireless_sensors_connected = await self._hub.read_holding_register_uint16(
-                    NeptunSmartRegisters.count_of_connected_wireless_sensors, 1)
-                
-                # Проверяем, что данные получены корректно
-                if self._wireless_sensors_connected is None:
-                    _LOGGER.debug("Не удалось получить количество подключенных беспроводных датчиков")
-                    self._wireless_sensors_connected = 0
-                else:
-                    _LOGGER.error(f"📊 ПОДКЛЮЧЕНО БЕСПРОВОДНЫХ СЕНСОРОВ: {self._wireless_sensors_connected}")
+            started = time.monotonic()
+            deadline = Deadline(POLL_CYCLE_TIMEOUT)
+            # На ускоренном такте аварии и краны читаются каждый раз, а не по интервалу своего класса
+            if self._adaptive_interval.is_boosted():
+                self._scheduler.request(POLL_ALARM)
+            # Классы регистров, которым пора опрашиваться, читаются одним объединенным планом
+            due = self._scheduler.due(started)
+            self._read_plan = self.get_read_plan(due)
+            image = await self._read_registers(self._read_plan, deadline)
+
+            # Проверяем, что данные получены корректно
+            if not image and self._read_plan.request_count:
+                _LOGGER.debug("Не удалось получить регистры модуля")
+                self._is_connected = False
+                return
+
+            # Если данные получены успешно, считаем что подключение активно
+            self._is_connected = True
+            self._scheduler.mark_polled(
+                [poll_class for poll_class in due if self._poll_class_complete(poll_class, image)], started)
+            self._diff_register_image(image)
+            for address in image:
+                self._written_registers.pop(address, None)
+            self._update_state()
+            self._log_module_state()
+            self._decode_counters()
+            self._poll_duration = time.monotonic() - started
+            self._error_log.recovered("poll", "Опрос %s восстановлен", self._name)
+            self._adaptive_interval.next_interval(time.monotonic(), bool(self._changed_registers), self._is_active())
         except TimeoutError:
-            _LOGGER.warning(f"Polling timed out for {self._name} - устройство не отвечает")
+            self._error_log.warning("poll", "Polling timed out for %s - устройство не отвечает", self._name)
             # Сбрасываем счетчик попыток, чтобы попробовать переподключиться в следующий раз
             self._connection_attempts = 0
             self._is_connected = False
             return
         except ModbusIOException as value_error:
-            _LOGGER.warning(f"ModbusIOException for {self._name}: {value_error.string}")
+            self._error_log.warning("poll", "ModbusIOException for %s: %s", self._name, value_error.string)
             # Сбрасываем счетчик попыток, чтобы попробовать переподключиться в следующий раз
             self._connection_attempts = 0
             self._is_connected = False
             return
         except ModbusException as value_error:
-            _LOGGER.warning(f"ModbusException for {self._name}: {value_error.string}")
+            self._error_log.warning("poll", "ModbusException for %s: %s", self._name, value_error.string)
             # Сбрасываем счетчик попыток, чтобы попробовать переподключиться в следующий раз
             self._connection_attempts = 0
             self._is_connected = False
             return
-        except InvalidStateError as ex:
-            _LOGGER.error(f"InvalidStateError Exceptions for {self._name}")
+        except InvalidStateError:
+            self._error_log.error("poll", "InvalidStateError Exceptions for %s", self._name)
             self._is_connected = False
             return
         except Exception as e:
-            _LOGGER.error(f"Неожиданная ошибка при обновлении {self._name}: {e}")
+            # Ошибка повторяется на каждом опросе, поэтому тоже пишется не чаще раза за интервал
+            self._error_log.error("poll", "Неожиданная ошибка при обновлении %s: %s", self._name, e)
             self._is_connected = False
             return
-        for sensor in self.wireless_sensors:
-            await sensor.update()
-        for counter in self.counters:
-            await counter.update()
+
+    def _poll_class_complete(self, poll_class, image) -> bool:
+        return all(register.address in image and register.end - 1 in image
+                   for register in self._registers if register.poll_class == poll_class)
+
+    def _log_module_state(self):
+        """Пишет состояние модуля в отладочный журнал, только когда изменился заголовок"""
+        if not _LOGGER.isEnabledFor(logging.DEBUG):
+            return
+        state = self._state
+        if not state.has_header:
+            _LOGGER.debug("Заголовок модуля %s еще не прочитан целиком", self._name)
+            return
+        if not any(register.address in self._changed_registers for register in HEADER_REGISTERS):
+            return
+        _LOGGER.debug(
+            "Состояние модуля %s: dual_group_mode=%s, floor_washing=%s, connecting_sensors=%s, "
+            "first_valve=%s, second_valve=%s, first_group_alarm=%s, second_group_alarm=%s, "
+            "wireless discharge=%s, lost=%s, connected=%s",
+            self._name, state.dual_group_mode, state.floor_washing_mode, state.connecting_wireless_sensors_mode,
+            state.first_group_valve_is_open, state.second_group_valve_is_open, state.first_group_alarm,
+            state.second_group_alarm, state.discharge_wireless_sensors, state.lost_wireless_sensors,
+            state.wireless_sensors_connected)
 
     def get_discharge_wireless_sensors(self)-> bool:
-        return self._discharge_wireless_sensors
+        return self._state.discharge_wireless_sensors
 
     def get_lost_wireless_sensors(self)-> bool:
-        return self._lost_wireless_sensors
+        return self._state.lost_wireless_sensors
 
     def get_number_of_connected_wireless_sensors(self):
-        return self._wireless_sensors_connected
+        return self._state.wireless_sensors_connected
 
     def get_name(self):
         return self._name
 
+    def set_device_info(self, device_info):
+        self._device_info = device_info
+
+    def get_device_info(self):
+        """Описание устройства (DeviceInfo), общее для всех сущностей модуля"""
+        return self._device_info
+
     def get_first_group_alarm(self):
-        return self._first_group_alarm
+        return self._state.first_group_alarm
 
     def get_second_group_alarm(self):
-        return self._second_group_alarm
+        return self._state.second_group_alarm
 
     def get_first_group_valve_state(self):
-        return self._first_group_valve_is_open
+        return self._state.first_group_valve_is_open
 
-    async def write_config_register(self):
+    async def _write_registers(self, values, *poll_classes, priority=PRIORITY_USER_WRITE) -> bool:
+        """Записывает {адрес: значение} через пакетную запись и перечитывает записанные регистры.
+        Возвращает True, если модуль подтвердил запись."""
+        started = time.monotonic()
+        acked = False
         try:
             async with async_timeout.timeout(5):
-                await self._hub.write_holding_register_bits(NeptunSmartRegisters.module_config, self._config_bits)
+                await self._writer.write(values, priority)
+            acked = True
+            self.command_sent(*poll_classes)
         except TimeoutError:
             _LOGGER.warning("Pulling timed out")
-            return
+            return False
         except ModbusException as value_error:
-            _LOGGER.warning(f"Error write config register, modbus Exception {value_error.string}")
-            return
+            _LOGGER.warning("Error write registers %s, modbus Exception %s", sorted(values), value_error.string)
+            return False
         except InvalidStateError as ex:
-            _LOGGER.error(f"InvalidStateError Exceptions")
-            return
+            _LOGGER.error("InvalidStateError Exceptions")
+            return False
+        except Exception as e:
+            _LOGGER.warning("Не удалось записать регистры %s: %s", sorted(values), e)
+            return False
+        finally:
+            self._schedule_read_back(values, started if acked else None)
+        return True
+
+    def _register_value(self, address):
+        """Сырое значение регистра заголовка из текущего снимка"""
+        return getattr(self._state, HEADER_STATE_FIELDS[address])
+
+    async def _write_field(self, register, name, value, *poll_classes, priority=PRIORITY_USER_WRITE) -> bool:
+        """Меняет одно поле регистра заголовка маскированной записью.
+
+        Остальные биты регистра берутся с модуля в момент записи, а не из снимка последнего
+        опроса, поэтому команда не откатывает то, что модуль успел изменить сам. После записи
+        (и после ошибки, чтобы убрать оптимистичное значение) регистр перечитывается.
+        Возвращает True, если модуль подтвердил запись.
+        """
+        bit_field = register.bit_field(name)
+        address = register.address
+        # Полная запись того же регистра, ждущая пакета или уже отправленная, должна быть
+        # подтверждена раньше маскированной, иначе она вернет регистру старые биты
+        await self._writer.wait_sent(address)
+        current = self._register_value(address)
+        if current is not None:
+            self._update_state({address: bit_field.encode(current, value)})
+        started = time.monotonic()
+        acked = False
+        try:
+            async with async_timeout.timeout(ITEM_UPDATE_TIMEOUT):
+                confirmed = await self._hub.mask_write_register(address, FULL_MASK & ~bit_field.mask,
+                                                                bit_field.encode(0, value), priority)
+            acked = True
+        except TimeoutError:
+            _LOGGER.warning("Запись поля %s регистра %s прервана по таймауту", name, address)
+            return False
+        except ModbusException as value_error:
+            _LOGGER.warning("Error write field %s of register %s, modbus Exception %s", name, address, value_error.string)
+            return False
+        except Exception as e:
+            # В том числе ModuleUnavailableError: модуль недоступен, команда не отправлена
+            _LOGGER.warning("Не удалось записать поле %s регистра %s: %s", name, address, e)
+            return False
+        finally:
+            self._schedule_read_back((address,), started if acked else None)
+        if confirmed is not None:
+            self._update_state({address: confirmed})
+        self.command_sent(*poll_classes)
+        return True
+
+    async def _load_registers(self, *registers, priority=PRIORITY_USER_WRITE) -> bool:
+        """Обновляет снимок свежими значениями регистров перед изменением их полей.
+
+        Значения берутся из теневого образа хаба, устаревшие перечитываются одним запросом.
+        Регистры с еще не подтвержденной записью не трогаются: их значение в снимке новее.
+        """
+        addresses = [register.address for register in registers]
+        values = await self._hub.read_registers_cached(addresses, priority, Deadline(ITEM_UPDATE_TIMEOUT))
+        if values is None:
+            _LOGGER.warning("Не удалось прочитать регистры %s модуля %s, команда не отправлена", addresses, self._name)
+            return False
+        fresh = {address: value for address, value in values.items() if self._writer.get_pending(address) is None}
+        if fresh:
+            self.apply_registers(fresh)
+        return True
+
     async def set_first_group_valve_state(self,state):
-        self._first_group_valve_is_open = state
-        self._config_bits[7] = int(state)
-        await self.write_config_register()
+        # Закрытие крана - аварийная команда, она обгоняет все остальные запросы
+        await self._write_field(MODULE_CONFIG, "first_group_valve", state, POLL_ALARM,
+                                priority=PRIORITY_USER_WRITE if state else PRIORITY_EMERGENCY_WRITE)
 
     def get_second_group_valve_state(self):
-        return self._second_group_valve_is_open
+        return self._state.second_group_valve_is_open
 
     async def set_second_group_valve_state(self,state):
-        self._second_group_valve_is_open = state
-        self._config_bits[6] = int(state)
-        await self.write_config_register()
+        # Закрытие крана - аварийная команда, она обгоняет все остальные запросы
+        await self._write_field(MODULE_CONFIG, "second_group_valve", state, POLL_ALARM,
+                                priority=PRIORITY_USER_WRITE if state else PRIORITY_EMERGENCY_WRITE)
 
     def get_floor_washing_mode(self):
-        return self._floor_washing_mode
+        return self._state.floor_washing_mode
 
     async def set_floor_washing_mode(self, state):
-        self._floor_washing_mode = state
-        self._config_bits[15] = int(state)
-        await self.write_config_register()
+        await self._write_field(MODULE_CONFIG, "floor_washing_mode", state, POLL_ALARM)
 
     def get_connecting_wireless_sensors_mode(self):
-        return self._connecting_wireless_sensors_mode
+        return self._state.connecting_wireless_sensors_mode
 
     async def set_connecting_wireless_sensors_mode(self,state):
-        self._connecting_wireless_sensors_mode = state
-        self._config_bits[8] = int(state)
-        await self.write_config_register()
+        await self._write_field(MODULE_CONFIG, "connecting_wireless_sensors_mode", state, POLL_ALARM)
 
     def get_dual_group_mode(self):
-        return self._dual_group_mode
+        return self._state.dual_group_mode
     
     def is_connected(self):
         """Возвращает состояние подключения к устройству"""
         return self._is_connected
 
     async def set_dual_group_mode(self,state):
-        self._dual_group_mode = state
-        self._config_bits[5] = int(state)
-        await self.write_config_register()
+        # Бит режима меняется маскированной записью: аварии и краны в module_config модуль
+        # меняет сам, и полная запись регистра могла бы откатить их к значениям опроса
+        if not await self._write_field(MODULE_CONFIG, "dual_group_mode", state, POLL_ALARM):
+            return
+        # База регистров линий читается один раз, поля меняются в локальной копии:
+        # линии 1-2 и 3-4 делят регистр, и каждое поле должно ложиться на результат предыдущего
+        registers = (INPUT_LINE_1_2_CONFIG, INPUT_LINE_3_4_CONFIG)
+        if not await self._load_registers(*registers):
+            return
+        values = {register.address: self._register_value(register.address) for register in registers}
+        if any(value is None for value in values.values()):
+            _LOGGER.warning("Заголовок модуля %s не прочитан, группы линий не изменены", self._name)
+            return
         #прописываем везде обе зоны
         for i in (1, 2, 3, 4):
-            await self.set_line_group(i, 3)
+            register = line_config_register(i)
+            values[register.address] = register.set(values[register.address], f"line_{i}_group", 3)
         for sensor in self.wireless_sensors:
-            await sensor.set_group_config(3)
+            values[sensor.get_address()] = 3
+        self._update_state(values)
+        # Регистры 1-2 и конфигурации датчиков 7..7+n уходят двумя запросами FC16
+        await self._write_registers(values, POLL_CONFIG)
 
     def get_close_valve_when_lost_sensors_mode(self):
-        return self._close_valve_when_loss_sensor
+        return self._state.close_valve_when_loss_sensor
 
     async def set_close_valve_when_lost_sensors_mode(self,state):
-        self._close_valve_when_loss_sensor = state
-        self._config_bits[4] = int(state)
-        await self.write_config_register()
+        await self._write_field(MODULE_CONFIG, "close_valve_when_loss_sensor", state, POLL_ALARM)
 
     def get_lock_buttons(self):
-        return self._lock_buttons
+        return self._state.lock_buttons
 
     async def set_lock_buttons(self,state):
-        self._lock_buttons = state
-        self._config_bits[3] = int(state)
-        await self.write_config_register()
+        await self._write_field(MODULE_CONFIG, "lock_buttons", state, POLL_ALARM)
 
     def get_line_config_type(self, line_number):
-        return self._line_type[line_number]
+        return self._state.line_type[line_number]
 
     async def set_line_type(self, line_number, state):
-        self._line_type[line_number] = state
-        self._set_bit_to_line_type()
-        await self.write_line_config_register()
+        await self._write_field(line_config_register(line_number), f"line_{line_number}_type", state, POLL_CONFIG)
 
     def get_line_group(self, line_number):
-        return self._line_group[line_number]
+        return self._state.line_group[line_number]
 
     async def set_line_group(self, line_number, state):
         # 1 = first group, 2 = second group, 3 = both groups
-        self._line_group[line_number] = state
-        if line_number == 1:
-            await self._set_bit_to_line_1_2_group(line_number, 6, 7)
-        if line_number == 2:
-            await self._set_bit_to_line_1_2_group(line_number, 14, 15)
-        if line_number == 3:
-            await self._set_bit_to_line_3_4_group(line_number, 6, 7)
-        if line_number == 4:
-            await self._set_bit_to_line_3_4_group(line_number, 14, 15)
-        await self.write_line_config_register()
-
-    async def _set_bit_to_line_1_2_group(self, line_number, bit1, bit2):
-        if self._line_group[line_number] == 1:
-            self._config_line_1_2_bits[bit1] = 0
-            self._config_line_1_2_bits[bit2] = 1
-        elif self._line_group[line_number] == 2:
-            self._config_line_1_2_bits[bit1] = 1
-            self._config_line_1_2_bits[bit2] = 0
-        else:
-            self._config_line_1_2_bits[bit1] = 1
-            self._config_line_1_2_bits[bit2] = 1
-
-    async def _set_bit_to_line_3_4_group(self, line_number, bit1, bit2):
-        if self._line_group[line_number] == 1:
-            self._config_line_3_4_bits[bit1] = 0
-            self._config_line_3_4_bits[bit2] = 1
-        elif self._line_group[line_number] == 2:
-            self._config_line_3_4_bits[bit1] = 1
-            self._config_line_3_4_bits[bit2] = 0
-        else:
-            self._config_line_3_4_bits[bit1] = 1
-            self._config_line_3_4_bits[bit2] = 1
-
-    def _set_bit_to_line_type(self):
-        # update config bits
-        self._config_line_1_2_bits[5] = self._line_type[1]
-        self._config_line_1_2_bits[13] = self._line_type[2]
-        self._config_line_3_4_bits[5] = self._line_type[3]
-        self._config_line_3_4_bits[13] = self._line_type[4]
-
-    async def write_line_config_register(self):
-        # self._hub.connect()
-        try:
-            async with async_timeout.timeout(5):
-                await self._hub.write_holding_register_bits(NeptunSmartRegisters.input_line_1_2_config, self._config_line_1_2_bits)
-                await self._hub.write_holding_register_bits(NeptunSmartRegisters.input_line_3_4_config, self._config_line_3_4_bits)
-        except TimeoutError:
-            _LOGGER.warning("Pulling timed out")
-            return
-        except ModbusException as value_error:
-            _LOGGER.warning(f"Error write line config register, modbus Exception {value_error.string}")
-            return
-        except InvalidStateError as ex:
-            _LOGGER.error(f"InvalidStateError Exceptions")
-            return
-        # self._hub.disconnect()
+        await self._write_field(line_config_register(line_number), f"line_{line_number}_group", state, POLL_CONFIG)
 
     def get_line_status(self, line_number):
-        return self._line_status[line_number]
+        return self._state.line_status[line_number]
 
     def get_relay_config_valve(self) -> int:
-        return int(self._switch_when_close_valve)
+        return int(self._state.switch_when_close_valve)
 
     async def set_relay_config_valve(self, state):
-        self._switch_when_close_valve = state
-        if self._switch_when_close_valve == 0:
-            self._relay_config_bits[12] = 0
-            self._relay_config_bits[13] = 0
-        elif self._switch_when_close_valve == 1:
-            self._relay_config_bits[12] = 0
-            self._relay_config_bits[13] = 1
-        elif self._switch_when_close_valve == 2:
-            self._relay_config_bits[12] = 1
-            self._relay_config_bits[13] = 0
-        else:
-            self._relay_config_bits[12] = 1
-            self._relay_config_bits[13] = 3
-        await self._write_relay_config_register()
-
-    async def _write_relay_config_register(self):
-        try:
-            async with async_timeout.timeout(5):
-                await self._hub.write_holding_register_bits(NeptunSmartRegisters.relay_config, self._relay_config_bits)
-        except TimeoutError:
-            _LOGGER.warning("Pulling timed out")
-            return
-        except ModbusException as value_error:
-            _LOGGER.warning(f"Error write relay config register, modbus Exception {value_error.string}")
-            return
-        except InvalidStateError as ex:
-            _LOGGER.error(f"InvalidStateError Exception")
-            return
+        await self._write_field(RELAY_CONFIG, "switch_when_close_valve", state, POLL_CONFIG)
 
     def get_relay_config_alert(self) -> int:
-        return int(self._switch_when_alert)
+        return int(self._state.switch_when_alert)
 
     async def set_relay_config_alert(self, state):
-        self._switch_when_alert = state
-        if self._switch_when_alert == 0:
-            self._relay_config_bits[14] = 0
-            self._relay_config_bits[15] = 0
-        elif self._switch_when_alert == 1:
-            self._relay_config_bits[14] = 0
-            self._relay_config_bits[15] = 1
-        elif self._switch_when_alert == 2:
-            self._relay_config_bits[14] = 1
-            self._relay_config_bits[15] = 0
-        else:
-            self._relay_config_bits[14] = 1
-            self._relay_config_bits[15] = 3
-        await self._write_relay_config_register()
+        await self._write_field(RELAY_CONFIG, "switch_when_alert", state, POLL_CONFIG)
+
+    async def set_wireless_sensor_config(self, index, config) -> bool:
+        # 1 = first group, 2 = second group, 3 = both groups
+        values = {NeptunSmartRegisters.first_wireless_sensor_config + index: config}
+        # Оптимистичное значение держится до перечитывания регистра после записи или ошибки
+        self._update_state(values)
+        return await self._write_registers(values, POLL_CONFIG)
 
 
 class WirelessSensor():
-    def __init__(self, hub: modbus_hub, address_config, address_value, config, status_bits):
-        self._hub = hub
-        self._address_config = address_config
-        self._address_value = address_value #получаем адреса, запрашиавем данные, получаем уникальные идентификаторы
-        self.update_data(config, status_bits)
+    """Беспроводной датчик модуля: данные берутся из текущего снимка NeptunSmart"""
 
-    async def update(self):
-        try:
-            async with async_timeout.timeout(10):
-                wireless_sensor_config = await self._hub.read_holding_register_uint16(
-                    self._address_config, 1)
-                wireless_sensor_status_bits = await self._hub.read_holding_register_bits(
-                    self._address_value, 1)
-                
-                # Проверяем, что данные получены корректно
-                if wireless_sensor_config is not None and wireless_sensor_status_bits is not None:
-                    self.update_data(wireless_sensor_config, wireless_sensor_status_bits)
-                else:
-                    _LOGGER.debug(f"Не удалось получить данные для беспроводного датчика {self._address_config}")
-        except TimeoutError:
-            _LOGGER.debug(f"Polling WirelessSensor {self._address_config} status timed out")
-            return
-        except ModbusException as value_error:
-            _LOGGER.debug(f"Error update wireless sensor {self._address_config} modbus Exception {value_error.string}")
-            return
-        except InvalidStateError as ex:
-            _LOGGER.debug(f"InvalidStateError Exception for wireless sensor {self._address_config}")
-            return
-        except Exception as e:
-            _LOGGER.debug(f"Unexpected error updating wireless sensor {self._address_config}: {e}")
-            return
+    __slots__ = ("_device", "_index", "_address_config", "_address_value")
+
+    def __init__(self, device: NeptunSmart, index):
+        self._device = device
+        self._index = index
+        self._address_config = NeptunSmartRegisters.first_wireless_sensor_config + index
+        self._address_value = NeptunSmartRegisters.first_wireless_sensor_status + index
 
-    def update_data(self, config, status_bits):
-        self._config = config
-        self._status_bits = status_bits
-        self._battery_level = BitArray(
-            [self._status_bits[0], self._status_bits[1], self._status_bits[2], self._status_bits[3],
-             self._status_bits[4], self._status_bits[5], self._status_bits[6], self._status_bits[7]])._getuint()
-        self._alert = bool(self._status_bits[15])
-        self._discharge = bool(self._status_bits[14])
-        self._lost_sensor = bool(self._status_bits[13])
-        self._signal_level = BitArray([self._status_bits[12], self._status_bits[11], self._status_bits[10]])._getuint()
+    def get_state(self) -> WirelessSensorState:
+        return self._device.get_wireless_sensor_state(self._index)
 
     def get_group_config(self):
-        return self._config
+        return self.get_state().config
 
-    async def set_group_config(self, config):
-        try:
-            async with async_timeout.timeout(5):
-                await self._hub.write_holding_register(address=self._address_config, value=config)
-        except TimeoutError:
-            _LOGGER.warning("Pulling timed out")
-            return
-        except ModbusException as value_error:
-            _LOGGER.error(
-                f"Error set group wireless sensor {self._address_config} modbus Exception {value_error.string}")
-            return
-        except InvalidStateError as ex:
-            _LOGGER.error(f"InvalidStateError Exception")
-            return
+    async def set_group_config(self, config) -> bool:
+        return await self._device.set_wireless_sensor_config(self._index, config)
 
     def get_battery_level(self):
-        return self._battery_level
+        return self.get_state().battery_level
 
     def get_signal_level(self):
-        return self._signal_level
+        return self.get_state().signal_level
 
     def get_alert_status(self):
-        return self._alert
+        return self.get_state().alert
 
     def get_lost_sensor_status(self):
-        return self._lost_sensor
+        return self.get_state().lost
 
     def get_discharge_status(self):
-        return self._discharge
+        return self.get_state().discharge
 
     def get_address(self):
         return self._address_config
 
+    def get_status_address(self):
+        return self._address_value
+
 
 class Counter():
-    def __init__(self, value, address, hub: modbus_hub):
-        self._value = value
-        self._address = address
-        self._hub = hub
+    """Счетчик модуля: данные берутся из текущего снимка NeptunSmart"""
 
-    async def update(self):
-        try:
-            async with async_timeout.timeout(10):
-                result = await self._hub.read_holding_register_uint32(self._address, 2)
-                if result is not None:
-                    self._value = result
-                else:
-                    _LOGGER.debug(f"Не удалось получить значение счетчика {self._address}")
-        except TimeoutError:
-            _LOGGER.debug(f"Polling counter {self._address} timed out")
-            return
-        except ModbusException as value_error:
-            _LOGGER.debug(f"Error update counter {self._address} modbus Exception {value_error.string}")
-            return
-        except InvalidStateError as ex:
-            _LOGGER.debug(f"InvalidStateError Exception for counter {self._address}")
-            return
-        except Exception as e:
-            _LOGGER.debug(f"Unexpected error updating counter {self._address}: {e}")
-            return
+    __slots__ = ("_device", "_index", "_address")
+
+    def __init__(self, device: NeptunSmart, index):
+        self._device = device
+        self._index = index
+        self._address = NeptunSmartRegisters.first_counter + (index * 2)
+
+    def get_state(self) -> CounterState:
+        return self._device.get_counter_state(self._index)
+
+    def is_enabled(self):
+        return self.get_state().enabled
 
     def get_value(self):
-        return self._value
+        return self.get_state().value
+
+    def get_index(self):
+        return self._index
 
     def get_address(self):
         return self._address
+
+    def get_config_address(self):
+        return NeptunSmartRegisters.first_counter_config + self._index
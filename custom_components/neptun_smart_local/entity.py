@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .coordinator import NeptunSmartCoordinator
+
+
+class NeptunSmartEntity(CoordinatorEntity[NeptunSmartCoordinator]):
+    """Базовая сущность модуля: состояние приходит от координатора один раз за цикл опроса.
+
+    Сущность описывает в _watched_registers пары (адрес, маска) битов, от которых зависит ее
+    состояние, и записывает состояние только если эти биты изменились или изменилась доступность.
+    None означает запись после каждого опроса. Состояние, не связанное с регистрами,
+    сравнивается в переопределенном _state_changed().
+
+    После команды сущность сразу записывает ожидаемое состояние, а подтвержденное модулем
+    приходит от перечитывания записанных регистров через тот же координатор.
+    """
+
+    _watched_registers: tuple[tuple[int, int], ...] | None = None
+
+    def __init__(self, coordinator: NeptunSmartCoordinator) -> None:
+        super().__init__(coordinator)
+        self._device = coordinator.device
+        # Описание устройства общее для всех сущностей модуля, создается один раз при настройке записи
+        self._attr_device_info = self._device.get_device_info()
+        self._last_available = None
+
+    def _state_changed(self) -> bool:
+        """Изменилось ли что-то, от чего зависит состояние сущности"""
+        if self._watched_registers is None:
+            return True
+        return self._device.registers_changed(self._watched_registers)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        available = self.available
+        if available == self._last_available and not self._state_changed():
+            return
+        self._last_available = available
+        super()._handle_coordinator_update()
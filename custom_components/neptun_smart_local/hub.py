@@ -2,157 +2,1060 @@ from __future__ import annotations
 from pymodbus import pymodbus_apply_logging_config
 import datetime
 from pymodbus import ModbusException
+from pymodbus.exceptions import ConnectionException, ModbusIOException
 from pymodbus.client import AsyncModbusTcpClient
 from pymodbus.framer import FramerType
 from homeassistant.core import HomeAssistant
 import logging
 import asyncio
+import heapq
+import itertools
+import random
+import socket
+import struct
+import time
+from contextlib import asynccontextmanager, nullcontext
+
+import async_timeout
+
+from .const import DATA_GATEWAYS
+from .log import RateLimitedLogger
+from .registers import FULL_MASK, compile_address_plan, compile_write_ranges
+from .shadow import ShadowRegisterImage, apply_mask
 
 _LOGGER = logging.getLogger(__name__)
 # pymodbus_apply_logging_config("DEBUG")
 
+# Классы приоритета запросов: чем меньше число, тем раньше запрос получает шину
+PRIORITY_EMERGENCY_WRITE = 0
+PRIORITY_USER_WRITE = 1
+PRIORITY_ALARM_READ = 2
+PRIORITY_BACKGROUND_READ = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_EMERGENCY_WRITE: "emergency_write",
+    PRIORITY_USER_WRITE: "user_write",
+    PRIORITY_ALARM_READ: "alarm_read",
+    PRIORITY_BACKGROUND_READ: "background_read",
+}
+
+
+class PriorityRequestScheduler:
+    """Очередь доступа к шине с приоритетами вместо Semaphore(1).
+
+    Шину одновременно занимает один запрос. Освободившуюся шину получает ожидающий запрос
+    с наименьшим классом приоритета, внутри класса - в порядке поступления. Пакетные чтения
+    занимают шину по одному запросу FC03, поэтому команды вклиниваются между ними.
+    """
+
+    def __init__(self) -> None:
+        self._busy = False
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._wait_stats = {priority: [0, 0.0, 0.0] for priority in PRIORITY_NAMES}
+
+    @asynccontextmanager
+    async def request(self, priority):
+        started = time.monotonic()
+        if not self._busy and not self._waiters:
+            self._busy = True
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Если шину уже передали этому запросу, отдаем ее следующему
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                raise
+        self._record_wait(priority, time.monotonic() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._busy = False
+
+    def _record_wait(self, priority, wait) -> None:
+        stats = self._wait_stats[priority]
+        stats[0] += 1
+        stats[1] += wait
+        stats[2] = max(stats[2], wait)
+
+    def get_wait_stats(self) -> dict:
+        """Время ожидания шины по классам приоритета: число запросов, среднее и максимум в мс"""
+        return {
+            PRIORITY_NAMES[priority]: {
+                "requests": count,
+                "avg_ms": round(total / count * 1000, 1) if count else 0,
+                "max_ms": round(maximum * 1000, 1),
+            }
+            for priority, (count, total, maximum) in self._wait_stats.items()
+        }
+
+
+class Deadline:
+    """Срок завершения цикла опроса. Передается во все запросы цикла: таймаут каждого
+    запроса, включая ожидание шины и подключение, ограничен оставшимся бюджетом.
+    """
+
+    def __init__(self, budget) -> None:
+        self._budget = budget
+        self._expires = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self._expires
+
+    def get_budget(self) -> float:
+        return self._budget
+
+
+def deadline_scope(deadline: Deadline | None):
+    """Контекст, прерывающий запрос по истечении срока deadline (без срока - без ограничения)"""
+    if deadline is None:
+        return nullcontext()
+    return async_timeout.timeout(deadline.remaining())
+
+
+# Состояния соединения с модулем
+CONNECTION_CONNECTED = "connected"
+CONNECTION_BACKING_OFF = "backing_off"
+CONNECTION_HALF_OPEN = "half_open"
+CONNECTION_OPEN = "open"
+# Модуль отказался от соединения (запись выгружается)
+CONNECTION_CLOSED = "closed"
+
+# Пауза перед первой повторной попыткой подключения и ее предел, секунды
+BACKOFF_INITIAL = 1
+BACKOFF_MAX = 60
+# Число неудачных попыток подряд, после которого автомат размыкается
+BREAKER_THRESHOLD = 5
+# Сколько автомат остается разомкнутым до пробной попытки, секунды
+BREAKER_OPEN_TIME = 120
+# Число запросов подряд без ответа, после которого соединение считается потерянным: у TCP
+# соединения pymodbus нет keepalive, и полуоткрытое соединение само не закрывается
+RESPONSE_TIMEOUT_THRESHOLD = 3
+
+
+# Границы адаптивного таймаута ответа на запрос, секунды
+DEFAULT_MIN_REQUEST_TIMEOUT = 0.2
+DEFAULT_MAX_REQUEST_TIMEOUT = 10
+# Таймаут ответа до первого измерения RTT, секунды
+INITIAL_REQUEST_TIMEOUT = 1
+# Таймаут установления TCP-соединения, секунды
+CONNECT_TIMEOUT = 10
+
+
+class RttEstimator:
+    """Оценка времени ответа модуля и таймаута запроса по схеме TCP RTO (RFC 6298).
+
+    Сглаженное RTT и его разброс обновляются по каждому ответу (коэффициенты 1/8 и 1/4),
+    таймаут равен srtt + 4 * rttvar в пределах [min_timeout, max_timeout]. Потерянный
+    ответ удваивает таймаут. Ответы на повторно отправленные запросы не измеряются
+    (алгоритм Карна): неизвестно, на какую из отправок пришел ответ.
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self, min_timeout=DEFAULT_MIN_REQUEST_TIMEOUT, max_timeout=DEFAULT_MAX_REQUEST_TIMEOUT) -> None:
+        self._min_timeout = min_timeout
+        self._max_timeout = max(min_timeout, max_timeout)
+        self._srtt = None
+        self._rttvar = None
+        self._timeout = self._clamp(INITIAL_REQUEST_TIMEOUT)
+        self._samples = 0
+        self._losses = 0
+
+    def _clamp(self, timeout) -> float:
+        return min(self._max_timeout, max(self._min_timeout, timeout))
+
+    def sample(self, rtt) -> None:
+        """Учитывает время ответа на запрос, отправленный один раз"""
+        if self._srtt is None:
+            self._srtt = rtt
+            self._rttvar = rtt / 2
+        else:
+            self._rttvar += self.BETA * (abs(self._srtt - rtt) - self._rttvar)
+            self._srtt += self.ALPHA * (rtt - self._srtt)
+        self._samples += 1
+        self._timeout = self._clamp(self._srtt + 4 * self._rttvar)
+
+    def backoff(self) -> None:
+        """Ответ потерян: таймаут удваивается до следующего успешного измерения"""
+        self._losses += 1
+        self._timeout = self._clamp(self._timeout * 2)
+
+    def get_timeout(self) -> float:
+        return self._timeout
+
+    def get_stats(self) -> dict:
+        """Текущая оценка: srtt, rttvar и таймаут в мс, число измерений и потерь"""
+        return {
+            "srtt_ms": None if self._srtt is None else round(self._srtt * 1000, 1),
+            "rttvar_ms": None if self._rttvar is None else round(self._rttvar * 1000, 1),
+            "timeout_ms": round(self._timeout * 1000, 1),
+            "min_timeout_ms": round(self._min_timeout * 1000, 1),
+            "max_timeout_ms": round(self._max_timeout * 1000, 1),
+            "samples": self._samples,
+            "losses": self._losses,
+        }
+
+
+class ModuleUnavailableError(ValueError):
+    """Модуль недоступен: запрос отклонен без обращения к сети"""
+
+
+class ConnectionManager:
+    """Автомат состояний соединения с модулем.
+
+    connected - соединение есть. После обрыва или неудачной попытки - backing_off:
+    следующая попытка через экспоненциально растущую паузу со случайным разбросом.
+    После BREAKER_THRESHOLD неудач подряд автомат размыкается (open) на BREAKER_OPEN_TIME,
+    затем одна пробная попытка (half_open) либо замыкает его, либо размыкает снова.
+    Неудачей считаются и timeout_threshold запросов подряд без ответа: соединение, через
+    которое модуль не отвечает, закрывается, а счетчик неудач сбрасывает только ответ.
+    Пока попытка не разрешена, запросы сразу получают ModuleUnavailableError. Одновременно
+    выполняется не больше одной попытки подключения, остальные запросы ждут ее результата.
+    """
+
+    def __init__(self, connect, is_connected, backoff_initial=BACKOFF_INITIAL, backoff_max=BACKOFF_MAX,
+                 threshold=BREAKER_THRESHOLD, open_time=BREAKER_OPEN_TIME,
+                 timeout_threshold=RESPONSE_TIMEOUT_THRESHOLD) -> None:
+        self._connect = connect
+        self._is_connected = is_connected
+        self._backoff_initial = backoff_initial
+        self._backoff_max = backoff_max
+        self._threshold = threshold
+        self._open_time = open_time
+        self._timeout_threshold = timeout_threshold
+        self._state = CONNECTION_BACKING_OFF
+        self._failures = 0
+        self._timeouts = 0
+        self._retry_at = 0.0
+        self._attempt = None
+
+    async def ensure_connected(self) -> None:
+        """Возвращается при наличии соединения, иначе подключается или сразу отклоняет запрос"""
+        if self._state == CONNECTION_CONNECTED:
+            if self._is_connected():
+                return
+            self.connection_lost()
+        if self._attempt is None:
+            wait = self._retry_at - time.monotonic()
+            if wait > 0:
+                raise ModuleUnavailableError(f"Модуль недоступен ({self._state}), повтор через {wait:.1f} с")
+            self._attempt = asyncio.get_running_loop().create_task(self._try_connect())
+            self._attempt.add_done_callback(_retrieve_exception)
+        await asyncio.shield(self._attempt)
+
+    async def _try_connect(self) -> None:
+        if self._state == CONNECTION_OPEN:
+            self._state = CONNECTION_HALF_OPEN
+        try:
+            connected = await self._connect()
+        finally:
+            self._attempt = None
+        if not connected:
+            self._record_failure()
+            raise ModuleUnavailableError(f"Не удалось подключиться, следующая попытка через "
+                                         f"{self._retry_at - time.monotonic():.1f} с")
+        self._state = CONNECTION_CONNECTED
+        self._timeouts = 0
+
+    def _record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self._threshold:
+            self._state = CONNECTION_OPEN
+            delay = self._open_time
+        else:
+            self._state = CONNECTION_BACKING_OFF
+            delay = min(self._backoff_max, self._backoff_initial * 2 ** (self._failures - 1))
+        # Разброс не дает нескольким модулям переподключаться синхронно
+        self._retry_at = time.monotonic() + delay * (0.5 + random.random() / 2)
+
+    def response_received(self) -> None:
+        """Модуль ответил: соединение рабочее"""
+        self._failures = 0
+        self._timeouts = 0
+
+    def response_timeout(self) -> bool:
+        """Запрос остался без ответа. True - соединение пора закрыть, следующая попытка после паузы"""
+        if self._state != CONNECTION_CONNECTED:
+            return False
+        self._timeouts += 1
+        if self._timeouts < self._timeout_threshold:
+            return False
+        self._record_failure()
+        return True
+
+    def connection_lost(self) -> None:
+        """Соединение оборвалось во время работы: первая попытка восстановить его - сразу"""
+        if self._state == CONNECTION_CONNECTED:
+            self._state = CONNECTION_BACKING_OFF
+            self._retry_at = 0.0
+
+    def get_state(self) -> str:
+        return self._state
+
+    def get_failures(self) -> int:
+        return self._failures
+
+
+def _retrieve_exception(task) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+# Транспорт запросов к шлюзу: клиент pymodbus или собственный облегченный клиент
+TRANSPORT_PYMODBUS = "pymodbus"
+TRANSPORT_NATIVE = "native"
+TRANSPORTS = (TRANSPORT_PYMODBUS, TRANSPORT_NATIVE)
+
+# Заголовок MBAP: транзакция, протокол (0), длина остатка кадра, unit id
+MBAP_HEADER = struct.Struct(">HHHB")
+# PDU запросов с двумя словами (FC03, FC06) и ответа FC22 с тремя
+PDU_TWO_WORDS = struct.Struct(">BHH")
+PDU_THREE_WORDS = struct.Struct(">BHHH")
+# Предел длины кадра Modbus TCP: остаток после первых шести байт заголовка
+MAX_MBAP_LENGTH = 254
+
+FC_READ_HOLDING_REGISTERS = 0x03
+FC_WRITE_REGISTER = 0x06
+FC_WRITE_REGISTERS = 0x10
+FC_MASK_WRITE_REGISTER = 0x16
+
+# Keepalive соединения: простой до первой пробы, интервал проб и их число
+KEEPALIVE_IDLE = 30
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+
+
+class ModbusTcpResponse:
+    """Ответ облегченного клиента с той же частью интерфейса, что у ответов pymodbus"""
+
+    __slots__ = ("function_code", "registers", "exception_code")
+
+    def __init__(self, function_code, registers=(), exception_code=0) -> None:
+        self.function_code = function_code
+        self.registers = registers
+        self.exception_code = exception_code
+
+    def isError(self) -> bool:
+        return bool(self.function_code & 0x80)
+
+    def __repr__(self) -> str:
+        if self.isError():
+            return f"ModbusTcpResponse(fc={self.function_code:#04x}, exception={self.exception_code})"
+        return f"ModbusTcpResponse(fc={self.function_code:#04x}, registers={list(self.registers)})"
+
+
+class ModbusTcpProtocol(asyncio.Protocol):
+    """Разбор потока Modbus TCP: кадры режутся по длине из MBAP и сопоставляются с запросами
+    по номеру транзакции. Ответ разбирается struct.unpack_from прямо из буфера приема через
+    memoryview, без копий кадра. Ответы на запросы, которые уже не ждут, отбрасываются."""
+
+    def __init__(self) -> None:
+        self.transport = None
+        self._buffer = bytearray()
+        # номер транзакции -> (future ответа, unit id, код функции)
+        self._pending = {}
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # Параметры проб есть не на всех платформах
+            for option, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE), ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                                  ("TCP_KEEPCNT", KEEPALIVE_COUNT)):
+                if hasattr(socket, option):
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+    def connection_lost(self, exc) -> None:
+        self.transport = None
+        self._buffer.clear()
+        for future, _, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionException(f"Connection lost: {exc}"))
+        self._pending.clear()
+
+    def send(self, transaction_id, unit_id, function_code, pdu) -> asyncio.Future:
+        """Отправляет кадр и возвращает future ответа"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending[transaction_id] = (future, unit_id, function_code)
+        self.transport.write(MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, unit_id) + pdu)
+        return future
+
+    def forget(self, transaction_id) -> None:
+        self._pending.pop(transaction_id, None)
+
+    def data_received(self, data) -> None:
+        self._buffer += data
+        offset = 0
+        with memoryview(self._buffer) as view:
+            while len(view) - offset >= MBAP_HEADER.size:
+                transaction_id, protocol_id, length, unit_id = MBAP_HEADER.unpack_from(view, offset)
+                if protocol_id != 0 or not 2 <= length <= MAX_MBAP_LENGTH:
+                    # Поток рассинхронизирован, границу следующего кадра не найти
+                    _LOGGER.debug("Неверный заголовок MBAP (протокол %s, длина %s), соединение закрывается",
+                                  protocol_id, length)
+                    self.transport.close()
+                    return
+                end = offset + 6 + length
+                if end > len(view):
+                    break
+                # Срез освобождается явно: иначе ссылка на него не даст сдвинуть буфер
+                with view[offset + MBAP_HEADER.size:end] as pdu:
+                    self._dispatch(transaction_id, unit_id, pdu)
+                offset = end
+        del self._buffer[:offset]
+
+    def _dispatch(self, transaction_id, unit_id, pdu) -> None:
+        pending = self._pending.pop(transaction_id, None)
+        if pending is None:
+            _LOGGER.debug("Ответ на транзакцию %s, которую уже не ждут, отброшен", transaction_id)
+            return
+        future, expected_unit_id, function_code = pending
+        if future.done():
+            return
+        if unit_id != expected_unit_id or pdu[0] & 0x7F != function_code:
+            future.set_exception(ModbusIOException(f"Unexpected response: unit {unit_id}, fc {pdu[0]:#04x}"))
+            return
+        try:
+            response = self._decode(pdu)
+        except (IndexError, struct.error) as e:
+            future.set_exception(ModbusIOException(f"Malformed response: {e}"))
+            return
+        future.set_result(response)
+
+    @staticmethod
+    def _decode(pdu) -> ModbusTcpResponse:
+        function_code = pdu[0]
+        if function_code & 0x80:
+            return ModbusTcpResponse(function_code, exception_code=pdu[1])
+        if function_code == FC_READ_HOLDING_REGISTERS:
+            return ModbusTcpResponse(function_code, struct.unpack_from(f">{pdu[1] // 2}H", pdu, 2))
+        # Ответы на записи повторяют адрес и значения запроса, проверять в них нечего
+        return ModbusTcpResponse(function_code)
+
+
+class ModbusTcpClient:
+    """Облегченный клиент Modbus TCP на asyncio.Protocol для подмножества функций модуля.
+
+    Поддерживает FC03, FC06, FC16 и FC22 с теми же сигнатурами, что у AsyncModbusTcpClient,
+    поэтому ModbusGateway использует его вместо клиента pymodbus без изменений в modbus_hub.
+    Повторов и собственного переподключения нет: ими управляют RttEstimator и ConnectionManager.
+    Потерянный ответ - ModbusIOException, обрыв соединения - ConnectionException.
+    """
+
+    def __init__(self, host, port, timeout=CONNECT_TIMEOUT) -> None:
+        self._host = host
+        self._port = port
+        self._connect_timeout = timeout
+        # Верхний предел ожидания ответа; ModbusGateway ограничивает запросы таймаутом по RTT
+        self.timeout = timeout
+        self._protocol = None
+        self._transaction_ids = itertools.count(1)
+
+    @property
+    def connected(self) -> bool:
+        return self._protocol is not None and self._protocol.transport is not None
+
+    async def connect(self) -> bool:
+        self.close()
+        loop = asyncio.get_running_loop()
+        async with async_timeout.timeout(self._connect_timeout):
+            _, self._protocol = await loop.create_connection(ModbusTcpProtocol, self._host, int(self._port))
+        return True
+
+    def close(self) -> None:
+        if self.connected:
+            self._protocol.transport.close()
+        self._protocol = None
+
+    async def _request(self, device_id, function_code, pdu) -> ModbusTcpResponse:
+        if not self.connected:
+            raise ConnectionException(f"Not connected to {self._host}:{self._port}")
+        protocol = self._protocol
+        transaction_id = next(self._transaction_ids) & 0xFFFF
+        future = protocol.send(transaction_id, device_id, function_code, pdu)
+        try:
+            async with async_timeout.timeout(self.timeout):
+                return await future
+        except TimeoutError as e:
+            raise ModbusIOException(f"No response received after {self.timeout:.3f} s") from e
+        finally:
+            protocol.forget(transaction_id)
+
+    async def read_holding_registers(self, address, count=1, device_id=1) -> ModbusTcpResponse:
+        return await self._request(device_id, FC_READ_HOLDING_REGISTERS,
+                                   PDU_TWO_WORDS.pack(FC_READ_HOLDING_REGISTERS, address, count))
+
+    async def write_register(self, address, value, device_id=1) -> ModbusTcpResponse:
+        return await self._request(device_id, FC_WRITE_REGISTER, PDU_TWO_WORDS.pack(FC_WRITE_REGISTER, address, value))
+
+    async def write_registers(self, address, values, device_id=1) -> ModbusTcpResponse:
+        pdu = struct.pack(f">BHHB{len(values)}H", FC_WRITE_REGISTERS, address, len(values), len(values) * 2, *values)
+        return await self._request(device_id, FC_WRITE_REGISTERS, pdu)
+
+    async def mask_write_register(self, address=0, and_mask=0xFFFF, or_mask=0, device_id=1) -> ModbusTcpResponse:
+        return await self._request(device_id, FC_MASK_WRITE_REGISTER,
+                                   PDU_THREE_WORDS.pack(FC_MASK_WRITE_REGISTER, address, and_mask, or_mask))
+
+
+# Адрес модуля Нептун на шине Modbus по умолчанию
+DEFAULT_UNIT_ID = 240
+# Код исключения Modbus "недопустимая функция"
+MODBUS_ILLEGAL_FUNCTION = 0x01
+# Сколько ответов на FC22 подряд должно потеряться, чтобы считать ее неподдерживаемой
+MASK_WRITE_PROBE_LOSSES = 3
+
+
+def _is_illegal_function(result) -> bool:
+    """Ответ-исключение Modbus "недопустимая функция": устройство не поддерживает запрос"""
+    return result.isError() and getattr(result, "exception_code", None) == MODBUS_ILLEGAL_FUNCTION
+
+
+class ModbusGateway:
+    """Одно TCP-соединение со шлюзом или модулем, общее для всех записей на этом host:port.
+
+    Шлюз RS-485 -> TCP и сам модуль принимают одно соединение, поэтому клиент (pymodbus или
+    облегченный ModbusTcpClient), автомат соединения и очередь шины создаются один раз на
+    адрес. Запросы всех модулей за шлюзом проходят через одну очередь с приоритетами: на шине
+    всегда один запрос, и запросы к одному модулю никогда не перекрываются.
+    """
+
+    def __init__(self, host, port, transport=TRANSPORT_PYMODBUS) -> None:
+        self._host = host
+        self._port = port
+        self._transport = transport
+        if transport == TRANSPORT_NATIVE:
+            self._client = ModbusTcpClient(host, port, timeout=CONNECT_TIMEOUT)
+        else:
+            # Переподключением управляет ConnectionManager, встроенный в pymodbus отключен.
+            # Повторы тоже отключены: потерянный ответ учитывает RttEstimator, а таймаут ответа
+            # ограничивает execute(), timeout клиента - только верхний предел
+            self._client = AsyncModbusTcpClient(
+                host=host,
+                port=port,
+                framer=FramerType.SOCKET,
+                retries=0,
+                timeout=CONNECT_TIMEOUT,
+                reconnect_delay=0,
+            )
+        self._connection = ConnectionManager(self._open_client, lambda: self._client.connected)
+        # Очередь с приоритетами для предотвращения параллельных запросов
+        self._scheduler = PriorityRequestScheduler()
+        # Повторяющиеся ошибки связи пишутся в журнал не чаще раза за интервал
+        self._error_log = RateLimitedLogger(_LOGGER)
+        self._users = 0
+
+    async def connect(self) -> None:
+        await self._connection.ensure_connected()
+
+    async def _open_client(self) -> bool:
+        """Одна попытка подключения для ConnectionManager"""
+        try:
+            await self._client.connect()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error_log.error("connect", "Ошибка подключения к Modbus %s:%s: %s", self._host, self._port, e)
+            return False
+        if not self._client.connected:
+            self._error_log.error("connect", "Не удалось подключиться к Modbus %s:%s", self._host, self._port)
+            return False
+        self._error_log.recovered("connect", "Подключение к Modbus %s:%s восстановлено", self._host, self._port)
+        return True
+
+    def close(self) -> None:
+        if self._client.connected:
+            self._client.close()
+
+    @asynccontextmanager
+    async def bus(self, priority):
+        """Занимает шину на один запрос. Пока шлюз недоступен, запросы отклоняются сразу"""
+        await self._connection.ensure_connected()
+        async with self._scheduler.request(priority):
+            # Пока запрос ждал в очереди, соединение могло оборваться
+            await self._connection.ensure_connected()
+            try:
+                yield
+            finally:
+                if not self._client.connected:
+                    self._connection.connection_lost()
+
+    async def execute(self, rtt: RttEstimator, request, *args, **kwargs):
+        """Выполняет запрос клиента с таймаутом ответа по оценке RTT модуля.
+
+        Срок ожидания ответа ограничивается снаружи вызова: транзакция pymodbus ждет ответ
+        по собственной копии параметров клиента, и поменять ее таймаут между запросами нельзя.
+        Не дождавшийся ответа запрос завершается ModbusIOException, как потеря ответа в клиенте.
+        """
+        timeout = rtt.get_timeout()
+        started = time.monotonic()
+        try:
+            async with async_timeout.timeout(timeout):
+                result = await request(*args, **kwargs)
+        except TimeoutError as e:
+            rtt.backoff()
+            self._response_timeout()
+            raise ModbusIOException(f"No response received after {timeout:.3f} s") from e
+        except ModbusIOException:
+            rtt.backoff()
+            self._response_timeout()
+            raise
+        self._connection.response_received()
+        if getattr(result, "retries", 0):
+            rtt.backoff()
+        else:
+            rtt.sample(time.monotonic() - started)
+        return result
+
+    def _response_timeout(self) -> None:
+        if self._connection.response_timeout():
+            self._error_log.error("response", "Modbus %s:%s не отвечает на запросы, соединение закрыто",
+                                  self._host, self._port)
+            self.close()
+
+    @property
+    def client(self) -> AsyncModbusTcpClient | ModbusTcpClient:
+        return self._client
+
+    def get_transport(self) -> str:
+        return self._transport
+
+    def get_connection_state(self) -> str:
+        return self._connection.get_state()
+
+    def get_queue_wait_stats(self) -> dict:
+        return self._scheduler.get_wait_stats()
+
+
+def acquire_gateway(hass: HomeAssistant, host, port, transport=TRANSPORT_PYMODBUS) -> ModbusGateway:
+    """Общее соединение для host:port из реестра hass.data, создается при первом обращении.
+    Транспорт выбирает запись, создавшая соединение"""
+    gateways = hass.data.setdefault(DATA_GATEWAYS, {})
+    key = f"{host}:{port}"
+    gateway = gateways.get(key)
+    if gateway is None:
+        gateway = gateways[key] = ModbusGateway(host, port, transport)
+    elif gateway.get_transport() != transport:
+        _LOGGER.warning("Соединение с %s уже открыто через транспорт %s, настройка %s не применяется",
+                        key, gateway.get_transport(), transport)
+    gateway._users += 1
+    return gateway
+
+
+def release_gateway(hass: HomeAssistant, gateway: ModbusGateway) -> None:
+    """Освобождает соединение; последняя запись на host:port закрывает его"""
+    gateway._users -= 1
+    if gateway._users > 0:
+        return
+    gateway.close()
+    gateways = hass.data.get(DATA_GATEWAYS, {})
+    key = f"{gateway._host}:{gateway._port}"
+    if gateways.get(key) is gateway:
+        del gateways[key]
+
+
 class modbus_hub:
-    def __init__(self, hass: HomeAssistant, host, port) -> None:
+    """Доступ к одному модулю (unit id) через общее соединение ModbusGateway.
+
+    Оценка RTT и таймаут ответа ведутся отдельно для каждого модуля: неотвечающий модуль
+    за шлюзом не увеличивает таймауты соседей. Каждый ответ и подтверждение записи
+    обновляют теневой образ регистров модуля.
+    """
+
+    def __init__(self, hass: HomeAssistant, host, port, unit_id=DEFAULT_UNIT_ID,
+                 min_request_timeout=DEFAULT_MIN_REQUEST_TIMEOUT,
+                 max_request_timeout=DEFAULT_MAX_REQUEST_TIMEOUT, transport=TRANSPORT_PYMODBUS) -> None:
         self._host = host
         self._port = port
         self._hass = hass
-        self._client = AsyncModbusTcpClient(
-            host=host,
-            port=port,
-            framer=FramerType.SOCKET,
-            retries=5,
-            timeout=10,
-            reconnect_delay=2,
-        )
+        self._unit_id = unit_id
+        self._gateway = acquire_gateway(hass, host, port, transport)
+        self._client = self._gateway.client
+        self._rtt = RttEstimator(min_request_timeout, max_request_timeout)
+        # Последние известные значения регистров модуля с временем получения
+        self._shadow = ShadowRegisterImage()
+        # Чтения, которые сейчас выполняются: {(вид, адрес, число регистров): [(приоритет, задача)]}
+        self._reads_in_flight = {}
+        self._reads_issued = 0
+        self._reads_deduplicated = 0
+        # Поддержка Mask Write Register (FC22): None - еще не выяснена
+        self._mask_write_supported = None
+        self._mask_write_losses = 0
         self._is_connected = False
-        # Семафор для предотвращения параллельных запросов
-        self._request_semaphore = asyncio.Semaphore(1)
+        self._error_log = RateLimitedLogger(_LOGGER)
 
     async def connect(self):
+        """Подключается к модулю. ModuleUnavailableError (ValueError), если модуль недоступен"""
         try:
-            if not self._client.connected:
-                await self._client.connect()
+            await self._get_gateway().connect()
             self._is_connected = True
         except asyncio.CancelledError:
-            _LOGGER.debug(f"Подключение к Modbus {self._host}:{self._port} было отменено")
+            _LOGGER.debug("Подключение к Modbus %s:%s было отменено", self._host, self._port)
             self._is_connected = False
             raise
-        except Exception as e:
-            _LOGGER.error(f"Ошибка подключения к Modbus {self._host}:{self._port}: {e}")
+        except ModuleUnavailableError:
             self._is_connected = False
-            raise ValueError(f"Не удалось подключиться к устройству: {e}")
+            raise
 
     async def disconnect(self):
-        if self._client.connected:
-            await self._client.close()
+        """Отказывается от общего соединения; оно закрывается, когда его не использует ни один модуль"""
+        if self._gateway is not None:
+            release_gateway(self._hass, self._gateway)
+            self._gateway = None
         self._is_connected = False
 
-    async def read_holding_register_uint16(self, address, count):
-        async with self._request_semaphore:
-            try:
-                # Проверяем подключение и переподключаемся при необходимости
-                if not self._client.connected:
-                    await self.connect()
-                
-                result = await self._client.read_holding_registers(address, count=count, device_id=240)
-                if result.isError():
-                    _LOGGER.debug(f"Ошибка Modbus при чтении регистра {address}: {result}")
-                    return None
-                
-                if result.registers:
-                    return result.registers[0]
-                return None
-            except Exception as e:
-                _LOGGER.debug(f"Ошибка при чтении регистра {address}: {e}")
-                return None
+    def _get_gateway(self) -> ModbusGateway:
+        """Общее соединение модуля. После disconnect() запросы, которые еще были в очереди
+        или пришли от незавершенного опроса, отклоняются без обращения к сети.
+        """
+        if self._gateway is None:
+            raise ModuleUnavailableError(f"Соединение с {self._host}:{self._port} закрыто")
+        return self._gateway
 
-    async def read_holding_register_uint32(self, address, count):
-        async with self._request_semaphore:
-            try:
-                # Проверяем подключение и переподключаемся при необходимости
-                if not self._client.connected:
-                    await self.connect()
-                
-                # Используем device_id для pymodbus 3.11.1
-                result = await self._client.read_holding_registers(address, count=2, device_id=240)
-                if result.isError():
-                    _LOGGER.debug(f"Ошибка Modbus при чтении 32-битного регистра {address}: {result}")
-                    return None
-                
-                if result.registers and len(result.registers) >= 2:
-                    # Convert two 16-bit registers to 32-bit value
-                    high_register = result.registers[0]
-                    low_register = result.registers[1]
-                    return (high_register << 16) | low_register
-                return None
-            except Exception as e:
-                # Не логируем ошибки подключения как предупреждения, только как отладочные сообщения
-                if "Not connected" in str(e) or "Connection" in str(e):
-                    _LOGGER.debug(f"Ошибка подключения при чтении 32-битного регистра {address}: {e}")
-                else:
-                    _LOGGER.warning(f"Ошибка при чтении 32-битного регистра {address}: {e}")
-                return None
+    def _bus(self, priority):
+        return self._get_gateway().bus(priority)
 
-    async def read_holding_register_bits(self, address, count):
-        async with self._request_semaphore:
-            try:
-                # Проверяем подключение и переподключаемся при необходимости
-                if not self._client.connected:
-                    await self.connect()
-                
-                # Используем device_id для pymodbus 3.11.1
-                result = await self._client.read_holding_registers(address, count=1, device_id=240)
-                if result.isError():
-                    _LOGGER.debug(f"Ошибка Modbus при чтении битов регистра {address}: {result}")
-                    return None
-                
-                if result.registers:
-                    uint = result.registers[0]
-                    bitlist = [int(x) for x in bin(uint)[2:]]
-                    while len(bitlist) < 16:
-                        bitlist.insert(0, 0)
-                    return bitlist
-                return None
-            except Exception as e:
-                # Не логируем ошибки подключения как предупреждения, только как отладочные сообщения
-                if "Not connected" in str(e) or "Connection" in str(e):
-                    _LOGGER.debug(f"Ошибка подключения при чтении битов регистра {address}: {e}")
-                else:
-                    _LOGGER.warning(f"Ошибка при чтении битов регистра {address}: {e}")
+    async def _execute(self, request, *args, **kwargs):
+        return await self._get_gateway().execute(self._rtt, request, *args, device_id=self._unit_id, **kwargs)
+
+    def get_connection_state(self) -> str:
+        if self._gateway is None:
+            return CONNECTION_CLOSED
+        return self._gateway.get_connection_state()
+
+    def get_rtt_stats(self) -> dict:
+        return self._rtt.get_stats()
+
+    def get_unit_id(self) -> int:
+        return self._unit_id
+
+    async def read_holding_registers(self, address, count, priority=PRIORITY_BACKGROUND_READ, deadline: Deadline | None = None):
+        """Читает блок регистров одним запросом FC03 и возвращает весь список значений"""
+        return await self._single_flight(("block", address, count), self._read_holding_registers,
+                                         address, count, priority, deadline)
+
+    async def _single_flight(self, key, read, address, count, priority, deadline):
+        """Объединяет одновременные чтения одного диапазона в один запрос.
+
+        Первый вызов выполняет чтение со своим приоритетом и сроком, остальные ждут его результат,
+        каждый в пределах собственного срока. Вызов с более высоким приоритетом, чем у идущего
+        чтения, не ждет его в очереди, а выполняет свое чтение, к которому присоединяются
+        следующие вызовы. Отказ ждущего не отменяет общий запрос.
+        """
+        flights = self._reads_in_flight.setdefault(key, [])
+        # Присоединяемся к самому срочному из идущих чтений не ниже своего приоритета
+        joinable = [flight for flight in flights if flight[0] <= priority]
+        if joinable:
+            self._reads_deduplicated += 1
+            task = min(joinable, key=lambda flight: flight[0])[1]
+        else:
+            self._reads_issued += 1
+            task = asyncio.get_running_loop().create_task(read(address, count, priority, deadline))
+            flights.append((priority, task))
+            task.add_done_callback(lambda _: self._end_flight(key, task))
+        try:
+            async with deadline_scope(deadline):
+                return await asyncio.shield(task)
+        except TimeoutError:
+            _LOGGER.debug("Ожидание чтения регистров %s-%s прервано: истек срок", address, address + count - 1)
+            return None
+
+    def _end_flight(self, key, task) -> None:
+        flights = [flight for flight in self._reads_in_flight.get(key, ()) if flight[1] is not task]
+        if flights:
+            self._reads_in_flight[key] = flights
+        else:
+            self._reads_in_flight.pop(key, None)
+
+    async def _read_holding_registers(self, address, count, priority, deadline):
+        try:
+            async with deadline_scope(deadline), self._bus(priority):
+                result = await self._execute(self._client.read_holding_registers, address, count=count)
+            if result.isError():
+                _LOGGER.debug("Ошибка Modbus при чтении блока регистров %s-%s: %s", address, address + count - 1, result)
                 return None
 
-    async def write_holding_register_bits(self, address, bits) -> None:
-        async with self._request_semaphore:
-            try:
-                # Проверяем подключение и переподключаемся при необходимости
-                if not self._client.connected:
-                    await self.connect()
-                
-                value = 0
-                for bit in bits:
-                    value = (value << 1) | bit
-                
-                # Используем device_id для pymodbus 3.11.1
-                result = await self._client.write_register(address, value, device_id=240)
-                if result.isError():
-                    _LOGGER.warning(f"Ошибка Modbus при записи битов в регистр {address}: {result}")
-                    raise Exception(f"Modbus write error: {result}")
-            except Exception as e:
-                _LOGGER.warning(f"Ошибка при записи битов в регистр {address}: {e}")
-                raise
+            if result.registers and len(result.registers) >= count:
+                values = list(result.registers[:count])
+                self._shadow.update(address, values)
+                return values
+            return None
+        except ModuleUnavailableError as e:
+            _LOGGER.debug("Чтение блока регистров %s-%s пропущено: %s", address, address + count - 1, e)
+            return None
+        except TimeoutError:
+            _LOGGER.debug("Чтение блока регистров %s-%s прервано: истек срок цикла опроса", address, address + count - 1)
+            return None
+        except Exception as e:
+            # Не логируем ошибки подключения как предупреждения, только как отладочные сообщения
+            if "Not connected" in str(e) or "Connection" in str(e):
+                _LOGGER.debug("Ошибка подключения при чтении блока регистров %s-%s: %s", address, address + count - 1, e)
+            else:
+                self._error_log.warning("read", "Ошибка при чтении блока регистров %s-%s: %s", address, address + count - 1, e)
+            return None
 
-    async def write_holding_register(self, address, value) -> None:
-        async with self._request_semaphore:
-            try:
-                # Проверяем подключение и переподключаемся при необходимости
-                if not self._client.connected:
-                    await self.connect()
-                
-                # Используем device_id для pymodbus 3.11.1
-                result = await self._client.write_register(address, value, device_id=240)
+    async def write_holding_register(self, address, value, priority=PRIORITY_USER_WRITE, deadline: Deadline | None = None) -> None:
+        try:
+            async with deadline_scope(deadline), self._bus(priority):
+                result = await self._execute(self._client.write_register, address, value)
+            if result.isError():
+                _LOGGER.warning("Ошибка Modbus при записи значения %s в регистр %s: %s", value, address, result)
+                raise Exception(f"Modbus write error: {result}")
+            self._shadow.update(address, (value,))
+        except Exception as e:
+            _LOGGER.warning("Ошибка при записи значения %s в регистр %s: %s", value, address, e)
+            raise
+
+    async def write_holding_registers(self, address, values, priority=PRIORITY_USER_WRITE, deadline: Deadline | None = None) -> None:
+        """Записывает подряд идущие регистры одним запросом FC16"""
+        try:
+            async with deadline_scope(deadline), self._bus(priority):
+                result = await self._execute(self._client.write_registers, address, values)
+            if result.isError():
+                _LOGGER.warning("Ошибка Modbus при записи блока регистров %s-%s: %s", address, address + len(values) - 1, result)
+                raise Exception(f"Modbus write error: {result}")
+            self._shadow.update(address, values)
+        except Exception as e:
+            _LOGGER.warning("Ошибка при записи блока регистров %s-%s: %s", address, address + len(values) - 1, e)
+            raise
+
+    async def mask_write_register(self, address, and_mask, or_mask, priority=PRIORITY_USER_WRITE,
+                                  deadline: Deadline | None = None) -> int | None:
+        """Меняет биты регистра: новое значение = (текущее & and_mask) | (or_mask & ~and_mask).
+
+        Если модуль поддерживает FC22, это один запрос, и биты, которые модуль успел изменить
+        сам, не затираются. Иначе чтение и запись выполняются под одним занятием шины, и между
+        ними не проходит ни один другой запрос к шлюзу. Пока поддержка неизвестна, команда
+        сама пробует FC22 и при отказе модуля сразу переходит на чтение и запись.
+        Возвращает новое значение регистра, если оно известно.
+        """
+        try:
+            async with deadline_scope(deadline), self._bus(priority):
+                if self._mask_write_supported is not False:
+                    try:
+                        result = await self._execute(self._client.mask_write_register, address=address,
+                                                     and_mask=and_mask, or_mask=or_mask)
+                    except ModbusIOException:
+                        # Маска идемпотентна: если ответ потерян после применения, повтор ничего не меняет
+                        if self._mask_write_supported or not self._record_mask_write_loss():
+                            raise
+                        result = None
+                    if result is not None and not result.isError():
+                        self._set_mask_write_supported(True)
+                        return self._shadow.apply_mask(address, and_mask, or_mask)
+                    if result is not None and not _is_illegal_function(result):
+                        raise Exception(f"Modbus mask write error: {result}")
+                    if result is not None:
+                        self._set_mask_write_supported(False)
+
+                result = await self._execute(self._client.read_holding_registers, address, count=1)
+                if result.isError() or not result.registers:
+                    raise Exception(f"Modbus read error: {result}")
+                value = apply_mask(result.registers[0], and_mask, or_mask)
+                result = await self._execute(self._client.write_register, address, value)
                 if result.isError():
-                    _LOGGER.warning(f"Ошибка Modbus при записи значения {value} в регистр {address}: {result}")
                     raise Exception(f"Modbus write error: {result}")
-            except Exception as e:
-                _LOGGER.warning(f"Ошибка при записи значения {value} в регистр {address}: {e}")
-                raise
\ No newline at end of file
+            self._shadow.update(address, (value,))
+            return value
+        except Exception as e:
+            _LOGGER.warning("Ошибка при изменении битов регистра %s (and %#06x, or %#06x): %s",
+                            address, and_mask, or_mask, e)
+            raise
+
+    async def probe_mask_write(self, address, deadline: Deadline | None = None) -> None:
+        """Проверяет поддержку FC22 пустой маской, не меняющей регистр.
+
+        Вызывается при подключении модуля, чтобы первая команда (например, аварийное закрытие
+        крана) не тратила время на проверку. Неподдерживаемой FC22 считается только по ответу
+        модуля "недопустимая функция" или после нескольких потерянных ответов подряд.
+        """
+        if self._mask_write_supported is not None:
+            return
+        try:
+            async with deadline_scope(deadline), self._bus(PRIORITY_BACKGROUND_READ):
+                result = await self._execute(self._client.mask_write_register, address=address,
+                                             and_mask=FULL_MASK, or_mask=0)
+        except ModbusIOException:
+            self._record_mask_write_loss()
+            return
+        except Exception as e:
+            _LOGGER.debug("Проверка поддержки FC22 модулем %s:%s (unit %s) не выполнена: %s",
+                          self._host, self._port, self._unit_id, e)
+            return
+        if not result.isError():
+            self._set_mask_write_supported(True)
+        elif _is_illegal_function(result):
+            self._set_mask_write_supported(False)
+
+    def _record_mask_write_loss(self) -> bool:
+        """Считает потерянный ответ на FC22. True, если FC22 признана неподдерживаемой:
+        часть устройств молча отбрасывает неизвестные функции"""
+        self._mask_write_losses += 1
+        if self._mask_write_losses < MASK_WRITE_PROBE_LOSSES:
+            return False
+        self._set_mask_write_supported(False)
+        return True
+
+    def _set_mask_write_supported(self, supported) -> None:
+        self._mask_write_losses = 0
+        if self._mask_write_supported == supported:
+            return
+        self._mask_write_supported = supported
+        _LOGGER.info("Модуль %s:%s (unit %s) %s", self._host, self._port, self._unit_id,
+                     "поддерживает FC22" if supported else "не поддерживает FC22, биты меняются чтением и записью")
+
+    async def read_registers_cached(self, addresses, priority=PRIORITY_BACKGROUND_READ,
+                                    deadline: Deadline | None = None) -> dict | None:
+        """Значения регистров {адрес: значение} из теневого образа.
+
+        Регистры с истекшим TTL дочитываются минимальным числом запросов FC03, мелкие разрывы
+        между ними читаются заодно и тоже обновляют образ. None, если дочитать не удалось.
+        """
+        addresses = tuple(addresses)
+        expired = self._shadow.expired(addresses)
+        for block in compile_address_plan(expired):
+            if await self.read_holding_registers(block.address, block.count, priority, deadline) is None:
+                return None
+        return {address: self._shadow.get(address) for address in addresses}
+
+    def set_register_ttls(self, ttls) -> None:
+        self._shadow.set_ttls(ttls)
+
+    def get_read_stats(self) -> dict:
+        """Число отправленных чтений и чтений, присоединившихся к уже идущему запросу"""
+        return {"issued": self._reads_issued, "deduplicated": self._reads_deduplicated}
+
+    def get_shadow_stats(self) -> dict:
+        return self._shadow.get_stats()
+
+    def get_queue_wait_stats(self) -> dict:
+        if self._gateway is None:
+            return {}
+        return self._gateway.get_queue_wait_stats()
+
+
+# Окно, в течение которого записи собираются в один пакет, секунды
+WRITE_DEBOUNCE = 0.05
+
+
+class WriteBatcher:
+    """Собирает записи регистров и отправляет их пакетами FC16.
+
+    Записи, поставленные в очередь в пределах окна debounce, объединяются: повторная запись
+    в тот же регистр заменяет предыдущую, подряд идущие адреса уходят одним запросом
+    write_registers. Регистры между диапазонами не дописываются - они могут быть только
+    для чтения (например, статус проводных линий). Записи разных приоритетов собираются в
+    отдельные пакеты и уходят каждая со своим приоритетом, аварийные - сразу.
+    """
+
+    def __init__(self, hub: modbus_hub, debounce=WRITE_DEBOUNCE) -> None:
+        self._hub = hub
+        self._debounce = debounce
+        # Пакеты по приоритетам: {приоритет: ({адрес: значение}, [future])}
+        self._pending = {}
+        # Пакеты, отправленные на модуль, но еще не подтвержденные, в порядке отправки:
+        # [({адрес: значение}, событие завершения отправки)]
+        self._in_flight = []
+        self._timer = None
+        self._flush_task = None
+
+    def stage(self, values, priority=PRIORITY_USER_WRITE) -> asyncio.Future:
+        """Ставит записи {адрес: значение} в пакет, возвращает future завершения записи"""
+        loop = asyncio.get_running_loop()
+        # Более поздняя запись регистра заменяет его запись в пакетах других приоритетов
+        for batch, _ in self._pending.values():
+            for address in values:
+                batch.pop(address, None)
+        batch, waiters = self._pending.setdefault(priority, ({}, []))
+        batch.update(values)
+        waiter = loop.create_future()
+        waiters.append(waiter)
+        if self._timer is None:
+            self._timer = loop.call_later(self._debounce, self._start_flush)
+        return waiter
+
+    async def write(self, values, priority=PRIORITY_USER_WRITE) -> None:
+        """Записывает регистры в составе ближайшего пакета. Аварийные записи не ждут окна"""
+        waiter = self.stage(values, priority)
+        if priority == PRIORITY_EMERGENCY_WRITE:
+            await self.flush(priority)
+        await waiter
+
+    def get_pending(self, address):
+        """Значение регистра в еще не подтвержденной записи (None, если записи нет)"""
+        for batch, _ in self._pending.values():
+            if address in batch:
+                return batch[address]
+        for batch, _ in reversed(self._in_flight):
+            if address in batch:
+                return batch[address]
+        return None
+
+    async def wait_sent(self, address) -> None:
+        """Ждет, пока все пакеты с записью регистра будут отправлены и подтверждены (или отклонены).
+
+        Нужно перед маскированной записью того же регистра: иначе она может обогнать пакет,
+        ждущий шину с меньшим приоритетом, и пакет вернет регистру старые биты.
+        """
+        for priority in sorted(self._pending):
+            batch, _ = self._pending.get(priority, ({}, []))
+            if address in batch:
+                await self.flush(priority)
+        for batch, sent in list(self._in_flight):
+            if address in batch:
+                await sent.wait()
+
+    def _start_flush(self) -> None:
+        self._timer = None
+        self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self, priority=None) -> None:
+        """Немедленно отправляет накопленные пакеты, старшие первыми, или пакет одного приоритета"""
+        if priority is None:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            priorities = sorted(self._pending)
+        else:
+            priorities = [priority] if priority in self._pending else []
+        for batch_priority in priorities:
+            batch, waiters = self._pending.pop(batch_priority)
+            await self._send(batch, batch_priority, waiters)
+
+    async def _send(self, batch, priority, waiters) -> None:
+        sent = asyncio.Event()
+        self._in_flight.append((batch, sent))
+        try:
+            for address, values in compile_write_ranges(batch):
+                if len(values) == 1:
+                    await self._hub.write_holding_register(address, values[0], priority)
+                else:
+                    await self._hub.write_holding_registers(address, values, priority)
+        except Exception as e:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        finally:
+            self._in_flight = [flight for flight in self._in_flight if flight[0] is not batch]
+            sent.set()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import logging
+import time
+
+# Интервал, за который повторы одного сообщения сводятся в одну запись, секунды
+DEFAULT_LOG_INTERVAL = 300
+
+
+class RateLimitedLogger:
+    """Ограничивает частоту повторяющихся сообщений об ошибках.
+
+    Первое сообщение с данным ключом пишется сразу, повторы в течение интервала только
+    подсчитываются. Следующее сообщение после интервала выводится с числом подавленных
+    повторов. recovered() закрывает серию ошибок одной записью о восстановлении.
+    """
+
+    def __init__(self, logger: logging.Logger, interval=DEFAULT_LOG_INTERVAL) -> None:
+        self._logger = logger
+        self._interval = interval
+        # ключ -> [начало окна, число подавленных повторов]
+        self._windows = {}
+
+    def log(self, level, key, msg, *args) -> None:
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None:
+            self._windows[key] = [now, 0]
+            self._logger.log(level, msg, *args)
+            return
+        if now - window[0] < self._interval:
+            window[1] += 1
+            return
+        if window[1]:
+            self._logger.log(level, msg + " (подавлено повторов за %d с: %d)", *args, now - window[0], window[1])
+        else:
+            self._logger.log(level, msg, *args)
+        window[0], window[1] = now, 0
+
+    def warning(self, key, msg, *args) -> None:
+        self.log(logging.WARNING, key, msg, *args)
+
+    def error(self, key, msg, *args) -> None:
+        self.log(logging.ERROR, key, msg, *args)
+
+    def recovered(self, key, msg, *args) -> None:
+        """Закрывает серию ошибок: пишет msg, только если по ключу были ошибки"""
+        window = self._windows.pop(key, None)
+        if window is not None:
+            self._logger.info(msg + " (подавлено повторов: %d)", *args, window[1])
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import logging
+
+from pymodbus.constants import ExcCodes
+from pymodbus.datastore import ModbusServerContext
+from pymodbus.server import ModbusTcpServer
+
+from .const import DEFAULT_PROXY_HOST
+from .device import NeptunSmart
+from .registers import NeptunSmartRegisters
+
+_LOGGER = logging.getLogger(__name__)
+
+# Последний регистр карты модуля (конфигурация восьмого счетчика)
+LAST_REGISTER = NeptunSmartRegisters.first_counter_config + NeptunSmartRegisters.counters_count - 1
+# Функции записи, которые прокси передает модулю
+WRITE_FUNCTIONS = (6, 16)
+# Регистры состояния и значения счетчиков только читаются: [начало, конец)
+READ_ONLY_RANGES = (
+    (NeptunSmartRegisters.status_wired_line, NeptunSmartRegisters.status_wired_line + 1),
+    (NeptunSmartRegisters.count_of_connected_wireless_sensors,
+     NeptunSmartRegisters.count_of_connected_wireless_sensors + 1),
+    (NeptunSmartRegisters.first_wireless_sensor_status, NeptunSmartRegisters.first_counter_config),
+)
+
+
+def is_read_only(address, count) -> bool:
+    """Задевает ли запись count регистров с address регистры только для чтения"""
+    return any(address < end and start < address + count for start, end in READ_ONLY_RANGES)
+
+
+class RegisterImageContext(ModbusServerContext):
+    """Хранилище сервера pymodbus поверх образа регистров устройства.
+
+    Чтения отвечаются из последнего образа опроса; регистры, которые интеграция не опрашивает,
+    дочитываются с модуля через общую очередь шины. Записи уходят на модуль через пакетную
+    запись устройства, клиент получает ответ после подтверждения модулем; запись регистров
+    состояния и счетчиков отклоняется с ILLEGAL_ADDRESS. Пока связи с модулем нет, клиенты
+    получают исключение GATEWAY_NO_RESPONSE, а не устаревшие значения.
+    """
+
+    def __init__(self, device: NeptunSmart) -> None:
+        # Базовый конструктор не вызывается: он строит хранилище симулятора pymodbus. Атрибуты,
+        # по которым сервер выбирает хранилище, - внутренние атрибуты pymodbus 3.16; с другой
+        # версией прокси не запускается (PROXY_PYMODBUS_SERIES)
+        self._device = device
+        self.old_simulator = True
+        self.simdevices = []
+        self._reads = 0
+        self._misses = 0
+        self._writes = 0
+
+    def device_ids(self):
+        # Прокси обслуживает один модуль и отвечает на любой unit id
+        return [0]
+
+    async def async_getValues(self, device_id, func_code, address, count=1):
+        if address < 0 or address + count - 1 > LAST_REGISTER:
+            return ExcCodes.ILLEGAL_ADDRESS
+        if not self._device.is_connected():
+            return ExcCodes.GATEWAY_NO_RESPONSE
+        self._reads += 1
+        image = self._device.get_register_image()
+        values = [image.get(register) for register in range(address, address + count)]
+        if None in values:
+            self._misses += 1
+            values = await self._device.read_registers(address, count)
+            if values is None:
+                return ExcCodes.GATEWAY_NO_RESPONSE
+        return values
+
+    async def async_setValues(self, device_id, func_code, address, values):
+        if func_code not in WRITE_FUNCTIONS:
+            return ExcCodes.ILLEGAL_FUNCTION
+        if address < 0 or address + len(values) - 1 > LAST_REGISTER or is_read_only(address, len(values)):
+            return ExcCodes.ILLEGAL_ADDRESS
+        try:
+            await self._device.write_registers(dict(enumerate(values, address)))
+        except Exception as e:
+            _LOGGER.debug("Запись регистров %s-%s через прокси не выполнена: %s", address, address + len(values) - 1, e)
+            return ExcCodes.GATEWAY_NO_RESPONSE
+        self._writes += 1
+        return None
+
+    def get_stats(self) -> dict:
+        """Число чтений клиентов, из них дочитанных с модуля, и число записей"""
+        return {"reads": self._reads, "misses": self._misses, "writes": self._writes}
+
+
+class RegisterImageProxy:
+    """Локальный Modbus TCP сервер, раздающий образ регистров модуля другим клиентам.
+
+    Модуль принимает одно соединение Modbus; прокси позволяет системам диспетчеризации и
+    регистраторам читать его данные, пока модуль опрашивает только интеграция.
+    """
+
+    def __init__(self, device: NeptunSmart, port, host=DEFAULT_PROXY_HOST) -> None:
+        self._device = device
+        self._address = (host, port)
+        self._context = RegisterImageContext(device)
+        self._server = None
+
+    async def start(self) -> bool:
+        server = ModbusTcpServer(self._context, address=self._address)
+        try:
+            await server.serve_forever(background=True)
+        except (OSError, RuntimeError) as e:
+            _LOGGER.error("Не удалось запустить Modbus прокси %s на порту %s: %s",
+                          self._device.get_name(), self._address[1], e)
+            return False
+        self._server = server
+        _LOGGER.info("Modbus прокси %s слушает %s:%s", self._device.get_name(), *self._address)
+        return True
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            await self._server.shutdown()
+            self._server = None
+
+    def get_stats(self) -> dict:
+        return self._context.get_stats()
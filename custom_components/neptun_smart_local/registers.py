@@ -1,3 +1,8 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+
 class NeptunSmartRegisters:
     module_config = 0
     input_line_1_2_config = 1
@@ -5,7 +10,289 @@ class NeptunSmartRegisters:
     status_wired_line = 3
     relay_config = 4
     count_of_connected_wireless_sensors = 6
+    # Заголовок модуля (регистры 0-6) читается одним запросом
+    header_size = 7
     first_wireless_sensor_config = 7
     first_wireless_sensor_status = 57
+    wireless_sensors_max = 50
     first_counter = 107
-    first_counter_config = 123
\ No newline at end of file
+    first_counter_config = 123
+    # Восемь счетчиков: значения uint32 в 107-122, конфигурация в 123-130
+    counters_count = 8
+
+
+# Ограничение протокола Modbus на число регистров в одном ответе FC03
+MAX_REGISTERS_PER_READ = 125
+# Сколько лишних регистров выгоднее прочитать, чем делать отдельный запрос
+DEFAULT_MAX_READ_GAP = 8
+# Ограничение протокола Modbus на число регистров в одном запросе FC16
+MAX_REGISTERS_PER_WRITE = 123
+
+# Классы опроса регистров
+POLL_ALARM = "alarm"
+POLL_COUNTER = "counter"
+POLL_DIAGNOSTIC = "diagnostic"
+POLL_CONFIG = "config"
+
+# Маска всех битов регистра
+FULL_MASK = 0xFFFF
+
+TYPE_BITS = "bits"
+TYPE_UINT16 = "uint16"
+TYPE_UINT32 = "uint32"
+
+
+@dataclass(frozen=True, slots=True)
+class BitField:
+    """Поле внутри регистра: номер младшего бита и ширина в битах.
+
+    Маска вычисляется один раз, чтение и запись поля - пара битовых операций над int.
+    """
+
+    name: str
+    shift: int
+    width: int = 1
+    mask: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "mask", ((1 << self.width) - 1) << self.shift)
+
+    def decode(self, value) -> int:
+        return (value & self.mask) >> self.shift
+
+    def encode(self, value, field_value) -> int:
+        """Новое значение регистра с замененным полем"""
+        return (value & ~self.mask) | ((int(field_value) << self.shift) & self.mask)
+
+
+@dataclass(frozen=True, slots=True)
+class Register:
+    """Описание регистра (или пары регистров для uint32) в карте модуля"""
+
+    name: str
+    address: int
+    type: str = TYPE_UINT16
+    poll_class: str = POLL_CONFIG
+    fields: tuple[BitField, ...] = ()
+    _fields_by_name: dict = field(init=False, repr=False, compare=False, hash=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_fields_by_name", {bit_field.name: bit_field for bit_field in self.fields})
+
+    def bit_field(self, name) -> BitField:
+        return self._fields_by_name[name]
+
+    def get(self, value, name) -> int:
+        """Значение поля name из значения регистра"""
+        return self._fields_by_name[name].decode(value)
+
+    def flag(self, value, name) -> bool:
+        return bool(value & self._fields_by_name[name].mask)
+
+    def set(self, value, name, field_value) -> int:
+        """Значение регистра с записанным полем name"""
+        return self._fields_by_name[name].encode(value, field_value)
+
+    @property
+    def width(self) -> int:
+        return 2 if self.type == TYPE_UINT32 else 1
+
+    @property
+    def end(self) -> int:
+        return self.address + self.width
+
+    def mask(self, *names) -> int:
+        """Маска битов указанных полей регистра"""
+        return fields_mask(self.fields, *names)
+
+
+def fields_mask(fields, *names) -> int:
+    """Маска битов указанных полей из набора BitField"""
+    mask = 0
+    for bit_field in fields:
+        if bit_field.name in names:
+            mask |= bit_field.mask
+    return mask
+
+
+MODULE_CONFIG = Register("module_config", NeptunSmartRegisters.module_config, TYPE_BITS, POLL_ALARM, (
+    BitField("floor_washing_mode", 0),
+    BitField("first_group_alarm", 1),
+    BitField("second_group_alarm", 2),
+    BitField("discharge_wireless_sensors", 3),
+    BitField("lost_wireless_sensors", 4),
+    BitField("connecting_wireless_sensors_mode", 7),
+    BitField("first_group_valve", 8),
+    BitField("second_group_valve", 9),
+    BitField("dual_group_mode", 10),
+    BitField("close_valve_when_loss_sensor", 11),
+    BitField("lock_buttons", 12),
+))
+INPUT_LINE_1_2_CONFIG = Register("input_line_1_2_config", NeptunSmartRegisters.input_line_1_2_config, TYPE_BITS,
+                                 POLL_CONFIG, (
+    BitField("line_2_group", 0, 2),
+    BitField("line_2_type", 2),
+    BitField("line_1_group", 8, 2),
+    BitField("line_1_type", 10),
+))
+INPUT_LINE_3_4_CONFIG = Register("input_line_3_4_config", NeptunSmartRegisters.input_line_3_4_config, TYPE_BITS,
+                                 POLL_CONFIG, (
+    BitField("line_4_group", 0, 2),
+    BitField("line_4_type", 2),
+    BitField("line_3_group", 8, 2),
+    BitField("line_3_type", 10),
+))
+STATUS_WIRED_LINE = Register("status_wired_line", NeptunSmartRegisters.status_wired_line, TYPE_BITS, POLL_ALARM, (
+    BitField("line_1_alarm", 0),
+    BitField("line_2_alarm", 1),
+    BitField("line_3_alarm", 2),
+    BitField("line_4_alarm", 3),
+))
+RELAY_CONFIG = Register("relay_config", NeptunSmartRegisters.relay_config, TYPE_BITS, POLL_CONFIG, (
+    BitField("switch_when_alert", 0, 2),
+    BitField("switch_when_close_valve", 2, 2),
+))
+COUNT_OF_CONNECTED_WIRELESS_SENSORS = Register("count_of_connected_wireless_sensors",
+                                               NeptunSmartRegisters.count_of_connected_wireless_sensors,
+                                               TYPE_UINT16, POLL_DIAGNOSTIC)
+
+HEADER_REGISTERS = (
+    MODULE_CONFIG,
+    INPUT_LINE_1_2_CONFIG,
+    INPUT_LINE_3_4_CONFIG,
+    STATUS_WIRED_LINE,
+    RELAY_CONFIG,
+    COUNT_OF_CONNECTED_WIRELESS_SENSORS,
+)
+
+WIRELESS_SENSOR_STATUS_FIELDS = (
+    BitField("alert", 0),
+    BitField("discharge", 1),
+    BitField("lost", 2),
+    BitField("signal_level", 3, 3),
+    BitField("battery_level", 8, 8),
+)
+
+# Уровень сигнала беспроводного датчика декодируется с обратным порядком битов
+# (бит 3 - старший), таблица по сырому значению поля сохраняет это поведение
+SIGNAL_LEVEL_BY_RAW = tuple(int(f"{raw:03b}"[::-1], 2) for raw in range(8))
+
+
+def line_config_register(line_number) -> Register:
+    """Регистр конфигурации, в котором лежит проводная линия 1-4"""
+    return INPUT_LINE_1_2_CONFIG if line_number in (1, 2) else INPUT_LINE_3_4_CONFIG
+
+
+def wireless_sensor_config_register(index) -> Register:
+    return Register(f"wireless_sensor_{index + 1}_config",
+                    NeptunSmartRegisters.first_wireless_sensor_config + index, TYPE_UINT16, POLL_CONFIG)
+
+
+def wireless_sensor_status_register(index) -> Register:
+    return Register(f"wireless_sensor_{index + 1}_status",
+                    NeptunSmartRegisters.first_wireless_sensor_status + index, TYPE_BITS, POLL_ALARM,
+                    WIRELESS_SENSOR_STATUS_FIELDS)
+
+
+def counter_register(index) -> Register:
+    return Register(f"counter_{index + 1}", NeptunSmartRegisters.first_counter + (index * 2), TYPE_UINT32,
+                    POLL_COUNTER)
+
+
+def counter_config_register(index) -> Register:
+    return Register(f"counter_{index + 1}_config", NeptunSmartRegisters.first_counter_config + index, TYPE_BITS,
+                    POLL_COUNTER, (BitField("enabled", 0),))
+
+
+def module_registers(wireless_sensors) -> tuple[Register, ...]:
+    """Полная карта регистров модуля с заданным числом беспроводных датчиков"""
+    registers = list(HEADER_REGISTERS)
+    registers += [wireless_sensor_config_register(i) for i in range(wireless_sensors)]
+    registers += [wireless_sensor_status_register(i) for i in range(wireless_sensors)]
+    registers += [counter_register(i) for i in range(NeptunSmartRegisters.counters_count)]
+    registers += [counter_config_register(i) for i in range(NeptunSmartRegisters.counters_count)]
+    return tuple(registers)
+
+
+@dataclass(frozen=True, slots=True)
+class ReadBlock:
+    """Один запрос FC03: начальный адрес и число регистров"""
+
+    address: int
+    count: int
+
+    @property
+    def end(self) -> int:
+        return self.address + self.count
+
+    def __repr__(self) -> str:
+        return f"{self.address}-{self.end - 1}"
+
+
+@dataclass(frozen=True, slots=True)
+class ReadPlan:
+    """Скомпилированный план чтения: минимальный набор запросов FC03 для набора регистров"""
+
+    blocks: tuple[ReadBlock, ...]
+    registers: tuple[Register, ...]
+
+    @property
+    def request_count(self) -> int:
+        return len(self.blocks)
+
+    @property
+    def register_count(self) -> int:
+        return sum(block.count for block in self.blocks)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def block_poll_classes(self, block) -> set[str]:
+        """Классы опроса регистров, попавших в блок"""
+        return {register.poll_class for register in self.registers
+                if block.address <= register.address < block.end}
+
+    def __repr__(self) -> str:
+        return f"ReadPlan({self.request_count} requests: {', '.join(repr(block) for block in self.blocks)})"
+
+
+def compile_read_plan(registers, max_gap=DEFAULT_MAX_READ_GAP, max_count=MAX_REGISTERS_PER_READ) -> ReadPlan:
+    """Собирает регистры в минимальное число запросов FC03.
+
+    Соседние регистры объединяются в один запрос, если разрыв между ними не больше max_gap
+    и запрос не превышает max_count регистров. Регистры uint32 никогда не разрываются.
+    """
+    registers = tuple(sorted(set(registers), key=lambda register: register.address))
+    blocks = []
+    start = end = None
+    for register in registers:
+        if start is not None and register.address - end <= max_gap and register.end - start <= max_count:
+            end = max(end, register.end)
+            continue
+        if start is not None:
+            blocks.append(ReadBlock(start, end - start))
+        start, end = register.address, register.end
+    if start is not None:
+        blocks.append(ReadBlock(start, end - start))
+    return ReadPlan(tuple(blocks), registers)
+
+
+def compile_address_plan(addresses, max_gap=DEFAULT_MAX_READ_GAP, max_count=MAX_REGISTERS_PER_READ) -> ReadPlan:
+    """План чтения для произвольного набора адресов 16-битных регистров"""
+    return compile_read_plan([Register(f"register_{address}", address) for address in addresses], max_gap, max_count)
+
+
+def compile_write_ranges(values, max_count=MAX_REGISTERS_PER_WRITE) -> list[tuple[int, list[int]]]:
+    """Разбивает записи {адрес: значение} на непрерывные диапазоны (начальный адрес, значения).
+
+    В отличие от плана чтения, разрывы не заполняются: запись чужого регистра недопустима.
+    """
+    ranges = []
+    for address in sorted(values):
+        if ranges:
+            start, run = ranges[-1]
+            if address == start + len(run) and len(run) < max_count:
+                run.append(values[address])
+                continue
+        ranges.append((address, [values[address]]))
+    return ranges
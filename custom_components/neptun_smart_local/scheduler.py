@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+import zlib
+from contextlib import asynccontextmanager
+
+from .const import (
+    CONF_ALARM_INTERVAL,
+    CONF_CONFIG_INTERVAL,
+    CONF_COUNTER_INTERVAL,
+    CONF_DIAGNOSTIC_INTERVAL,
+)
+from .registers import POLL_ALARM, POLL_CONFIG, POLL_COUNTER, POLL_DIAGNOSTIC
+
+# Интервалы опроса классов регистров по умолчанию, секунды; None - только по запросу.
+# Биты вентилей лежат в module_config вместе с авариями и опрашиваются с классом аварий.
+DEFAULT_POLL_INTERVALS = {
+    POLL_ALARM: 2,
+    POLL_COUNTER: 60,
+    POLL_DIAGNOSTIC: 600,
+    POLL_CONFIG: None,
+}
+
+
+# Ключи настроек записи для интервалов классов опроса
+POLL_INTERVAL_OPTIONS = {
+    POLL_ALARM: CONF_ALARM_INTERVAL,
+    POLL_COUNTER: CONF_COUNTER_INTERVAL,
+    POLL_DIAGNOSTIC: CONF_DIAGNOSTIC_INTERVAL,
+    POLL_CONFIG: CONF_CONFIG_INTERVAL,
+}
+
+
+def poll_intervals_from_options(options) -> dict:
+    """Интервалы классов опроса из настроек записи; 0 означает опрос только по запросу"""
+    intervals = {}
+    for poll_class, option in POLL_INTERVAL_OPTIONS.items():
+        if option in options:
+            intervals[poll_class] = options[option] or None
+    return intervals
+
+
+class PollScheduler:
+    """Расписание опроса по классам регистров.
+
+    На каждом такте возвращает классы, которым пора опрашиваться: интервал истек, класс еще
+    ни разу не опрашивался или опрос запрошен явно (например, после записи конфигурации).
+    """
+
+    def __init__(self, intervals=None) -> None:
+        self._intervals = {**DEFAULT_POLL_INTERVALS, **(intervals or {})}
+        self._last_polled = dict.fromkeys(self._intervals)
+        self._requested = set()
+
+    def get_interval(self, poll_class):
+        return self._intervals[poll_class]
+
+    def get_tick(self) -> float:
+        """Период такта планировщика - интервал самого частого класса"""
+        return min(interval for interval in self._intervals.values() if interval)
+
+    def due(self, now) -> frozenset[str]:
+        # Небольшой допуск, чтобы класс с интервалом, кратным такту, не пропускал такт из-за джиттера
+        tolerance = self.get_tick() / 4
+        due = set(self._requested)
+        for poll_class, interval in self._intervals.items():
+            last = self._last_polled[poll_class]
+            if last is None or (interval and now - last >= interval - tolerance):
+                due.add(poll_class)
+        return frozenset(due)
+
+    def request(self, *poll_classes) -> None:
+        """Опросить классы на ближайшем такте вне расписания"""
+        self._requested.update(poll_classes)
+
+    def mark_polled(self, poll_classes, now) -> None:
+        for poll_class in poll_classes:
+            self._last_polled[poll_class] = now
+        self._requested.difference_update(poll_classes)
+
+
+# Адаптивный такт опроса, секунды
+BOOST_POLL_INTERVAL = 0.5
+# Сколько держать ускоренный опрос после команды
+BOOST_AFTER_WRITE = 10
+# Сколько циклов без изменений до начала замедления
+IDLE_CYCLES_BEFORE_BACKOFF = 5
+# Потолок замедления по умолчанию. В простое опрос аварий тоже замедляется до потолка;
+# потолок, равный интервалу класса аварий, отключает замедление
+DEFAULT_MAX_POLL_INTERVAL = 10
+
+REASON_WRITE = "write"
+REASON_ACTIVE = "active"
+REASON_CHANGED = "changed"
+REASON_IDLE = "idle_backoff"
+REASON_BASE = "base"
+
+
+class AdaptivePollInterval:
+    """Адаптивный такт опроса.
+
+    Сразу после команды и пока на модуле активна авария, режим мойки пола или подключения
+    датчиков, опрос идет с коротким интервалом. Если несколько циклов подряд ничего не меняется,
+    интервал удваивается до потолка; любое изменение возвращает базовый такт.
+    """
+
+    def __init__(self, base, ceiling=DEFAULT_MAX_POLL_INTERVAL, boost=BOOST_POLL_INTERVAL) -> None:
+        self._base = base
+        self._ceiling = max(ceiling, base)
+        self._boost = min(boost, base)
+        self._boost_until = 0
+        self._idle_cycles = 0
+        self._interval = base
+        self._reason = REASON_BASE
+
+    def get_interval(self) -> float:
+        return self._interval
+
+    def get_reason(self) -> str:
+        return self._reason
+
+    def is_boosted(self) -> bool:
+        """Идет ускоренный опрос (после команды или пока на модуле что-то активно)"""
+        return self._reason in (REASON_WRITE, REASON_ACTIVE)
+
+    def boost(self, now) -> None:
+        """Ускорить опрос после команды"""
+        self._boost_until = now + BOOST_AFTER_WRITE
+        self._idle_cycles = 0
+        self._interval = self._boost
+        self._reason = REASON_WRITE
+
+    def next_interval(self, now, changed, active) -> float:
+        """Выбирает интервал до следующего опроса по результатам завершенного цикла"""
+        if now < self._boost_until:
+            self._interval, self._reason = self._boost, REASON_WRITE
+        elif active:
+            self._interval, self._reason = self._boost, REASON_ACTIVE
+        elif changed:
+            self._idle_cycles = 0
+            self._interval, self._reason = self._base, REASON_CHANGED
+        else:
+            self._idle_cycles += 1
+            if self._idle_cycles <= IDLE_CYCLES_BEFORE_BACKOFF:
+                self._interval, self._reason = self._base, REASON_BASE
+            else:
+                self._interval = min(max(self._interval, self._base) * 2, self._ceiling)
+                # Потолок может совпадать с базовым тактом, тогда замедления фактически нет
+                self._reason = REASON_IDLE if self._interval > self._base else REASON_BASE
+        return self._interval
+
+
+# Сколько модулей домена могут опрашиваться одновременно
+DEFAULT_FLEET_CONCURRENCY = 4
+
+
+class FleetScheduler:
+    """Общее для всех записей домена расписание опросов.
+
+    Каждая запись получает постоянную фазу - долю интервала, на которую сдвинуты ее опросы:
+    каждый приходится на точку offset + k * interval по часам цикла событий, где
+    offset = phase * interval. Фазы распределены по интервалу равномерно в порядке crc32
+    идентификаторов записей, поэтому модули не опрашиваются разом ни после перезапуска HA,
+    ни позже.
+    Одновременно опрашивается не больше max_concurrent модулей, остальные ждут своей очереди.
+    """
+
+    def __init__(self, max_concurrent=DEFAULT_FLEET_CONCURRENCY) -> None:
+        self._max_concurrent = max_concurrent
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._keys = []
+        self._phases = {}
+        self._active = 0
+        self._peak = 0
+        # Число опросов, суммарное и максимальное ожидание очереди
+        self._wait_stats = [0, 0.0, 0.0]
+
+    def register(self, *keys) -> None:
+        self._keys = sorted(set(self._keys).union(keys), key=lambda key: (zlib.crc32(key.encode()), key))
+        self._update_phases()
+
+    def unregister(self, key) -> None:
+        if key in self._keys:
+            self._keys.remove(key)
+            self._update_phases()
+
+    def _update_phases(self) -> None:
+        self._phases = {key: i / len(self._keys) for i, key in enumerate(self._keys)}
+
+    def get_phase(self, key) -> float:
+        """Фаза записи в долях интервала; незарегистрированная запись получает фазу по crc32"""
+        phase = self._phases.get(key)
+        if phase is None:
+            phase = zlib.crc32(key.encode()) / 2 ** 32
+        return phase
+
+    def next_slot(self, key, interval, now) -> float:
+        """Ближайшая после now точка опроса записи на сетке с шагом interval"""
+        offset = self.get_phase(key) * interval
+        return offset + (math.floor((now - offset) / interval) + 1) * interval
+
+    async def wait_slot(self, key, interval) -> None:
+        """Ждет ближайшей точки опроса записи (например, перед первым опросом модуля)"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        await asyncio.sleep(self.next_slot(key, interval, now) - now)
+
+    @asynccontextmanager
+    async def poll(self):
+        """Занимает одно из max_concurrent мест для опроса модуля"""
+        started = time.monotonic()
+        async with self._semaphore:
+            wait = time.monotonic() - started
+            self._wait_stats[0] += 1
+            self._wait_stats[1] += wait
+            self._wait_stats[2] = max(self._wait_stats[2], wait)
+            self._active += 1
+            self._peak = max(self._peak, self._active)
+            try:
+                yield
+            finally:
+                self._active -= 1
+
+    def get_stats(self) -> dict:
+        """Число модулей, лимит и пик одновременных опросов, ожидание очереди в мс"""
+        count, total, maximum = self._wait_stats
+        return {
+            "modules": len(self._keys),
+            "max_concurrent": self._max_concurrent,
+            "peak_concurrent": self._peak,
+            "avg_wait_ms": round(total / count * 1000, 1) if count else 0,
+            "max_wait_ms": round(maximum * 1000, 1),
+        }
@@ -1,35 +1,39 @@
 from __future__ import annotations
 
-from datetime import timedelta
-
 from homeassistant.components.select import SelectEntity
+from homeassistant.core import callback
 from homeassistant.helpers.entity import EntityCategory
-from . import NeptunSmart
+from .coordinator import NeptunSmartCoordinator
+from .entity import NeptunSmartEntity
+from .registers import FULL_MASK, MODULE_CONFIG, RELAY_CONFIG, line_config_register
 from .const import DOMAIN
 
 from .device import WirelessSensor
-SCAN_INTERVAL = timedelta(seconds=5)
+
 async def async_setup_entry(HomeAssistant, config_entry, async_add_entities):
-    device: NeptunSmart = HomeAssistant.data[DOMAIN][config_entry.entry_id]
+    coordinator: NeptunSmartCoordinator = HomeAssistant.data[DOMAIN][config_entry.entry_id]
+    device = coordinator.device
     selects = []
     for i in 1, 2, 3, 4:
-        selects.append(LineTypeConfig(device=device, line_number=i))
+        selects.append(LineTypeConfig(coordinator=coordinator, line_number=i))
         if device.get_dual_group_mode():
-            selects.append(LineGroupConfig(device=device, line_number=i))
-    selects.append(RelaySwitchWhenCloseValve(device))
-    selects.append(RelaySwitchWhenAlert(device))
-    for i in range(0, device.get_number_of_connected_wireless_sensors()):
+            selects.append(LineGroupConfig(coordinator=coordinator, line_number=i))
+    selects.append(RelaySwitchWhenCloseValve(coordinator))
+    selects.append(RelaySwitchWhenAlert(coordinator))
+    for i in range(0, len(device.wireless_sensors)):
         if device.get_dual_group_mode():
-            selects.append(WirelessSensorGroupConfig(device, device.wireless_sensors[i], i+1))
+            selects.append(WirelessSensorGroupConfig(coordinator, device.wireless_sensors[i], i+1))
     async_add_entities(selects, update_before_add=False)
 
 
-class LineTypeConfig(SelectEntity):
-    def __init__(self, device: NeptunSmart, line_number):
-        self._device = device
+class LineTypeConfig(NeptunSmartEntity, SelectEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator, line_number):
+        super().__init__(coordinator)
+        register = line_config_register(line_number)
+        self._watched_registers = ((register.address, register.mask(f"line_{line_number}_type")),)
         self._line_number = line_number
         self._state = self._device.get_line_config_type(line_number=line_number)      #True = button, False = sensor
-        self._attr_unique_id = f"{device.get_name()}_Line_{self._line_number}_config"
+        self._attr_unique_id = f"{self._device.get_name()}_Line_{self._line_number}_config"
         self._attr_name = f"Line {self._line_number} type"
         self._attr_entity_category = EntityCategory.CONFIG  # DIAGNOSTIC
         if self._device.get_line_config_type(line_number=line_number):
@@ -43,6 +47,7 @@ class LineTypeConfig(SelectEntity):
         else:
             self._state = True
         await self._device.set_line_type(self._line_number, self._state)
+        self.async_write_ha_state()
 
     @property
     def options(self) -> list[str]:
@@ -50,26 +55,27 @@ class LineTypeConfig(SelectEntity):
         options = ["Sensor", "Button"]
         return options
 
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
-
-    async def async_update(self) -> None:
-        """Fetch new state data for the select."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         if self._device.get_line_config_type(self._line_number):
             self._attr_current_option = "Button"
         else:
             self._attr_current_option = "Sensor"
+        super()._handle_coordinator_update()
 
 
-class LineGroupConfig(SelectEntity):
-    def __init__(self, device: NeptunSmart, line_number):
-        self._device = device
+class LineGroupConfig(NeptunSmartEntity, SelectEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator, line_number):
+        super().__init__(coordinator)
+        register = line_config_register(line_number)
+        self._watched_registers = (
+            (register.address, register.mask(f"line_{line_number}_group")),
+            (MODULE_CONFIG.address, MODULE_CONFIG.mask("dual_group_mode")),
+        )
         self._line_number = line_number
         self._state = self._device.get_line_group(line_number=line_number)
-        self._attr_unique_id = f"{device.get_name()}_Line_{self._line_number}_group_ config"
+        self._attr_unique_id = f"{self._device.get_name()}_Line_{self._line_number}_group_ config"
         self._attr_name = f"Line {self._line_number} group"
         self._attr_entity_category = EntityCategory.CONFIG  # DIAGNOSTIC
         self._state = self._device.get_line_group(line_number=line_number)
@@ -88,6 +94,7 @@ class LineGroupConfig(SelectEntity):
         else:
             self._state = 3
         await self._device.set_line_group(self._line_number, self._state)
+        self.async_write_ha_state()
 
     @property
     def options(self) -> list[str]:
@@ -95,14 +102,9 @@ class LineGroupConfig(SelectEntity):
         options = ["First", "Second", "Both"]
         return options
 
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
-
-    async def async_update(self) -> None:
-        """Fetch new state data for the select."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._state = self._device.get_line_group(line_number=self._line_number)
         if self._state == 1:
             self._attr_current_option = "First"
@@ -111,13 +113,15 @@ class LineGroupConfig(SelectEntity):
         else:
             self._attr_current_option = "Both"
         self._attr_available = self._device.get_dual_group_mode()
+        super()._handle_coordinator_update()
 
 
-class RelaySwitchWhenCloseValve(SelectEntity):
-    def __init__(self, device: NeptunSmart):
-        self._device = device
+class RelaySwitchWhenCloseValve(NeptunSmartEntity, SelectEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((RELAY_CONFIG.address, RELAY_CONFIG.mask("switch_when_close_valve")),)
         self._state = self._device.get_relay_config_valve() #0 - not switch, 1 - first group, 2 - second group, 3 - both group
-        self._attr_unique_id = f"{device.get_name()}_RelaySwitchWhenCloseValve_config"
+        self._attr_unique_id = f"{self._device.get_name()}_RelaySwitchWhenCloseValve_config"
         self._attr_name = f"Switch relay when close valve"
         self._attr_entity_category = EntityCategory.CONFIG  # DIAGNOSTIC
         if self._state == 0:
@@ -139,6 +143,7 @@ class RelaySwitchWhenCloseValve(SelectEntity):
         else:
             self._state = 3
         await self._device.set_relay_config_valve(self._state)
+        self.async_write_ha_state()
 
     @property
     def options(self) -> list[str]:
@@ -146,14 +151,9 @@ class RelaySwitchWhenCloseValve(SelectEntity):
         options = ["Not Switch", "First group", "Second group", "Both group"]
         return options
 
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
-
-    async def async_update(self) -> None:
-        """Fetch new state data for the select."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._state = self._device.get_relay_config_valve()
         if self._state == 0:
             self._attr_current_option = "Not Switch"
@@ -163,13 +163,15 @@ class RelaySwitchWhenCloseValve(SelectEntity):
             self._attr_current_option = "Second group"
         else:
             self._attr_current_option = "Both group"
+        super()._handle_coordinator_update()
 
 
-class RelaySwitchWhenAlert(SelectEntity):
-    def __init__(self, device: NeptunSmart):
-        self._device = device
+class RelaySwitchWhenAlert(NeptunSmartEntity, SelectEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((RELAY_CONFIG.address, RELAY_CONFIG.mask("switch_when_alert")),)
         self._state = self._device.get_relay_config_alert() #0 - not switch, 1 - first group, 2 - second group, 3 - both group
-        self._attr_unique_id = f"{device.get_name()}_RelaySwitchAlert_config"
+        self._attr_unique_id = f"{self._device.get_name()}_RelaySwitchAlert_config"
         self._attr_name = f"Switch relay when alert"
         self._attr_entity_category = EntityCategory.CONFIG  # DIAGNOSTIC
         if self._state == 0:
@@ -191,6 +193,7 @@ class RelaySwitchWhenAlert(SelectEntity):
         else:
             self._state = 3
         await self._device.set_relay_config_alert(self._state)
+        self.async_write_ha_state()
 
     @property
     def options(self) -> list[str]:
@@ -198,14 +201,9 @@ class RelaySwitchWhenAlert(SelectEntity):
         options = ["Not Switch", "First group", "Second group", "Both group"]
         return options
 
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
-
-    async def async_update(self) -> None:
-        """Fetch new state data for the select."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._state = self._device.get_relay_config_alert()
         if self._state == 0:
             self._attr_current_option = "Not Switch"
@@ -215,14 +213,16 @@ class RelaySwitchWhenAlert(SelectEntity):
             self._attr_current_option = "Second group"
         else:
             self._attr_current_option = "Both group"
+        super()._handle_coordinator_update()
 
 
-class WirelessSensorGroupConfig(SelectEntity):
-    def __init__(self, device: NeptunSmart, sensor: WirelessSensor, sensor_number):
-        self._device = device
+class WirelessSensorGroupConfig(NeptunSmartEntity, SelectEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator, sensor: WirelessSensor, sensor_number):
+        super().__init__(coordinator)
+        self._watched_registers = ((sensor.get_address(), FULL_MASK),)
         self._sensor = sensor
         self._sensor_number = sensor_number
-        self._attr_unique_id = f"{device.get_name()}_WirelessSensor{self._sensor.get_address()}_group_ config"
+        self._attr_unique_id = f"{self._device.get_name()}_WirelessSensor{self._sensor.get_address()}_group_ config"
         self._attr_name = f"Wireless Sensor {self._sensor_number} group"
         self._attr_entity_category = EntityCategory.CONFIG  # DIAGNOSTIC
         self._state = self._sensor.get_group_config()
@@ -241,6 +241,7 @@ class WirelessSensorGroupConfig(SelectEntity):
         else:
             self._state = 3
         await self._sensor.set_group_config(self._state)
+        self.async_write_ha_state()
 
     @property
     def options(self) -> list[str]:
@@ -248,14 +249,9 @@ class WirelessSensorGroupConfig(SelectEntity):
         options = ["First", "Second", "Both"]
         return options
 
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
-
-    async def async_update(self) -> None:
-        """Fetch new state data for the select."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._state = self._sensor.get_group_config()
         if self._state == 1:
             self._attr_current_option = "First"
@@ -263,3 +259,4 @@ class WirelessSensorGroupConfig(SelectEntity):
             self._attr_current_option = "Second"
         else:
             self._attr_current_option = "Both"
+        super()._handle_coordinator_update()
@@ -1,121 +1,223 @@
 from __future__ import annotations
 
 from collections import namedtuple
-from datetime import timedelta
 
+from homeassistant.core import callback
 from homeassistant.helpers.entity import EntityCategory
 from homeassistant.components.sensor import (
     SensorDeviceClass,
     SensorEntity,
     SensorStateClass,
 )
-from homeassistant.const import (UnitOfVolume,PERCENTAGE)
+from homeassistant.const import (UnitOfVolume, UnitOfTime, PERCENTAGE)
 from .const import DOMAIN
-from .device import NeptunSmart, WirelessSensor, Counter
+from .coordinator import NeptunSmartCoordinator
+from .device import WirelessSensor, Counter
+from .entity import NeptunSmartEntity
+from .registers import COUNT_OF_CONNECTED_WIRELESS_SENSORS, FULL_MASK, WIRELESS_SENSOR_STATUS_FIELDS, fields_mask
 
 async def async_setup_entry(HomeAssistant, config_entry, async_add_entities):
-    device: NeptunSmart = HomeAssistant.data[DOMAIN][config_entry.entry_id]
+    coordinator: NeptunSmartCoordinator = HomeAssistant.data[DOMAIN][config_entry.entry_id]
+    device = coordinator.device
     sensors = []
-    sensors.append(WirelessSensorsConnected(device=device))
-    for i in range(0, device.get_number_of_connected_wireless_sensors()):
-        sensors.append(WirelessSensorsBatteryLevel(device, i+1, device.wireless_sensors[i]))
-        sensors.append(WirelessSensorsSignalLevel(device, i+1, device.wireless_sensors[i]))
+    sensors.append(WirelessSensorsConnected(coordinator=coordinator))
+    sensors.append(PollDuration(coordinator=coordinator))
+    sensors.append(PollInterval(coordinator=coordinator))
+    sensors.append(RequestTimeout(coordinator=coordinator))
+    for i in range(0, len(device.wireless_sensors)):
+        sensors.append(WirelessSensorsBatteryLevel(coordinator, i+1, device.wireless_sensors[i]))
+        sensors.append(WirelessSensorsSignalLevel(coordinator, i+1, device.wireless_sensors[i]))
     for counter in device.counters:
-        sensors.append(CounterSensor(device, counter))
+        sensors.append(CounterSensor(coordinator, counter))
     async_add_entities(sensors, update_before_add=False)
 
+    def add_new_counters(counters):
+        # Счетчики, включенные на модуле после настройки интеграции
+        async_add_entities([CounterSensor(coordinator, counter) for counter in counters])
 
-class WirelessSensorsConnected(SensorEntity):
-    def __init__(self, device: NeptunSmart):
-        self._device = device
-        self._attr_unique_id = f"{device.get_name()}_Wireless_sensors_connected"
+    config_entry.async_on_unload(device.add_counter_listener(add_new_counters))
+
+
+class WirelessSensorsConnected(NeptunSmartEntity, SensorEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((COUNT_OF_CONNECTED_WIRELESS_SENSORS.address, FULL_MASK),)
+        self._attr_unique_id = f"{self._device.get_name()}_Wireless_sensors_connected"
         self._attr_name = "Connected wireless sensors"
         self._attr_entity_category = EntityCategory.DIAGNOSTIC
         self._attr_native_value = self._device.get_number_of_connected_wireless_sensors()
 
-    async def async_update(self) -> None:
+    @callback
+    def _handle_coordinator_update(self) -> None:
         self._attr_native_value = self._device.get_number_of_connected_wireless_sensors()
+        super()._handle_coordinator_update()
 
     @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
+    def icon(self):
+        return "mdi:sun-wireless-outline"
+
+
+class PollDuration(NeptunSmartEntity, SensorEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self._device.get_name()}_Poll_duration"
+        self._attr_name = "Poll cycle time"
+        self._attr_entity_category = EntityCategory.DIAGNOSTIC
+        self._attr_entity_registry_enabled_default = False
+        self._attr_device_class = SensorDeviceClass.DURATION
+        self._attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+        self._attr_native_value = None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        duration = self._device.get_poll_duration()
+        plan = self._device.get_last_read_plan()
+        self._attr_native_value = None if duration is None else round(duration * 1000)
+        self._attr_extra_state_attributes = {
+            "wireless_sensors": len(self._device.wireless_sensors),
+            "requests": plan.request_count,
+            "registers": plan.register_count,
+            "blocks": [repr(block) for block in plan],
+            "full_poll_requests": self._device.get_read_plan().request_count,
+            "queue_wait": self._device.get_queue_wait_stats(),
+            "connection": self._device.get_connection_state(),
+            "skipped_cycles": self._device.get_skipped_cycles(),
+            "fleet": self.coordinator.get_fleet_stats(),
+            "shadow": self._device.get_shadow_stats(),
+            "deduplicated": self._device.get_dedup_stats(),
+            "command_latency": self._device.get_command_latency_stats(),
+            "proxy": self.coordinator.get_proxy_stats(),
         }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
-        return "mdi:sun-wireless-outline"
+        return "mdi:timer-outline"
+
+
+class RequestTimeout(NeptunSmartEntity, SensorEntity):
+    """Адаптивный таймаут ответа модуля, в атрибутах - сглаженное RTT и его разброс"""
+
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self._device.get_name()}_Request_timeout"
+        self._attr_name = "Request timeout"
+        self._attr_entity_category = EntityCategory.DIAGNOSTIC
+        self._attr_entity_registry_enabled_default = False
+        self._attr_device_class = SensorDeviceClass.DURATION
+        self._attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+        self._attr_native_value = None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        stats = self._device.get_rtt_stats()
+        self._attr_native_value = stats["timeout_ms"]
+        self._attr_extra_state_attributes = stats
+        super()._handle_coordinator_update()
+
+    @property
+    def icon(self):
+        return "mdi:timer-alert-outline"
+
+
+class PollInterval(NeptunSmartEntity, SensorEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self._device.get_name()}_Poll_interval"
+        self._attr_name = "Poll interval"
+        self._attr_entity_category = EntityCategory.DIAGNOSTIC
+        self._attr_device_class = SensorDeviceClass.DURATION
+        self._attr_native_unit_of_measurement = UnitOfTime.SECONDS
+        self._shown = (self._device.get_poll_interval(), self._device.get_poll_interval_reason())
+        self._attr_native_value = self._shown[0]
+        self._attr_extra_state_attributes = {"reason": self._shown[1]}
+
+    def _state_changed(self) -> bool:
+        return self._shown != (self._device.get_poll_interval(), self._device.get_poll_interval_reason())
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        shown = (self._device.get_poll_interval(), self._device.get_poll_interval_reason())
+        self._attr_native_value = shown[0]
+        self._attr_extra_state_attributes = {"reason": shown[1]}
+        super()._handle_coordinator_update()
+        self._shown = shown
+
+    @property
+    def icon(self):
+        return "mdi:timer-sync-outline"
 
 
-class WirelessSensorsBatteryLevel(SensorEntity):
-    def __init__(self, device: NeptunSmart, sensor_number, sensor: WirelessSensor):
-        self._device = device
+class WirelessSensorsBatteryLevel(NeptunSmartEntity, SensorEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator, sensor_number, sensor: WirelessSensor):
+        super().__init__(coordinator)
+        self._watched_registers = ((sensor.get_status_address(), fields_mask(WIRELESS_SENSOR_STATUS_FIELDS, "battery_level")),)
         self._sensor_number = sensor_number
         self._sensor = sensor
-        self._attr_unique_id = f"{device.get_name()}_WirelessSensors{sensor_number}BatteryLevel"
+        self._attr_unique_id = f"{self._device.get_name()}_WirelessSensors{sensor_number}BatteryLevel"
         self._attr_name = f"Wireless sensor {sensor_number} battery level"
         self._attr_device_class = SensorDeviceClass.BATTERY
         self._attr_native_unit_of_measurement = PERCENTAGE
         self._attr_entity_category = EntityCategory.DIAGNOSTIC
         self._attr_native_value = self._sensor.get_battery_level()
 
-    async def async_update(self) -> None:
+    @callback
+    def _handle_coordinator_update(self) -> None:
         self._attr_native_value = self._sensor.get_battery_level()
-
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
         return "mdi:battery-high"
 
 
-class WirelessSensorsSignalLevel(SensorEntity):
-    def __init__(self,device: NeptunSmart, sensor_number, sensor: WirelessSensor):
-        self._device = device
+class WirelessSensorsSignalLevel(NeptunSmartEntity, SensorEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator, sensor_number, sensor: WirelessSensor):
+        super().__init__(coordinator)
+        self._watched_registers = ((sensor.get_status_address(), fields_mask(WIRELESS_SENSOR_STATUS_FIELDS, "signal_level")),)
         self._sensor_number = sensor_number
         self._sensor = sensor
-        self._attr_unique_id = f"{device.get_name()}_WirelessSensors{sensor_number}SignalLevel"
+        self._attr_unique_id = f"{self._device.get_name()}_WirelessSensors{sensor_number}SignalLevel"
         self._attr_name = f"Wireless sensor {sensor_number} signal level"
         self._attr_entity_category = EntityCategory.DIAGNOSTIC
         self._attr_native_value = self._sensor.get_signal_level()
 
-    async def async_update(self) -> None:
+    @callback
+    def _handle_coordinator_update(self) -> None:
         self._attr_native_value = self._sensor.get_signal_level()
-
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
         return "mdi:signal"
 
 
-class CounterSensor(SensorEntity):
-    def __init__(self, device: NeptunSmart, counter: Counter):
-        self._device = device
+class CounterSensor(NeptunSmartEntity, SensorEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator, counter: Counter):
+        super().__init__(coordinator)
+        self._watched_registers = (
+            (counter.get_address(), FULL_MASK),
+            (counter.get_address() + 1, FULL_MASK),
+            (counter.get_config_address(), FULL_MASK),
+        )
         self._counter = counter
-        self._attr_unique_id = f"{device.get_name()}_Counter{counter.get_address()}"
+        self._attr_unique_id = f"{self._device.get_name()}_Counter{counter.get_address()}"
         self._attr_name = f"Counter {counter.get_address()}"
         self._attr_native_value = self._counter.get_value()/1000
         self._attr_native_unit_of_measurement = UnitOfVolume.CUBIC_METERS
         self._attr_device_class = SensorDeviceClass.WATER
         self._attr_state_class = SensorStateClass.TOTAL_INCREASING
 
-    async def async_update(self) -> None:
+    @callback
+    def _handle_coordinator_update(self) -> None:
         self._attr_native_value = self._counter.get_value()/1000
+        super()._handle_coordinator_update()
 
     @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+    def available(self) -> bool:
+        return super().available and self._counter.is_enabled()
 
     @property
     def icon(self):
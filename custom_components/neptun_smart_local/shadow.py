@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import time
+
+from .registers import POLL_ALARM, POLL_CONFIG, POLL_COUNTER, POLL_DIAGNOSTIC
+
+# Сколько значение регистра в теневом образе считается свежим, секунды.
+# Биты аварий и кранов меняет сам модуль, поэтому класс аварий устаревает быстрее всех.
+DEFAULT_REGISTER_TTLS = {
+    POLL_ALARM: 1,
+    POLL_COUNTER: 30,
+    POLL_DIAGNOSTIC: 300,
+    POLL_CONFIG: 60,
+}
+# TTL регистров вне карты модуля (например, прочитанных через прокси), секунды
+DEFAULT_REGISTER_TTL = 1
+
+
+def apply_mask(value, and_mask, or_mask) -> int:
+    """Результат Mask Write Register: (value AND and_mask) OR (or_mask AND NOT and_mask)"""
+    return (value & and_mask) | (or_mask & ~and_mask & 0xFFFF)
+
+
+class ShadowRegisterImage:
+    """Теневой образ регистров модуля: значение и время получения каждого регистра.
+
+    Образ пополняется каждым ответом модуля на чтение и каждым подтверждением записи.
+    Значение отдается читателю, пока не истек TTL регистра, иначе регистр считается
+    устаревшим и должен быть перечитан.
+    """
+
+    def __init__(self, default_ttl=DEFAULT_REGISTER_TTL) -> None:
+        self._default_ttl = default_ttl
+        self._ttls = {}
+        # адрес -> (значение, время получения)
+        self._entries = {}
+        self._hits = 0
+        self._misses = 0
+
+    def set_ttls(self, ttls) -> None:
+        """TTL регистров {адрес: секунды}, заменяет прежние"""
+        self._ttls = dict(ttls)
+
+    def update(self, address, values, now=None) -> None:
+        """Записывает значения подряд идущих регистров, начиная с address"""
+        if now is None:
+            now = time.monotonic()
+        for offset, value in enumerate(values):
+            self._entries[address + offset] = (value, now)
+
+    def apply_mask(self, address, and_mask, or_mask) -> int | None:
+        """Отражает маскированную запись (FC22) в известном значении регистра.
+
+        Время получения не меняется: остальные биты не свежее, чем были. None, если значения нет.
+        """
+        entry = self._entries.get(address)
+        if entry is None:
+            return None
+        value = apply_mask(entry[0], and_mask, or_mask)
+        self._entries[address] = (value, entry[1])
+        return value
+
+    def expired(self, addresses, now=None) -> list[int]:
+        """Адреса, которых нет в образе или чей TTL истек; учитывает попадания и промахи"""
+        if now is None:
+            now = time.monotonic()
+        expired = []
+        for address in addresses:
+            entry = self._entries.get(address)
+            if entry is None or now - entry[1] > self._ttls.get(address, self._default_ttl):
+                expired.append(address)
+        self._misses += len(expired)
+        self._hits += len(addresses) - len(expired)
+        return expired
+
+    def get(self, address):
+        """Последнее известное значение регистра без учета TTL (None, если не читался)"""
+        entry = self._entries.get(address)
+        return None if entry is None else entry[0]
+
+    def get_stats(self) -> dict:
+        """Число регистров в образе, попаданий и промахов по TTL"""
+        return {"registers": len(self._entries), "hits": self._hits, "misses": self._misses}
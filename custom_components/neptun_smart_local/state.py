@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from .registers import (
+    HEADER_REGISTERS,
+    INPUT_LINE_1_2_CONFIG,
+    INPUT_LINE_3_4_CONFIG,
+    MODULE_CONFIG,
+    RELAY_CONFIG,
+    SIGNAL_LEVEL_BY_RAW,
+    STATUS_WIRED_LINE,
+    WIRELESS_SENSOR_STATUS_FIELDS,
+    NeptunSmartRegisters,
+)
+
+ALERT_FIELD, DISCHARGE_FIELD, LOST_FIELD, SIGNAL_LEVEL_FIELD, BATTERY_LEVEL_FIELD = WIRELESS_SENSOR_STATUS_FIELDS
+
+
+@dataclass(frozen=True, slots=True)
+class WirelessSensorState:
+    """Снимок беспроводного датчика: сырые регистры и разобранные поля статуса"""
+
+    config: int
+    status: int
+    battery_level: int
+    signal_level: int
+    alert: bool
+    discharge: bool
+    lost: bool
+
+    @classmethod
+    def decode(cls, config, status) -> WirelessSensorState:
+        return cls(
+            config,
+            status,
+            BATTERY_LEVEL_FIELD.decode(status),
+            SIGNAL_LEVEL_BY_RAW[SIGNAL_LEVEL_FIELD.decode(status)],
+            bool(status & ALERT_FIELD.mask),
+            bool(status & DISCHARGE_FIELD.mask),
+            bool(status & LOST_FIELD.mask),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class CounterState:
+    """Снимок счетчика: значение uint32 и признак включения на модуле"""
+
+    value: int
+    enabled: bool
+
+
+@dataclass(frozen=True, slots=True)
+class ModuleState:
+    """Неизменяемый снимок модуля, собранный за один проход по образу регистров.
+
+    Устройство заменяет снимок одним присваиванием, поэтому читатели всегда видят
+    согласованное состояние. Неизменившиеся датчики и счетчики переносятся из предыдущего
+    снимка тем же объектом, так что изменение проверяется сравнением `is`.
+    """
+
+    # Сырые значения регистров заголовка (None, пока заголовок не прочитан)
+    config: int | None = None
+    config_line_1_2: int | None = None
+    config_line_3_4: int | None = None
+    status_wired_line: int | None = None
+    relay_config: int | None = None
+
+    first_group_valve_is_open: bool = False
+    second_group_valve_is_open: bool = False
+    floor_washing_mode: bool = False
+    first_group_alarm: bool = False
+    second_group_alarm: bool = False
+    discharge_wireless_sensors: bool = False
+    lost_wireless_sensors: bool = False
+    connecting_wireless_sensors_mode: bool = False
+    dual_group_mode: bool = False
+    close_valve_when_loss_sensor: bool = False
+    lock_buttons: bool = False
+    # Проводные линии индексируются номером линии 1-4, элемент 0 не используется
+    line_type: tuple[bool, ...] = (True, True, True, True, True)
+    line_group: tuple[int, ...] = (0, 0, 0, 0, 0)  # 1 = first group, 2 = second group, 3 = both groups
+    line_status: tuple[bool, ...] = (True, True, True, True, True)
+    switch_when_close_valve: int = 0
+    switch_when_alert: int = 0
+    wireless_sensors_connected: int = 0
+
+    wireless_sensors: tuple[WirelessSensorState | None, ...] = ()
+    counters: tuple[CounterState | None, ...] = ()
+
+    @property
+    def has_header(self) -> bool:
+        return self.config is not None
+
+    @classmethod
+    def from_image(cls, image, wireless_sensors, previous: ModuleState | None = None) -> ModuleState:
+        """Собирает снимок из образа регистров {адрес: значение} для заданного числа датчиков"""
+        header = {}
+        if all(image.get(register.address) is not None for register in HEADER_REGISTERS):
+            header = cls._decode_header(image)
+        return cls(
+            **header,
+            wireless_sensors=cls._decode_wireless_sensors(image, wireless_sensors, previous),
+            counters=cls._decode_counters(image, previous),
+        )
+
+    @staticmethod
+    def _decode_header(image) -> dict:
+        config = image[NeptunSmartRegisters.module_config]
+        line_1_2 = image[NeptunSmartRegisters.input_line_1_2_config]
+        line_3_4 = image[NeptunSmartRegisters.input_line_3_4_config]
+        status = image[NeptunSmartRegisters.status_wired_line]
+        relay_config = image[NeptunSmartRegisters.relay_config]
+        return dict(
+            config=config,
+            config_line_1_2=line_1_2,
+            config_line_3_4=line_3_4,
+            status_wired_line=status,
+            relay_config=relay_config,
+            first_group_valve_is_open=MODULE_CONFIG.flag(config, "first_group_valve"),
+            second_group_valve_is_open=MODULE_CONFIG.flag(config, "second_group_valve"),
+            floor_washing_mode=MODULE_CONFIG.flag(config, "floor_washing_mode"),
+            first_group_alarm=MODULE_CONFIG.flag(config, "first_group_alarm"),
+            second_group_alarm=MODULE_CONFIG.flag(config, "second_group_alarm"),
+            discharge_wireless_sensors=MODULE_CONFIG.flag(config, "discharge_wireless_sensors"),
+            lost_wireless_sensors=MODULE_CONFIG.flag(config, "lost_wireless_sensors"),
+            connecting_wireless_sensors_mode=MODULE_CONFIG.flag(config, "connecting_wireless_sensors_mode"),
+            dual_group_mode=MODULE_CONFIG.flag(config, "dual_group_mode"),
+            close_valve_when_loss_sensor=MODULE_CONFIG.flag(config, "close_valve_when_loss_sensor"),
+            lock_buttons=MODULE_CONFIG.flag(config, "lock_buttons"),
+            line_type=(
+                True,
+                INPUT_LINE_1_2_CONFIG.flag(line_1_2, "line_1_type"),
+                INPUT_LINE_1_2_CONFIG.flag(line_1_2, "line_2_type"),
+                INPUT_LINE_3_4_CONFIG.flag(line_3_4, "line_3_type"),
+                INPUT_LINE_3_4_CONFIG.flag(line_3_4, "line_4_type"),
+            ),
+            line_group=(
+                0,
+                INPUT_LINE_1_2_CONFIG.get(line_1_2, "line_1_group"),
+                INPUT_LINE_1_2_CONFIG.get(line_1_2, "line_2_group"),
+                INPUT_LINE_3_4_CONFIG.get(line_3_4, "line_3_group"),
+                INPUT_LINE_3_4_CONFIG.get(line_3_4, "line_4_group"),
+            ),
+            line_status=(
+                True,
+                STATUS_WIRED_LINE.flag(status, "line_1_alarm"),
+                STATUS_WIRED_LINE.flag(status, "line_2_alarm"),
+                STATUS_WIRED_LINE.flag(status, "line_3_alarm"),
+                STATUS_WIRED_LINE.flag(status, "line_4_alarm"),
+            ),
+            switch_when_close_valve=RELAY_CONFIG.get(relay_config, "switch_when_close_valve"),
+            switch_when_alert=RELAY_CONFIG.get(relay_config, "switch_when_alert"),
+            wireless_sensors_connected=image[NeptunSmartRegisters.count_of_connected_wireless_sensors],
+        )
+
+    @staticmethod
+    def _decode_wireless_sensors(image, count, previous) -> tuple[WirelessSensorState | None, ...]:
+        old = previous.wireless_sensors if previous is not None else ()
+        sensors = []
+        for i in range(0, count):
+            config = image.get(NeptunSmartRegisters.first_wireless_sensor_config + i)
+            status = image.get(NeptunSmartRegisters.first_wireless_sensor_status + i)
+            if config is None or status is None:
+                sensors.append(None)
+                continue
+            sensor = old[i] if i < len(old) else None
+            if sensor is None or sensor.config != config or sensor.status != status:
+                sensor = WirelessSensorState.decode(config, status)
+            sensors.append(sensor)
+        return tuple(sensors)
+
+    @staticmethod
+    def _decode_counters(image, previous) -> tuple[CounterState | None, ...]:
+        old = previous.counters if previous is not None else ()
+        counters = []
+        for i in range(0, NeptunSmartRegisters.counters_count):
+            address = NeptunSmartRegisters.first_counter + (i * 2)
+            high = image.get(address)
+            low = image.get(address + 1)
+            config = image.get(NeptunSmartRegisters.first_counter_config + i)
+            if high is None or low is None or config is None:
+                counters.append(None)
+                continue
+            value = (high << 16) | low
+            enabled = bool(config & 1)
+            counter = old[i] if i < len(old) else None
+            if counter is None or counter.value != value or counter.enabled != enabled:
+                counter = CounterState(value, enabled)
+            counters.append(counter)
+        return tuple(counters)
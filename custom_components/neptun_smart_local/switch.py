@@ -1,46 +1,45 @@
 from __future__ import annotations
 
-from datetime import timedelta
+import logging
 
 from homeassistant.components.switch import SwitchEntity
+from homeassistant.core import callback
 from homeassistant.helpers.entity import EntityCategory
 
-from . import NeptunSmart
+from .coordinator import NeptunSmartCoordinator
+from .entity import NeptunSmartEntity
+from .registers import MODULE_CONFIG
 from .const import DOMAIN
-SCAN_INTERVAL = timedelta(seconds=5)
+
+_LOGGER = logging.getLogger(__name__)
+
 async def async_setup_entry(HomeAssistant, config_entry, async_add_entities):
     """Set up the switch platform."""
-    import logging
-    _LOGGER = logging.getLogger(__name__)
-    
-    device: NeptunSmart = HomeAssistant.data[DOMAIN][config_entry.entry_id]
+    coordinator: NeptunSmartCoordinator = HomeAssistant.data[DOMAIN][config_entry.entry_id]
+    device = coordinator.device
     switches = []
-    switches.append(Valve_1_zone(device))
+    switches.append(Valve_1_zone(coordinator))
     
     dual_mode = device.get_dual_group_mode()
-    _LOGGER.error(f"🔧 НАСТРОЙКА ПЕРЕКЛЮЧАТЕЛЕЙ: dual_group_mode={dual_mode}")
-    
     if dual_mode:
-        switches.append(Valve_2_zone(device))
-        _LOGGER.error("✅ ДОБАВЛЕН ВТОРОЙ ВЕНТИЛЬ (Valve_2_zone)")
-    else:
-        _LOGGER.error("❌ ВТОРОЙ ВЕНТИЛЬ НЕ ДОБАВЛЕН - dual_group_mode ОТКЛЮЧЕН")
-        
-    switches.append(Floor_washing_mode(device=device))
-    switches.append(Connecting_wireless_sensors_mode(device))
-    switches.append(Dual_group_mode(device))
-    switches.append((Close_valve_when_lost_sensors_mode(device)))
-    switches.append(Lock_buttons(device))
+        switches.append(Valve_2_zone(coordinator))
+
+    switches.append(Floor_washing_mode(coordinator=coordinator))
+    switches.append(Connecting_wireless_sensors_mode(coordinator))
+    switches.append(Dual_group_mode(coordinator))
+    switches.append((Close_valve_when_lost_sensors_mode(coordinator)))
+    switches.append(Lock_buttons(coordinator))
     
-    _LOGGER.error(f"📊 СОЗДАНО {len(switches)} ПЕРЕКЛЮЧАТЕЛЕЙ")
+    _LOGGER.debug("Создано переключателей: %s, dual_group_mode=%s", len(switches), dual_mode)
     async_add_entities(switches, update_before_add=False)
 
 
-class Valve_1_zone(SwitchEntity):
-    def __init__(self, device: NeptunSmart):
-        self._device = device
+class Valve_1_zone(NeptunSmartEntity, SwitchEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((MODULE_CONFIG.address, MODULE_CONFIG.mask("first_group_valve")),)
         self._attr_name = "Valve First Zone"
-        self._attr_unique_id = f"{device.get_name()}_Valve_1_zone"
+        self._attr_unique_id = f"{self._device.get_name()}_Valve_1_zone"
         self._attr_is_on = self._device.get_first_group_valve_state()
 
     async def async_turn_off(self, **kwargs):
@@ -49,6 +48,7 @@ class Valve_1_zone(SwitchEntity):
         await self._device.set_first_group_valve_state(False)
         if not self._device.get_dual_group_mode():
             await self._device.set_second_group_valve_state(False)
+        self.async_write_ha_state()
 
     async def async_turn_on(self, **kwargs):
         """Turn the entity on."""
@@ -56,51 +56,44 @@ class Valve_1_zone(SwitchEntity):
         await self._device.set_first_group_valve_state(True)
         if not self._device.get_dual_group_mode():
             await self._device.set_second_group_valve_state(True)
+        self.async_write_ha_state()
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._attr_is_on = self._device.get_first_group_valve_state()
-        self._attr_available = self._device.is_connected()
-
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
         return "mdi:pipe-valve"
 
 
-class Valve_2_zone(SwitchEntity):
-    def __init__(self, device: NeptunSmart):
-        self._device = device
+class Valve_2_zone(NeptunSmartEntity, SwitchEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((MODULE_CONFIG.address, MODULE_CONFIG.mask("second_group_valve")),)
         self._attr_name = "Valve Second Zone"
-        self._attr_unique_id = f"{device.get_name()}_Valve_2_zone"
+        self._attr_unique_id = f"{self._device.get_name()}_Valve_2_zone"
         self._attr_is_on = self._device.get_second_group_valve_state()
 
     async def async_turn_off(self, **kwargs):
         """Turn the entity off."""
         self._attr_is_on = False
         await self._device.set_second_group_valve_state(False)
+        self.async_write_ha_state()
 
     async def async_turn_on(self, **kwargs):
         """Turn the entity on."""
         self._attr_is_on = True
         await self._device.set_second_group_valve_state(True)
+        self.async_write_ha_state()
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._attr_is_on = self._device.get_second_group_valve_state()
-        # Вентиль доступен только при подключении к устройству
-        self._attr_available = self._device.is_connected()
-
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
@@ -108,33 +101,31 @@ class Valve_2_zone(SwitchEntity):
 
 
 
-class Floor_washing_mode(SwitchEntity):
-    def __init__(self, device: NeptunSmart):
-        self._device = device
+class Floor_washing_mode(NeptunSmartEntity, SwitchEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((MODULE_CONFIG.address, MODULE_CONFIG.mask("floor_washing_mode")),)
         self._attr_name = "Floor Washing Mode"
-        self._attr_unique_id = f"{device.get_name()}_Floor_washing_mode"
+        self._attr_unique_id = f"{self._device.get_name()}_Floor_washing_mode"
         self._attr_is_on = self._device.get_floor_washing_mode()
 
     async def async_turn_off(self, **kwargs):
         """Turn the entity off."""
         self._attr_is_on = False
         await self._device.set_floor_washing_mode(False)
+        self.async_write_ha_state()
 
     async def async_turn_on(self, **kwargs):
         """Turn the entity on."""
         self._attr_is_on = True
         await self._device.set_floor_washing_mode(True)
+        self.async_write_ha_state()
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._attr_is_on = self._device.get_floor_washing_mode()
-        self._attr_available = self._device.is_connected()
-
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
@@ -144,11 +135,12 @@ class Floor_washing_mode(SwitchEntity):
             return "mdi:pail-off"
 
 
-class Connecting_wireless_sensors_mode(SwitchEntity):
-    def __init__(self,device:NeptunSmart):
-        self._device = device
+class Connecting_wireless_sensors_mode(NeptunSmartEntity, SwitchEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((MODULE_CONFIG.address, MODULE_CONFIG.mask("connecting_wireless_sensors_mode")),)
         self._attr_name = "Connecting wireless sensors mode"
-        self._attr_unique_id = f"{device.get_name()}_Connecting_wireless_sensors_mode"
+        self._attr_unique_id = f"{self._device.get_name()}_Connecting_wireless_sensors_mode"
         self._attr_is_on = self._device.get_connecting_wireless_sensors_mode()
         self._attr_entity_category = EntityCategory.CONFIG  # DIAGNOSTIC
 
@@ -156,22 +148,19 @@ class Connecting_wireless_sensors_mode(SwitchEntity):
         """Turn the entity off."""
         self._attr_is_on = False
         await self._device.set_connecting_wireless_sensors_mode(False)
+        self.async_write_ha_state()
 
     async def async_turn_on(self, **kwargs):
         """Turn the entity on."""
         self._attr_is_on = True
         await self._device.set_connecting_wireless_sensors_mode(True)
+        self.async_write_ha_state()
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._attr_is_on = self._device.get_connecting_wireless_sensors_mode()
-        self._attr_available = self._device.is_connected()
-
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
@@ -181,11 +170,12 @@ class Connecting_wireless_sensors_mode(SwitchEntity):
             return "mdi:router-wireless-off"
 
 
-class Dual_group_mode(SwitchEntity):
-    def __init__(self, device: NeptunSmart):
-        self._device = device
+class Dual_group_mode(NeptunSmartEntity, SwitchEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((MODULE_CONFIG.address, MODULE_CONFIG.mask("dual_group_mode")),)
         self._attr_name = "Dual group mode"
-        self._attr_unique_id = f"{device.get_name()}_dual_group_mode"
+        self._attr_unique_id = f"{self._device.get_name()}_dual_group_mode"
         self._attr_is_on = self._device.get_dual_group_mode()
         self._attr_entity_category = EntityCategory.CONFIG  # DIAGNOSTIC
 
@@ -193,22 +183,19 @@ class Dual_group_mode(SwitchEntity):
         """Turn the entity off."""
         self._attr_is_on = False
         await self._device.set_dual_group_mode(False)
+        self.async_write_ha_state()
 
     async def async_turn_on(self, **kwargs):
         """Turn the entity on."""
         self._attr_is_on = True
         await self._device.set_dual_group_mode(True)
+        self.async_write_ha_state()
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._attr_is_on = self._device.get_dual_group_mode()
-        self._attr_available = self._device.is_connected()
-
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
@@ -218,11 +205,12 @@ class Dual_group_mode(SwitchEntity):
             return "mdi:numeric-1-circle-outline"
 
 
-class Close_valve_when_lost_sensors_mode(SwitchEntity):
-    def __init__(self, device: NeptunSmart):
-        self._device = device
+class Close_valve_when_lost_sensors_mode(NeptunSmartEntity, SwitchEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((MODULE_CONFIG.address, MODULE_CONFIG.mask("close_valve_when_loss_sensor")),)
         self._attr_name = "Close valve when lost sensors"
-        self._attr_unique_id = f"{device.get_name()}_Close_valve_when_lost_sensors_mode"
+        self._attr_unique_id = f"{self._device.get_name()}_Close_valve_when_lost_sensors_mode"
         self._attr_is_on = self._device.get_close_valve_when_lost_sensors_mode()
         self._attr_entity_category = EntityCategory.CONFIG  # DIAGNOSTIC
 
@@ -230,33 +218,31 @@ class Close_valve_when_lost_sensors_mode(SwitchEntity):
         """Turn the entity off."""
         self._attr_is_on = False
         await self._device.set_close_valve_when_lost_sensors_mode(False)
+        self.async_write_ha_state()
 
     async def async_turn_on(self, **kwargs):
         """Turn the entity on."""
         self._attr_is_on = True
         await self._device.set_close_valve_when_lost_sensors_mode(True)
+        self.async_write_ha_state()
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._attr_is_on = self._device.get_close_valve_when_lost_sensors_mode()
-        self._attr_available = self._device.is_connected()
-
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
        return "mdi:pipe-valve"
 
 
-class Lock_buttons(SwitchEntity):
-    def __init__(self, device: NeptunSmart):
-        self._device = device
+class Lock_buttons(NeptunSmartEntity, SwitchEntity):
+    def __init__(self, coordinator: NeptunSmartCoordinator):
+        super().__init__(coordinator)
+        self._watched_registers = ((MODULE_CONFIG.address, MODULE_CONFIG.mask("lock_buttons")),)
         self._attr_name = "Lock Buttons"
-        self._attr_unique_id = f"{device.get_name()}_Lock_buttons"
+        self._attr_unique_id = f"{self._device.get_name()}_Lock_buttons"
         self._attr_is_on = self._device.get_lock_buttons()
         self._attr_entity_category = EntityCategory.CONFIG  # DIAGNOSTIC
 
@@ -264,22 +250,19 @@ class Lock_buttons(SwitchEntity):
         """Turn the entity off."""
         self._attr_is_on = False
         await self._device.set_lock_buttons(False)
+        self.async_write_ha_state()
 
     async def async_turn_on(self, **kwargs):
         """Turn the entity on."""
         self._attr_is_on = True
         await self._device.set_lock_buttons(True)
+        self.async_write_ha_state()
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
         self._attr_is_on = self._device.get_lock_buttons()
-        self._attr_available = self._device.is_connected()
-
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._device.get_name())}
-        }
+        super()._handle_coordinator_update()
 
     @property
     def icon(self):
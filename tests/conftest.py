@@ -0,0 +1,69 @@
+"""Общие заготовки тестов: модуль Нептун в памяти вместо подключения Modbus"""
+from __future__ import annotations
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "custom_components"))
+
+from neptun_smart_local.device import NeptunSmart  # noqa: E402
+from neptun_smart_local.hub import WriteBatcher  # noqa: E402
+from neptun_smart_local.shadow import apply_mask  # noqa: E402
+
+
+class FakeHub:
+    """Эмуляция modbus_hub: регистры модуля в памяти, каждый запрос записывается в журнал"""
+
+    def __init__(self, registers=None) -> None:
+        self.registers = [0] * 131
+        for address, value in (registers or {}).items():
+            self.registers[address] = value
+        self.requests = []
+        # Если задан, полные записи (FC06/FC16) ждут его, как запросы в очереди шины
+        self.write_gate = None
+
+    def set_register_ttls(self, ttls) -> None:
+        pass
+
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    async def probe_mask_write(self, address, deadline=None) -> None:
+        pass
+
+    async def read_holding_registers(self, address, count, priority=None, deadline=None):
+        self.requests.append(("read", address, count))
+        return self.registers[address:address + count]
+
+    async def read_registers_cached(self, addresses, priority=None, deadline=None):
+        self.requests.append(("read_cached", tuple(addresses)))
+        return {address: self.registers[address] for address in addresses}
+
+    async def write_holding_register(self, address, value, priority=None, deadline=None) -> None:
+        if self.write_gate is not None:
+            await self.write_gate.wait()
+        self.requests.append(("write", address, value))
+        self.registers[address] = value
+
+    async def write_holding_registers(self, address, values, priority=None, deadline=None) -> None:
+        if self.write_gate is not None:
+            await self.write_gate.wait()
+        self.requests.append(("write_multiple", address, tuple(values)))
+        self.registers[address:address + len(values)] = values
+
+    async def mask_write_register(self, address, and_mask, or_mask, priority=None, deadline=None):
+        self.requests.append(("mask_write", address, and_mask, or_mask))
+        self.registers[address] = apply_mask(self.registers[address], and_mask, or_mask)
+        return self.registers[address]
+
+
+def make_device(hub: FakeHub, hass=None, **options) -> NeptunSmart:
+    """NeptunSmart, работающий с модулем в памяти. Без hass - только реестр общих соединений"""
+    device = NeptunSmart(hass or SimpleNamespace(data={}), "test", "127.0.0.1", 502, **options)
+    device._hub = hub
+    device._writer = WriteBatcher(hub)
+    return device
@@ -0,0 +1,71 @@
+"""Расписание опросов координатора: каждый опрос модуля на сетке его фазы"""
+from __future__ import annotations
+
+import asyncio
+
+from homeassistant.core import HomeAssistant
+
+from conftest import FakeHub, make_device
+from neptun_smart_local.coordinator import NeptunSmartCoordinator
+from neptun_smart_local.registers import POLL_ALARM
+from neptun_smart_local.scheduler import FleetScheduler
+
+INTERVAL = 0.2
+
+
+def test_every_poll_lands_on_module_phase_grid(tmp_path):
+    async def scenario():
+        hass = HomeAssistant(str(tmp_path))
+        fleet = FleetScheduler()
+        polls = {}
+        coordinators = []
+        for key in ("first", "second"):
+            fleet.register(key)
+            device = make_device(FakeHub(), hass, poll_intervals={POLL_ALARM: INTERVAL},
+                                 max_poll_interval=INTERVAL)
+            update = device.update
+
+            async def timed_update(key=key, update=update):
+                polls.setdefault(key, []).append(hass.loop.time())
+                await update()
+
+            device.update = timed_update
+            coordinator = NeptunSmartCoordinator(hass, device, fleet, key)
+            await fleet.wait_slot(key, INTERVAL)
+            await coordinator.async_refresh()
+            coordinators.append(coordinator)
+        await asyncio.sleep(INTERVAL * 8)
+        for coordinator in coordinators:
+            await coordinator.async_shutdown()
+        await hass.async_stop(force=True)
+        return fleet, polls
+
+    fleet, polls = asyncio.run(scenario())
+    for key, times in polls.items():
+        # Опросы не сползают к целой секунде: каждый приходится на точку своей фазы
+        assert len(times) >= 6
+        offset = fleet.get_phase(key) * INTERVAL
+        for t in times:
+            drift = (t - offset) % INTERVAL
+            assert min(drift, INTERVAL - drift) < 0.05
+    # Фазы модулей разнесены на половину интервала
+    assert abs(fleet.get_phase("first") - fleet.get_phase("second")) == 0.5
+
+
+def test_shutdown_cancels_scheduled_poll(tmp_path):
+    async def scenario():
+        hass = HomeAssistant(str(tmp_path))
+        fleet = FleetScheduler()
+        fleet.register("key")
+        device = make_device(FakeHub(), hass, poll_intervals={POLL_ALARM: INTERVAL},
+                             max_poll_interval=INTERVAL)
+        coordinator = NeptunSmartCoordinator(hass, device, fleet, "key")
+        await coordinator.async_refresh()
+        hub = device._hub
+        await coordinator.async_shutdown()
+        requests = len(hub.requests)
+        await asyncio.sleep(INTERVAL * 3)
+        await hass.async_stop(force=True)
+        return len(hub.requests) - requests
+
+    assert asyncio.run(scenario()) == 0
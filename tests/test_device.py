@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from pymodbus.exceptions import ModbusException
+
+from conftest import FakeHub, make_device
+from neptun_smart_local.registers import MODULE_CONFIG, NeptunSmartRegisters
+
+
+def test_set_dual_group_mode_puts_all_lines_into_both_groups():
+    async def scenario():
+        # Все линии в первой группе, у линий разные типы
+        hub = FakeHub({
+            NeptunSmartRegisters.input_line_1_2_config: 0x0501,
+            NeptunSmartRegisters.input_line_3_4_config: 0x0105,
+        })
+        device = make_device(hub)
+        await device.init_sensors()
+        await device.set_dual_group_mode(True)
+        assert device.get_state().line_group == (0, 3, 3, 3, 3)
+        # Дожидаемся перечитывания после команды: состояние подтверждено модулем
+        await asyncio.sleep(0.1)
+        return hub, device
+
+    hub, device = asyncio.run(scenario())
+    assert hub.registers[NeptunSmartRegisters.input_line_1_2_config] == 0x0703
+    assert hub.registers[NeptunSmartRegisters.input_line_3_4_config] == 0x0307
+    assert MODULE_CONFIG.flag(hub.registers[NeptunSmartRegisters.module_config], "dual_group_mode")
+    assert device.get_state().line_group == (0, 3, 3, 3, 3)
+    assert device.get_state().line_type == (True, True, False, False, True)
+    # Бит режима - маскированной записью, регистры линий 1-2 - одним запросом FC16
+    writes = [request for request in hub.requests if request[0] != "read" and request[0] != "read_cached"]
+    assert writes == [("mask_write", 0, 0xFBFF, 0x0400), ("write_multiple", 1, (0x0703, 0x0307))]
+
+
+def test_set_dual_group_mode_keeps_bits_the_module_changed_meanwhile():
+    async def scenario():
+        # Оба крана открыты
+        hub = FakeHub({NeptunSmartRegisters.module_config: 0x0300})
+        device = make_device(hub)
+        await device.init_sensors()
+        hub.write_gate = asyncio.Event()
+        command = asyncio.ensure_future(device.set_dual_group_mode(True))
+        await asyncio.sleep(0.1)
+        # Пока запись линий ждет шину, модуль сам закрывает кран первой группы по аварии
+        hub.registers[NeptunSmartRegisters.module_config] &= ~MODULE_CONFIG.mask("first_group_valve")
+        hub.write_gate.set()
+        await command
+        assert hub.registers[NeptunSmartRegisters.module_config] == 0x0600
+        await device.close()
+
+    asyncio.run(scenario())
+
+
+def test_masked_write_waits_for_full_write_of_same_register_in_flight():
+    async def scenario():
+        # Оба крана открыты
+        hub = FakeHub({NeptunSmartRegisters.module_config: 0x0300})
+        device = make_device(hub)
+        await device.init_sensors()
+        hub.write_gate = asyncio.Event()
+        # Полная запись регистра 0 отправлена и ждет шину
+        full_write = asyncio.ensure_future(device.write_registers({NeptunSmartRegisters.module_config: 0x0700}))
+        await asyncio.sleep(0.1)
+        close_valve = asyncio.ensure_future(device.set_first_group_valve_state(False))
+        await asyncio.sleep(0.1)
+        hub.write_gate.set()
+        await asyncio.gather(full_write, close_valve)
+        # Закрытие крана применено после полной записи и не откатано ею
+        assert hub.registers[NeptunSmartRegisters.module_config] == 0x0600
+        assert [request[0] for request in hub.requests if request[0] != "read"] == ["write", "mask_write"]
+        await device.close()
+
+    asyncio.run(scenario())
+
+
+class RejectingHub(FakeHub):
+    """Модуль отвечает исключением Modbus на запись регистров"""
+
+    async def write_holding_register(self, address, value, priority=None, deadline=None) -> None:
+        raise ModbusException("rejected")
+
+
+def test_wireless_sensor_group_write_reports_result_and_reads_back():
+    async def scenario(hub):
+        hub.registers[NeptunSmartRegisters.count_of_connected_wireless_sensors] = 1
+        hub.registers[NeptunSmartRegisters.first_wireless_sensor_config] = 1
+        device = make_device(hub)
+        await device.init_sensors()
+        commands = []
+        device.add_command_listener(lambda: commands.append(True))
+        sensor = device.wireless_sensors[0]
+        written = await sensor.set_group_config(2)
+        # Перечитывание после записи или ошибки заменяет оптимистичное значение
+        await asyncio.sleep(0.1)
+        await device.close()
+        return written, len(commands), sensor.get_group_config()
+
+    assert asyncio.run(scenario(FakeHub())) == (True, 1, 2)
+    assert asyncio.run(scenario(RejectingHub())) == (False, 0, 1)
+
+
+class BrokenHub(FakeHub):
+    """Чтения модуля завершаются непредвиденной ошибкой"""
+
+    async def read_holding_registers(self, address, count, priority=None, deadline=None):
+        raise RuntimeError("broken")
+
+    async def read_registers_cached(self, addresses, priority=None, deadline=None):
+        raise RuntimeError("broken")
+
+
+def test_repeated_unexpected_poll_error_is_logged_once(caplog):
+    async def scenario():
+        device = make_device(FakeHub())
+        await device.init_sensors()
+        device._hub = BrokenHub()
+        for _ in range(3):
+            await device.update()
+        await device.close()
+        return device.is_connected()
+
+    with caplog.at_level(logging.ERROR):
+        assert not asyncio.run(scenario())
+    assert len([record for record in caplog.records if record.levelno == logging.ERROR]) == 1
@@ -0,0 +1,504 @@
+from __future__ import annotations
+
+import asyncio
+import struct
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+from pymodbus.exceptions import ModbusException, ModbusIOException
+
+from conftest import FakeHub
+from neptun_smart_local.const import DATA_GATEWAYS
+from neptun_smart_local.hub import (
+    CONNECTION_BACKING_OFF,
+    CONNECTION_CLOSED,
+    CONNECTION_CONNECTED,
+    CONNECTION_HALF_OPEN,
+    CONNECTION_OPEN,
+    PRIORITY_ALARM_READ,
+    PRIORITY_BACKGROUND_READ,
+    PRIORITY_EMERGENCY_WRITE,
+    PRIORITY_USER_WRITE,
+    ConnectionManager,
+    ModbusGateway,
+    ModbusTcpProtocol,
+    ModbusTcpResponse,
+    ModuleUnavailableError,
+    PriorityRequestScheduler,
+    RttEstimator,
+    WriteBatcher,
+    modbus_hub,
+)
+from neptun_smart_local.shadow import apply_mask
+
+
+class GatedHub(FakeHub):
+    """Записи ждут открытия gate и запоминают свой приоритет"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.gate = asyncio.Event()
+        self.priorities = []
+
+    async def write_holding_register(self, address, value, priority=None, deadline=None) -> None:
+        self.priorities.append(priority)
+        await self.gate.wait()
+        await super().write_holding_register(address, value, priority, deadline)
+
+
+def test_write_batcher_keeps_values_of_concurrent_flushes_pending():
+    async def scenario():
+        hub = GatedHub()
+        writer = WriteBatcher(hub, debounce=10)
+        first = asyncio.ensure_future(writer.write({4: 1}))
+        await asyncio.sleep(0)
+        first_flush = asyncio.ensure_future(writer.flush())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(writer.write({5: 2}))
+        await asyncio.sleep(0)
+        second_flush = asyncio.ensure_future(writer.flush())
+        await asyncio.sleep(0)
+        # Оба пакета отправлены, но не подтверждены: чтение должно видеть значения обоих
+        assert writer.get_pending(4) == 1
+        assert writer.get_pending(5) == 2
+        hub.gate.set()
+        await asyncio.gather(first, second, first_flush, second_flush)
+        assert writer.get_pending(4) is None
+        assert writer.get_pending(5) is None
+        assert hub.registers[4:6] == [1, 2]
+
+    asyncio.run(scenario())
+
+
+def test_write_batcher_sends_emergency_writes_separately():
+    async def scenario():
+        hub = GatedHub()
+        hub.gate.set()
+        writer = WriteBatcher(hub, debounce=0.01)
+        user = asyncio.ensure_future(writer.write({4: 1}))
+        await asyncio.sleep(0)
+        await writer.write({0: 5}, PRIORITY_EMERGENCY_WRITE)
+        # Аварийная запись ушла сразу и одна, пользовательская ждет окна
+        assert hub.requests == [("write", 0, 5)]
+        assert hub.priorities == [PRIORITY_EMERGENCY_WRITE]
+        await user
+        assert hub.requests == [("write", 0, 5), ("write", 4, 1)]
+        assert hub.priorities == [PRIORITY_EMERGENCY_WRITE, PRIORITY_USER_WRITE]
+
+    asyncio.run(scenario())
+
+
+def test_write_batcher_later_write_replaces_pending_value_of_other_priority():
+    async def scenario():
+        hub = FakeHub()
+        writer = WriteBatcher(hub, debounce=0.01)
+        user = asyncio.ensure_future(writer.write({0: 1}))
+        await asyncio.sleep(0)
+        await writer.write({0: 2}, PRIORITY_EMERGENCY_WRITE)
+        await user
+        # Более старая пользовательская запись не перезаписывает аварийную
+        assert hub.requests == [("write", 0, 2)]
+        assert hub.registers[0] == 2
+
+    asyncio.run(scenario())
+
+
+def make_hub() -> modbus_hub:
+    return modbus_hub(SimpleNamespace(data={}), "127.0.0.1", 502)
+
+
+def test_single_flight_urgent_read_does_not_wait_behind_background_read():
+    async def scenario():
+        hub = make_hub()
+        gate = asyncio.Event()
+        reads = []
+
+        async def read(address, count, priority, deadline):
+            reads.append(priority)
+            if priority == PRIORITY_BACKGROUND_READ:
+                await gate.wait()
+            return [priority] * count
+
+        hub._read_holding_registers = read
+        background = asyncio.ensure_future(hub.read_holding_registers(0, 7))
+        await asyncio.sleep(0)
+        # Срочное чтение выполняется своим запросом, следующее фоновое присоединяется к нему
+        assert await hub.read_holding_registers(0, 7, PRIORITY_ALARM_READ) == [PRIORITY_ALARM_READ] * 7
+        joined = asyncio.ensure_future(hub.read_holding_registers(0, 7))
+        await asyncio.sleep(0)
+        assert reads == [PRIORITY_BACKGROUND_READ, PRIORITY_ALARM_READ]
+        gate.set()
+        assert await background == [PRIORITY_BACKGROUND_READ] * 7
+        assert await joined == [PRIORITY_BACKGROUND_READ] * 7
+        assert hub.get_read_stats() == {"issued": 2, "deduplicated": 1}
+        await hub.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_requests_after_disconnect_are_rejected_without_the_gateway():
+    async def scenario():
+        hass = SimpleNamespace(data={})
+        hub = modbus_hub(hass, "127.0.0.1", 502)
+        await hub.disconnect()
+        # Соединение освобождено, запоздавшие запросы не падают с AttributeError
+        assert hass.data[DATA_GATEWAYS] == {}
+        assert hub.get_connection_state() == CONNECTION_CLOSED
+        assert await hub.read_holding_registers(0, 7) is None
+        with pytest.raises(ModuleUnavailableError):
+            await hub.write_holding_register(4, 1)
+        with pytest.raises(ModuleUnavailableError):
+            await hub.connect()
+        await hub.disconnect()
+
+    asyncio.run(scenario())
+
+
+class Module:
+    """Ответы модуля на запросы modbus_hub вместо шлюза: FC22 поддерживается, отклоняется или теряется"""
+
+    def __init__(self, hub: modbus_hub, mask_write) -> None:
+        self.registers = [0] * 8
+        self.mask_write = mask_write
+        self.requests = []
+        hub._bus = lambda priority: nullcontext()
+        hub._execute = self.execute
+
+    async def execute(self, request, *args, **kwargs):
+        name = request.__name__
+        self.requests.append(name)
+        if name == "mask_write_register":
+            if self.mask_write == "lost":
+                raise ModbusIOException("No response received")
+            if self.mask_write == "illegal":
+                return ModbusTcpResponse(0x96, exception_code=0x01)
+            address = kwargs["address"]
+            self.registers[address] = apply_mask(self.registers[address], kwargs["and_mask"], kwargs["or_mask"])
+            return ModbusTcpResponse(0x16)
+        if name == "read_holding_registers":
+            return ModbusTcpResponse(0x03, self.registers[args[0]:args[0] + kwargs["count"]])
+        self.registers[args[0]] = args[1]
+        return ModbusTcpResponse(0x06)
+
+
+def test_mask_write_uses_fc22_when_supported():
+    async def scenario():
+        hub = make_hub()
+        module = Module(hub, "supported")
+        await hub.probe_mask_write(0)
+        await hub.mask_write_register(0, 0xFFFE, 0x0001)
+        assert module.registers[0] == 0x0001
+        assert module.requests == ["mask_write_register", "mask_write_register"]
+        await hub.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_mask_write_falls_back_to_read_and_write_on_illegal_function():
+    async def scenario():
+        hub = make_hub()
+        module = Module(hub, "illegal")
+        module.registers[0] = 0x0100
+        await hub.probe_mask_write(0)
+        await hub.mask_write_register(0, 0xFFFE, 0x0001)
+        assert module.registers[0] == 0x0101
+        assert module.requests == ["mask_write_register", "read_holding_registers", "write_register"]
+        await hub.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_single_lost_fc22_response_does_not_disable_fc22():
+    async def scenario():
+        hub = make_hub()
+        module = Module(hub, "lost")
+        await hub.probe_mask_write(0)
+        with pytest.raises(ModbusIOException):
+            await hub.mask_write_register(0, 0xFFFE, 0x0001)
+        # Третья потеря подряд: модуль, видимо, молча отбрасывает FC22
+        await hub.mask_write_register(0, 0xFFFE, 0x0001)
+        assert module.registers[0] == 0x0001
+        assert module.requests[-2:] == ["read_holding_registers", "write_register"]
+        module.requests.clear()
+        await hub.mask_write_register(0, 0xFFFE, 0x0000)
+        assert module.requests == ["read_holding_registers", "write_register"]
+        await hub.disconnect()
+
+    asyncio.run(scenario())
+
+
+class FakeLink:
+    """Соединение для ConnectionManager: результат попыток подключения задает тест"""
+
+    def __init__(self, connects=True) -> None:
+        self.connects = connects
+        self.connected = False
+        self.attempts = 0
+        # Состояние автомата во время каждой попытки
+        self.states = []
+        self.get_state = None
+
+    async def connect(self) -> bool:
+        self.attempts += 1
+        if self.get_state is not None:
+            self.states.append(self.get_state())
+        await asyncio.sleep(0)
+        self.connected = self.connects
+        return self.connected
+
+
+def make_manager(link, **kwargs) -> ConnectionManager:
+    return ConnectionManager(link.connect, lambda: link.connected, backoff_initial=0, **kwargs)
+
+
+def test_connection_manager_opens_breaker_and_probes_once():
+    async def scenario():
+        link = FakeLink(connects=False)
+        manager = make_manager(link, threshold=3, open_time=0)
+        for _ in range(3):
+            with pytest.raises(ModuleUnavailableError):
+                await manager.ensure_connected()
+        opened = manager.get_state()
+        # Пробная попытка после размыкания одна, сколько бы запросов ее ни ждали
+        link.connects = True
+        link.get_state = manager.get_state
+        await asyncio.gather(manager.ensure_connected(), manager.ensure_connected())
+        return opened, link.states, manager.get_state()
+
+    assert asyncio.run(scenario()) == (CONNECTION_OPEN, [CONNECTION_HALF_OPEN], CONNECTION_CONNECTED)
+
+
+def test_connection_manager_rejects_requests_while_backing_off():
+    async def scenario():
+        link = FakeLink(connects=False)
+        manager = ConnectionManager(link.connect, lambda: link.connected, backoff_initial=60)
+        with pytest.raises(ModuleUnavailableError):
+            await manager.ensure_connected()
+        # Следующая попытка только после паузы: запросы отклоняются без подключения
+        with pytest.raises(ModuleUnavailableError):
+            await manager.ensure_connected()
+        return link.attempts, manager.get_state()
+
+    assert asyncio.run(scenario()) == (1, CONNECTION_BACKING_OFF)
+
+
+def test_connection_manager_counts_consecutive_response_timeouts_as_failure():
+    async def scenario():
+        link = FakeLink()
+        manager = make_manager(link, timeout_threshold=3)
+        await manager.ensure_connected()
+        # Ответ между таймаутами сбрасывает счет
+        closes = [manager.response_timeout(), manager.response_timeout()]
+        manager.response_received()
+        closes += [manager.response_timeout() for _ in range(3)]
+        return closes, manager.get_state(), manager.get_failures()
+
+    closes, state, failures = asyncio.run(scenario())
+    assert closes == [False, False, False, False, True]
+    assert state == CONNECTION_BACKING_OFF
+    assert failures == 1
+
+
+def test_connection_manager_opens_breaker_on_silent_reconnects():
+    """Подключение проходит, но модуль не отвечает (полуоткрытое соединение, мертвый модуль за шлюзом)"""
+    async def scenario():
+        link = FakeLink()
+        manager = make_manager(link, threshold=2, timeout_threshold=1)
+        for _ in range(2):
+            await manager.ensure_connected()
+            assert manager.response_timeout()
+            link.connected = False
+        return manager.get_state()
+
+    assert asyncio.run(scenario()) == CONNECTION_OPEN
+
+
+class SilentClient:
+    """Клиент шлюза, соединение которого открыто, но ответы не приходят"""
+
+    def __init__(self) -> None:
+        self.connected = False
+        self.closed = 0
+
+    async def connect(self) -> None:
+        self.connected = True
+
+    def close(self) -> None:
+        self.connected = False
+        self.closed += 1
+
+    async def read_holding_registers(self, address, count=1, device_id=1):
+        await asyncio.sleep(1)
+
+
+def test_gateway_closes_connection_that_stopped_answering():
+    async def scenario():
+        gateway = ModbusGateway("127.0.0.1", 502)
+        client = gateway._client = SilentClient()
+        rtt = RttEstimator(min_timeout=0.01, max_timeout=0.01)
+        for _ in range(3):
+            with pytest.raises(ModbusIOException):
+                async with gateway.bus(PRIORITY_BACKGROUND_READ):
+                    await gateway.execute(rtt, client.read_holding_registers, 0)
+        closed, state = client.closed, gateway.get_connection_state()
+        # Следующая попытка подключения - только после паузы
+        with pytest.raises(ModuleUnavailableError):
+            async with gateway.bus(PRIORITY_BACKGROUND_READ):
+                pass
+        return closed, state
+
+    assert asyncio.run(scenario()) == (1, CONNECTION_BACKING_OFF)
+
+
+class FakeTransport:
+    """Транспорт протокола: кадры запросов копятся в sent"""
+
+    def __init__(self) -> None:
+        self.sent = []
+        self.closed = False
+
+    def get_extra_info(self, name):
+        return None
+
+    def write(self, data) -> None:
+        self.sent.append(bytes(data))
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def mbap(transaction_id, unit_id, pdu) -> bytes:
+    return struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, unit_id) + pdu
+
+
+def test_tcp_protocol_frames_split_and_coalesced_responses():
+    async def scenario():
+        protocol = ModbusTcpProtocol()
+        transport = FakeTransport()
+        protocol.connection_made(transport)
+        first = protocol.send(1, 240, 3, struct.pack(">BHH", 3, 0, 2))
+        second = protocol.send(2, 240, 6, struct.pack(">BHH", 6, 1, 5))
+        stream = (mbap(1, 240, struct.pack(">BBHH", 3, 4, 0x0102, 0x0304))
+                  + mbap(7, 240, b"\x03\x00")
+                  + mbap(2, 240, struct.pack(">BHH", 6, 1, 5)))
+        # Кадры приходят кусками, не совпадающими с их границами; ответ на чужую транзакцию отбрасывается
+        protocol.data_received(stream[:5])
+        protocol.data_received(stream[5:20])
+        protocol.data_received(stream[20:])
+        return transport.sent[0], await first, await second, protocol._buffer
+
+    request, first, second, buffer = asyncio.run(scenario())
+    assert request == bytes.fromhex("0001 0000 0006 f0 03 0000 0002")
+    assert list(first.registers) == [0x0102, 0x0304]
+    assert second.function_code == 6 and not second.isError()
+    assert buffer == bytearray()
+
+
+def test_tcp_protocol_reports_exception_and_mismatched_responses():
+    async def scenario():
+        protocol = ModbusTcpProtocol()
+        protocol.connection_made(FakeTransport())
+        rejected = protocol.send(1, 240, 22, struct.pack(">BHHH", 22, 0, 0xFFFF, 0))
+        foreign = protocol.send(2, 240, 3, struct.pack(">BHH", 3, 0, 1))
+        protocol.data_received(mbap(1, 240, b"\x96\x01") + mbap(2, 17, struct.pack(">BBH", 3, 2, 0)))
+        with pytest.raises(ModbusIOException):
+            await foreign
+        return await rejected
+
+    response = asyncio.run(scenario())
+    assert response.isError() and response.exception_code == 1
+
+
+def test_tcp_protocol_closes_desynchronized_stream():
+    async def scenario():
+        protocol = ModbusTcpProtocol()
+        transport = FakeTransport()
+        protocol.connection_made(transport)
+        pending = protocol.send(1, 240, 3, struct.pack(">BHH", 3, 0, 1))
+        protocol.data_received(struct.pack(">HHHB", 1, 5, 3, 240) + b"\x03\x02")
+        closed = transport.closed
+        # Закрытие транспорта завершает ожидающие запросы ошибкой соединения
+        protocol.connection_lost(None)
+        with pytest.raises(ModbusException):
+            await pending
+        return closed
+
+    assert asyncio.run(scenario())
+
+
+def test_bus_goes_to_most_urgent_waiter_then_in_arrival_order():
+    async def scenario():
+        scheduler = PriorityRequestScheduler()
+        order = []
+
+        async def request(name, priority):
+            async with scheduler.request(priority):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        async with scheduler.request(PRIORITY_BACKGROUND_READ):
+            tasks = [asyncio.ensure_future(request(name, priority)) for name, priority in (
+                ("background 1", PRIORITY_BACKGROUND_READ),
+                ("alarm", PRIORITY_ALARM_READ),
+                ("background 2", PRIORITY_BACKGROUND_READ),
+                ("emergency", PRIORITY_EMERGENCY_WRITE),
+            )]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order, scheduler.get_wait_stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["emergency", "alarm", "background 1", "background 2"]
+    assert stats["background_read"]["requests"] == 3
+
+
+def test_cancelled_waiter_passes_bus_on():
+    async def scenario():
+        scheduler = PriorityRequestScheduler()
+        served = []
+
+        async def request(name):
+            async with scheduler.request(PRIORITY_USER_WRITE):
+                served.append(name)
+
+        async with scheduler.request(PRIORITY_BACKGROUND_READ):
+            cancelled = asyncio.ensure_future(request("cancelled"))
+            waiting = asyncio.ensure_future(request("waiting"))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+        await waiting
+        # Шина свободна: следующий запрос получает ее сразу
+        async with scheduler.request(PRIORITY_BACKGROUND_READ):
+            served.append("next")
+        return served
+
+    assert asyncio.run(scenario()) == ["waiting", "next"]
+
+
+def test_rtt_estimator_follows_rfc6298():
+    rtt = RttEstimator(min_timeout=0.01, max_timeout=10)
+    rtt.sample(0.1)
+    # Первое измерение: rttvar = rtt / 2, таймаут srtt + 4 * rttvar
+    assert rtt.get_timeout() == pytest.approx(0.3)
+    rtt.sample(0.1)
+    # Разброс затухает на 1/4, srtt не меняется
+    assert rtt.get_timeout() == pytest.approx(0.1 + 4 * 0.0375)
+    stats = rtt.get_stats()
+    assert (stats["srtt_ms"], stats["samples"], stats["losses"]) == (100.0, 2, 0)
+
+
+def test_rtt_estimator_backoff_doubles_within_bounds():
+    rtt = RttEstimator(min_timeout=0.2, max_timeout=1)
+    rtt.sample(0.01)
+    # Таймаут не опускается ниже min_timeout
+    assert rtt.get_timeout() == 0.2
+    timeouts = []
+    for _ in range(4):
+        rtt.backoff()
+        timeouts.append(rtt.get_timeout())
+    assert timeouts == [0.4, 0.8, 1, 1]
+    # Успешное измерение возвращает таймаут к оценке по RTT
+    rtt.sample(0.01)
+    assert rtt.get_timeout() == 0.2
+    assert rtt.get_stats()["losses"] == 4
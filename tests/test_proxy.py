@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import asyncio
+
+from pymodbus.constants import ExcCodes
+
+from conftest import FakeHub, make_device
+from neptun_smart_local.proxy import RegisterImageContext, is_read_only
+
+
+def test_status_and_counter_registers_are_read_only():
+    assert is_read_only(3, 1)
+    assert is_read_only(6, 1)
+    assert is_read_only(0, 7)
+    assert is_read_only(57, 1)
+    assert is_read_only(121, 2)
+    assert not is_read_only(0, 3)
+    assert not is_read_only(4, 2)
+    assert not is_read_only(7, 50)
+    assert not is_read_only(123, 8)
+
+
+def test_proxy_rejects_writes_to_read_only_registers():
+    async def scenario():
+        hub = FakeHub()
+        device = make_device(hub)
+        await device.init_sensors()
+        await device.update()
+        context = RegisterImageContext(device)
+        assert await context.async_setValues(0, 16, 2, [0, 1]) == ExcCodes.ILLEGAL_ADDRESS
+        assert await context.async_setValues(0, 6, 110, [1]) == ExcCodes.ILLEGAL_ADDRESS
+        assert await context.async_setValues(0, 6, 4, [1]) is None
+        assert hub.registers[3:5] == [0, 1]
+        assert await context.async_getValues(0, 3, 3, 2) == [0, 1]
+        assert context.get_stats() == {"reads": 1, "misses": 0, "writes": 1}
+        await device.close()
+
+    asyncio.run(scenario())
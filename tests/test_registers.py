@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from neptun_smart_local.registers import (
+    HEADER_REGISTERS,
+    INPUT_LINE_1_2_CONFIG,
+    MAX_REGISTERS_PER_READ,
+    MODULE_CONFIG,
+    TYPE_UINT32,
+    BitField,
+    NeptunSmartRegisters,
+    ReadBlock,
+    Register,
+    compile_address_plan,
+    compile_read_plan,
+    compile_write_ranges,
+    module_registers,
+)
+
+
+def test_bit_field_decodes_and_encodes_only_its_bits():
+    group = BitField("line_1_group", 8, 2)
+    assert group.mask == 0x0300
+    assert group.decode(0x0701) == 3
+    assert group.encode(0x0501, 3) == 0x0701
+    assert group.encode(0x0701, 0) == 0x0401
+    # Значение шире поля обрезается и не задевает соседние биты
+    assert group.encode(0x0000, 5) == 0x0100
+
+
+def test_register_fields_by_name():
+    assert MODULE_CONFIG.flag(0x0400, "dual_group_mode")
+    assert not MODULE_CONFIG.flag(0x0400, "lock_buttons")
+    assert MODULE_CONFIG.set(0x0001, "dual_group_mode", True) == 0x0401
+    assert INPUT_LINE_1_2_CONFIG.get(0x0501, "line_1_group") == 1
+    assert INPUT_LINE_1_2_CONFIG.get(0x0501, "line_2_group") == 1
+    assert INPUT_LINE_1_2_CONFIG.mask("line_1_group", "line_2_group") == 0x0303
+
+
+def test_read_plan_reads_header_in_one_request():
+    plan = compile_read_plan(HEADER_REGISTERS)
+    assert plan.blocks == (ReadBlock(0, NeptunSmartRegisters.header_size),)
+    assert plan.request_count == 1
+    assert plan.register_count == NeptunSmartRegisters.header_size
+
+
+def test_read_plan_bridges_small_gaps_only():
+    registers = [Register("a", 0), Register("b", 5), Register("c", 30)]
+    plan = compile_read_plan(registers, max_gap=8)
+    assert plan.blocks == (ReadBlock(0, 6), ReadBlock(30, 1))
+    assert compile_read_plan(registers, max_gap=0).request_count == 3
+
+
+def test_read_plan_never_splits_uint32():
+    registers = [Register("a", 0), Register("counter", 3, TYPE_UINT32)]
+    plan = compile_read_plan(registers, max_count=4)
+    assert plan.blocks == (ReadBlock(0, 1), ReadBlock(3, 2))
+
+
+def test_read_plan_covers_full_module_within_request_limit():
+    registers = module_registers(NeptunSmartRegisters.wireless_sensors_max)
+    plan = compile_read_plan(registers)
+    assert all(block.count <= MAX_REGISTERS_PER_READ for block in plan)
+    covered = {address for block in plan for address in range(block.address, block.end)}
+    assert {address for register in registers for address in range(register.address, register.end)} <= covered
+    assert plan.request_count == 2
+
+
+def test_address_plan_ignores_duplicates_and_order():
+    plan = compile_address_plan([9, 7, 7, 8, 60])
+    assert plan.blocks == (ReadBlock(7, 3), ReadBlock(60, 1))
+
+
+def test_write_ranges_split_on_gaps_and_limit():
+    assert compile_write_ranges({5: 4, 0: 1, 1: 2, 2: 3}) == [(0, [1, 2, 3]), (5, [4])]
+    assert compile_write_ranges({0: 1, 1: 2, 2: 3}, max_count=2) == [(0, [1, 2]), (2, [3])]
+    assert compile_write_ranges({}) == []
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+
+from conftest import FakeHub, make_device
+from neptun_smart_local.registers import (
+    POLL_ALARM,
+    POLL_CONFIG,
+    POLL_COUNTER,
+    POLL_DIAGNOSTIC,
+    NeptunSmartRegisters,
+)
+from neptun_smart_local.scheduler import (
+    DEFAULT_MAX_POLL_INTERVAL,
+    IDLE_CYCLES_BEFORE_BACKOFF,
+    REASON_ACTIVE,
+    REASON_IDLE,
+    REASON_WRITE,
+    AdaptivePollInterval,
+    FleetScheduler,
+    PollScheduler,
+)
+
+
+def test_poll_scheduler_polls_classes_on_their_intervals():
+    scheduler = PollScheduler()
+    assert scheduler.due(0) == {POLL_ALARM, POLL_COUNTER, POLL_DIAGNOSTIC, POLL_CONFIG}
+    scheduler.mark_polled(scheduler.due(0), 0)
+    assert scheduler.due(1) == set()
+    assert scheduler.due(2) == {POLL_ALARM}
+    assert scheduler.due(60) == {POLL_ALARM, POLL_COUNTER}
+    scheduler.request(POLL_CONFIG)
+    assert POLL_CONFIG in scheduler.due(1)
+
+
+def test_adaptive_interval_boosts_after_command_and_backs_off_when_idle():
+    interval = AdaptivePollInterval(2, ceiling=8)
+    interval.boost(0)
+    assert interval.next_interval(1, False, False) == 0.5
+    assert interval.get_reason() == REASON_WRITE
+    now = 20
+    for _ in range(IDLE_CYCLES_BEFORE_BACKOFF):
+        assert interval.next_interval(now, False, False) == 2
+    assert [interval.next_interval(now, False, False) for _ in range(3)] == [4, 8, 8]
+    assert interval.get_reason() == REASON_IDLE
+    assert interval.next_interval(now, True, False) == 2
+
+
+def test_idle_backoff_stretches_to_configured_ceiling():
+    async def scenario():
+        device = make_device(FakeHub())
+        await device.init_sensors()
+        intervals = []
+        for _ in range(IDLE_CYCLES_BEFORE_BACKOFF + 5):
+            await device.update()
+            intervals.append(device.get_poll_interval())
+        # Интервал удваивается от такта аварий и упирается в потолок из настроек
+        assert intervals.index(4) < intervals.index(8) < intervals.index(DEFAULT_MAX_POLL_INTERVAL)
+        assert max(intervals) == intervals[-1] == DEFAULT_MAX_POLL_INTERVAL
+        assert device.get_poll_interval_reason() == REASON_IDLE
+        await device.close()
+
+    asyncio.run(scenario())
+
+
+def test_fleet_spreads_phases_over_interval():
+    fleet = FleetScheduler()
+    fleet.register("a", "b", "c", "d")
+    assert sorted(fleet.get_phase(key) for key in "abcd") == [0, 0.25, 0.5, 0.75]
+    for key in "abcd":
+        slot = fleet.next_slot(key, 2, 101.3)
+        assert 101.3 < slot <= 103.3
+        assert round((slot - fleet.get_phase(key) * 2) % 2, 6) in (0, 2)
+
+
+def test_boosted_ticks_read_alarm_registers_every_time():
+    async def scenario():
+        # Режим мойки пола активен: опрос ускорен
+        hub = FakeHub({NeptunSmartRegisters.module_config: 0x0001})
+        device = make_device(hub)
+        await device.init_sensors()
+        await device.update()
+        assert device.get_poll_interval_reason() == REASON_ACTIVE
+        for _ in range(4):
+            hub.requests.clear()
+            await device.update()
+            assert any(request[0] == "read" and request[1] == 0 for request in hub.requests)
+        await device.close()
+
+    asyncio.run(scenario())
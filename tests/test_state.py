@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from neptun_smart_local.registers import NeptunSmartRegisters
+from neptun_smart_local.state import CounterState, ModuleState
+
+HEADER = {
+    NeptunSmartRegisters.module_config: 0x0701,
+    NeptunSmartRegisters.input_line_1_2_config: 0x0502,
+    NeptunSmartRegisters.input_line_3_4_config: 0x0007,
+    NeptunSmartRegisters.status_wired_line: 0x0005,
+    NeptunSmartRegisters.relay_config: 0x0009,
+    5: 0,
+    NeptunSmartRegisters.count_of_connected_wireless_sensors: 2,
+}
+
+
+def test_from_image_decodes_header():
+    state = ModuleState.from_image(HEADER, 0)
+    assert state.has_header
+    assert state.floor_washing_mode
+    assert state.first_group_valve_is_open and state.second_group_valve_is_open
+    assert state.dual_group_mode
+    assert not state.lock_buttons
+    assert state.line_group == (0, 1, 2, 0, 3)
+    assert state.line_type == (True, True, False, False, True)
+    assert state.line_status == (True, True, False, True, False)
+    assert state.switch_when_alert == 1
+    assert state.switch_when_close_valve == 2
+    assert state.wireless_sensors_connected == 2
+
+
+def test_from_image_without_full_header_keeps_defaults():
+    image = dict(HEADER)
+    del image[NeptunSmartRegisters.status_wired_line]
+    state = ModuleState.from_image(image, 0)
+    assert not state.has_header
+    assert state.line_group == (0, 0, 0, 0, 0)
+
+
+def test_from_image_decodes_wireless_sensors_and_reuses_unchanged():
+    config = NeptunSmartRegisters.first_wireless_sensor_config
+    status = NeptunSmartRegisters.first_wireless_sensor_status
+    # Датчик 1: авария, заряд 100 %, сырое поле сигнала 0b001 (уровень 4); датчик 2 не прочитан
+    image = {**HEADER, config: 1, status: (100 << 8) | (1 << 3) | 1, config + 1: 2}
+    state = ModuleState.from_image(image, 2)
+    sensor = state.wireless_sensors[0]
+    assert (sensor.config, sensor.alert, sensor.lost, sensor.battery_level, sensor.signal_level) == (1, True, False, 100, 4)
+    assert state.wireless_sensors[1] is None
+
+    image[status + 1] = 1 << 2
+    updated = ModuleState.from_image(image, 2, state)
+    assert updated.wireless_sensors[0] is sensor
+    assert updated.wireless_sensors[1].lost
+
+
+def test_from_image_decodes_counters():
+    first = NeptunSmartRegisters.first_counter
+    image = {first: 0x0001, first + 1: 0x0002, NeptunSmartRegisters.first_counter_config: 1}
+    state = ModuleState.from_image(image, 0)
+    assert state.counters[0] == CounterState(0x00010002, True)
+    assert state.counters[1:] == (None,) * (NeptunSmartRegisters.counters_count - 1)
+    assert ModuleState.from_image(image, 0, state).counters[0] is state.counters[0]